@@ -1,6 +1,7 @@
 #include <SPI.h>
 #include <MFRC522.h>
 #include <Servo.h>
+#include <EEPROM.h>
 
 #define SS_PIN 10
 #define RST_PIN 9
@@ -8,6 +9,37 @@
 #define GREEN_LED 7
 #define RED_LED 8
 
+// Serial link. The board starts in the text protocol at TEXT_BAUD and
+// switches to binary frames when the host asks with "PROTO?BIN:<baud>".
+// Frame: 0xA5 | type | length | payload | CRC-16/CCITT-FALSE (big endian)
+#define TEXT_BAUD 9600
+#define FRAME_SOF 0xA5
+#define MSG_CARD 0x01
+#define MSG_GRANTED 0x02
+#define MSG_DENIED 0x03
+#define MSG_TEXT 0x04
+#define MSG_PING 0x10
+#define MSG_PONG 0x11
+#define MSG_COMMAND 0x20
+#define HANDSHAKE_MS 2000
+// Longest frame accepted; framing.BOARD_MAX_PAYLOAD on the host
+#define MAX_FRAME_PAYLOAD 64
+
+// Card table synced from the host (see board_sync.py). One 64-bit key per
+// card, kept sorted for binary search: the UID length in the top byte over
+// the 4- or 7-byte UID itself, or over 56 bits of a 10-byte UID's FNV-1a
+// hash, so only two 10-byte UIDs can share a key (the host keeps such a
+// pair off the board). A denied bit per card, and a copy in EEPROM so the
+// gate keeps deciding after a power cut with the host gone. The copy is not
+// kept sorted: a single card change writes its own slot and the header
+// (a removed card's slot takes the last one), and only a bulk load
+// rewrites the table. It is sorted again in RAM when loaded.
+#define MAX_CARDS 100
+#define TABLE_MAGIC 0x5CA8
+#define KEY_SIZE 8
+#define EEPROM_KEYS 8
+#define EEPROM_DENIED (EEPROM_KEYS + MAX_CARDS * KEY_SIZE)
+
 MFRC522 rfid(SS_PIN, RST_PIN);
 Servo doorServo;
 
@@ -36,8 +68,39 @@ DeniedPerson deniedUsers[] = {
 };
 const int deniedCount = sizeof(deniedUsers) / sizeof(deniedUsers[0]);
 
+// Card table
+struct TableHeader {
+  uint16_t magic;
+  uint32_t version;
+  uint16_t count;
+};
+
+uint64_t cardKeys[MAX_CARDS];
+byte cardDenied[(MAX_CARDS + 7) / 8];
+int cardCount = 0;
+uint32_t tableVersion = 0;
+uint32_t tableChecksum = 0;
+bool tableLoading = false;
+// Cards in the EEPROM copy, which holds nothing before the first change
+// to the built-in lists
+int storedCount = 0;
+bool tableStored = false;
+
+// Binary link state
+bool binaryMode = false;
+bool linkConfirmed = false;
+unsigned long binarySince = 0;
+
+// Receive state for incoming frames
+byte rxState = 0;
+byte rxType = 0;
+byte rxLength = 0;
+byte rxCount = 0;
+byte rxPayload[MAX_FRAME_PAYLOAD];
+uint16_t rxCrc = 0;
+
 void setup() {
-  Serial.begin(9600);
+  Serial.begin(TEXT_BAUD);
   SPI.begin();
   rfid.PCD_Init();
   doorServo.attach(SERVO_PIN);
@@ -46,6 +109,7 @@ void setup() {
   digitalWrite(GREEN_LED, LOW);
   digitalWrite(RED_LED, LOW);
   doorServo.write(0); // Initial position
+  loadTable();
   Serial.println("System Ready - Scan RFID Card...");
 }
 
@@ -56,21 +120,464 @@ bool compareUID(byte *uid1, byte *uid2) {
   return true;
 }
 
+uint32_t fnv1a(const byte *data, byte length) {
+  uint32_t hash = 0x811C9DC5;
+  for (byte i = 0; i < length; i++) {
+    hash = (hash ^ data[i]) * 0x01000193;
+  }
+  return hash;
+}
+
+uint64_t fnv1a64(const byte *data, byte length) {
+  uint64_t hash = 0xCBF29CE484222325ULL;
+  for (byte i = 0; i < length; i++) {
+    hash = (hash ^ data[i]) * 0x100000001B3ULL;
+  }
+  return hash;
+}
+
+uint64_t uidKey(const byte *uid, byte size) {
+  uint64_t value = 0;
+  if (size <= 7) {
+    for (byte i = 0; i < size; i++) {
+      value = (value << 8) | uid[i];
+    }
+  } else {
+    value = fnv1a64(uid, size) & 0x00FFFFFFFFFFFFFFULL;
+  }
+  return ((uint64_t)size << 56) | value;
+}
+
+uint32_t entryDigest(uint64_t key, bool denied) {
+  byte data[KEY_SIZE + 1];
+  for (byte i = 0; i < KEY_SIZE; i++) {
+    data[i] = (byte)(key >> (8 * (KEY_SIZE - 1 - i)));
+  }
+  data[KEY_SIZE] = denied ? 'D' : 'P';
+  return fnv1a(data, KEY_SIZE + 1);
+}
+
+bool isDenied(int i) {
+  return cardDenied[i / 8] & (1 << (i % 8));
+}
+
+void setDenied(int i, bool denied) {
+  if (denied) {
+    cardDenied[i / 8] |= 1 << (i % 8);
+  } else {
+    cardDenied[i / 8] &= ~(1 << (i % 8));
+  }
+}
+
+int lowerBound(uint64_t key) {
+  int lo = 0;
+  int hi = cardCount;
+  while (lo < hi) {
+    int mid = (lo + hi) / 2;
+    if (cardKeys[mid] < key) {
+      lo = mid + 1;
+    } else {
+      hi = mid;
+    }
+  }
+  return lo;
+}
+
+int findCard(uint64_t key) {
+  int i = lowerBound(key);
+  return (i < cardCount && cardKeys[i] == key) ? i : -1;
+}
+
+bool putCard(uint64_t key, bool denied) {
+  int i = lowerBound(key);
+  if (i < cardCount && cardKeys[i] == key) {
+    tableChecksum -= entryDigest(key, isDenied(i));
+  } else {
+    if (cardCount >= MAX_CARDS) return false;
+    for (int j = cardCount; j > i; j--) {
+      cardKeys[j] = cardKeys[j - 1];
+      setDenied(j, isDenied(j - 1));
+    }
+    cardKeys[i] = key;
+    cardCount++;
+  }
+  setDenied(i, denied);
+  tableChecksum += entryDigest(key, denied);
+  return true;
+}
+
+void removeCard(uint64_t key) {
+  int i = findCard(key);
+  if (i < 0) return;
+  tableChecksum -= entryDigest(key, isDenied(i));
+  for (int j = i; j < cardCount - 1; j++) {
+    cardKeys[j] = cardKeys[j + 1];
+    setDenied(j, isDenied(j + 1));
+  }
+  cardCount--;
+}
+
+void saveHeader() {
+  // Written last, so a power cut mid-change leaves the old count
+  TableHeader header = {TABLE_MAGIC, tableVersion, (uint16_t)storedCount};
+  EEPROM.put(0, header);
+}
+
+bool storedDenied(int slot) {
+  return EEPROM.read(EEPROM_DENIED + slot / 8) & (1 << (slot % 8));
+}
+
+void storeDenied(int slot, bool denied) {
+  byte bits = EEPROM.read(EEPROM_DENIED + slot / 8);
+  if (denied) {
+    bits |= 1 << (slot % 8);
+  } else {
+    bits &= ~(1 << (slot % 8));
+  }
+  EEPROM.update(EEPROM_DENIED + slot / 8, bits);
+}
+
+int storedSlot(uint64_t key) {
+  for (int i = 0; i < storedCount; i++) {
+    uint64_t stored;
+    EEPROM.get(EEPROM_KEYS + i * KEY_SIZE, stored);
+    if (stored == key) return i;
+  }
+  return -1;
+}
+
+void saveTable() {
+  // The whole table, after a bulk load. EEPROM.put only rewrites bytes
+  // that changed.
+  for (int i = 0; i < cardCount; i++) {
+    EEPROM.put(EEPROM_KEYS + i * KEY_SIZE, cardKeys[i]);
+  }
+  for (unsigned int i = 0; i < sizeof(cardDenied); i++) {
+    EEPROM.update(EEPROM_DENIED + i, cardDenied[i]);
+  }
+  storedCount = cardCount;
+  tableStored = true;
+  saveHeader();
+}
+
+void saveCard(uint64_t key, bool denied) {
+  // After putCard(): a new card goes in the next free slot
+  if (!tableStored) {
+    saveTable();
+    return;
+  }
+  int slot = storedSlot(key);
+  if (slot < 0) {
+    slot = storedCount++;
+    EEPROM.put(EEPROM_KEYS + slot * KEY_SIZE, key);
+  }
+  storeDenied(slot, denied);
+  saveHeader();
+}
+
+void forgetCard(uint64_t key) {
+  // After removeCard(): the last stored card moves into its slot
+  if (!tableStored) {
+    saveTable();
+    return;
+  }
+  int slot = storedSlot(key);
+  if (slot >= 0) {
+    int last = storedCount - 1;
+    if (slot != last) {
+      uint64_t moved;
+      EEPROM.get(EEPROM_KEYS + last * KEY_SIZE, moved);
+      EEPROM.put(EEPROM_KEYS + slot * KEY_SIZE, moved);
+      storeDenied(slot, storedDenied(last));
+    }
+    storedCount = last;
+  }
+  saveHeader();
+}
+
+void loadTable() {
+  TableHeader header;
+  EEPROM.get(0, header);
+  cardCount = 0;
+  tableChecksum = 0;
+  if (header.magic == TABLE_MAGIC && header.count <= MAX_CARDS) {
+    tableVersion = header.version;
+    bool repeated = false;
+    for (int i = 0; i < header.count; i++) {
+      uint64_t key;
+      EEPROM.get(EEPROM_KEYS + i * KEY_SIZE, key);
+      // A power cut while a card was moving leaves it in two slots
+      if (findCard(key) >= 0) repeated = true;
+      putCard(key, storedDenied(i));
+    }
+    storedCount = header.count;
+    tableStored = true;
+    if (repeated) saveTable();
+    return;
+  }
+  // Never synced: start from the built-in lists at version 0
+  tableVersion = 0;
+  for (int i = 0; i < permittedCount; i++) {
+    putCard(uidKey(permittedUsers[i].uid, 4), false);
+  }
+  for (int i = 0; i < deniedCount; i++) {
+    putCard(uidKey(deniedUsers[i].uid, 4), true);
+  }
+}
+
+byte parseUidHex(const String &hex, byte *uid) {
+  // "89D39D94" or "89 D3 9D 94" -> bytes, returns the UID length or 0
+  byte size = 0;
+  int nibbles = 0;
+  byte value = 0;
+  for (unsigned int i = 0; i < hex.length(); i++) {
+    char c = hex.charAt(i);
+    byte digit;
+    if (c >= '0' && c <= '9') digit = c - '0';
+    else if (c >= 'A' && c <= 'F') digit = c - 'A' + 10;
+    else if (c >= 'a' && c <= 'f') digit = c - 'a' + 10;
+    else if (c == ' ') continue;
+    else return 0;
+    value = (value << 4) | digit;
+    if (++nibbles % 2 == 0) {
+      if (size >= 10) return 0;
+      uid[size++] = value;
+      value = 0;
+    }
+  }
+  return nibbles % 2 ? 0 : size;
+}
+
+String field(const String &text, int n) {
+  // n-th ':' separated field of a command
+  int start = 0;
+  for (int i = 0; i < n; i++) {
+    start = text.indexOf(':', start) + 1;
+    if (start == 0) return "";
+  }
+  int end = text.indexOf(':', start);
+  return end < 0 ? text.substring(start) : text.substring(start, end);
+}
+
+bool uidField(const String &command, int n, uint64_t *key) {
+  byte uid[10];
+  byte size = parseUidHex(field(command, n), uid);
+  if (size == 0) return false;
+  *key = uidKey(uid, size);
+  return true;
+}
+
+void sendSyncReply(const char *kind) {
+  char reply[48];
+  snprintf(reply, sizeof(reply), "SYNC:%s:%lu:%d:%08lX", kind,
+           (unsigned long)tableVersion, cardCount, (unsigned long)tableChecksum);
+  sendText(reply);
+}
+
+void sendSyncNak(uint32_t version, const char *reason) {
+  char reply[48];
+  snprintf(reply, sizeof(reply), "SYNC:NAK:%lu:%lu:%s",
+           (unsigned long)version, (unsigned long)tableVersion, reason);
+  sendText(reply);
+}
+
+void handleSync(const String &command) {
+  String op = field(command, 1);
+  uint64_t key;
+  if (op == "VER?") {
+    char reply[48];
+    snprintf(reply, sizeof(reply), "SYNC:VER:%lu:%d:%08lX:%d", (unsigned long)tableVersion,
+             cardCount, (unsigned long)tableChecksum, MAX_CARDS);
+    sendText(reply);
+  }
+  else if (op == "BEGIN") {
+    cardCount = 0;
+    tableChecksum = 0;
+    tableLoading = true;
+  }
+  else if (op == "ROW") {
+    if (tableLoading && uidField(command, 2, &key)) {
+      putCard(key, field(command, 3) == "D");
+    }
+  }
+  else if (op == "END") {
+    tableLoading = false;
+    tableVersion = strtoul(field(command, 2).c_str(), nullptr, 10);
+    saveTable();
+    sendSyncReply("ACK");
+  }
+  else if (op == "PUT" || op == "DEL") {
+    // Deltas apply strictly in order, anything else asks for a reload
+    uint32_t version = strtoul(field(command, 2).c_str(), nullptr, 10);
+    if (version != tableVersion + 1) {
+      sendSyncNak(version, "ORDER");
+      return;
+    }
+    if (!uidField(command, 3, &key)) {
+      sendSyncNak(version, "UID");
+      return;
+    }
+    if (op == "PUT") {
+      bool denied = field(command, 4) == "D";
+      if (!putCard(key, denied)) {
+        sendSyncNak(version, "FULL");
+        return;
+      }
+      tableVersion = version;
+      saveCard(key, denied);
+    } else {
+      removeCard(key);
+      tableVersion = version;
+      forgetCard(key);
+    }
+    sendSyncReply("ACK");
+  }
+}
+
+uint16_t crc16Update(uint16_t crc, byte data) {
+  crc ^= (uint16_t)data << 8;
+  for (byte i = 0; i < 8; i++) {
+    crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+  }
+  return crc;
+}
+
+void sendFrame(byte type, const byte *payload, byte length) {
+  uint16_t crc = 0xFFFF;
+  crc = crc16Update(crc, type);
+  crc = crc16Update(crc, length);
+  for (byte i = 0; i < length; i++) {
+    crc = crc16Update(crc, payload[i]);
+  }
+  Serial.write(FRAME_SOF);
+  Serial.write(type);
+  Serial.write(length);
+  if (length) Serial.write(payload, length);
+  Serial.write((byte)(crc >> 8));
+  Serial.write((byte)(crc & 0xFF));
+}
+
+void sendUidFrame(byte type) {
+  // Payload is the UID length followed by the 4, 7 or 10 UID bytes
+  byte payload[11];
+  payload[0] = rfid.uid.size;
+  memcpy(payload + 1, rfid.uid.uidByte, rfid.uid.size);
+  sendFrame(type, payload, rfid.uid.size + 1);
+}
+
+void sendText(const char *text) {
+  if (binaryMode) {
+    sendFrame(MSG_TEXT, (const byte *)text, strlen(text));
+  } else {
+    Serial.println(text);
+  }
+}
+
+void startBinary(long baud) {
+  Serial.print("PROTO:BIN:");
+  Serial.println(baud);
+  Serial.flush();
+  Serial.begin(baud);
+  binaryMode = true;
+  linkConfirmed = false;
+  binarySince = millis();
+  rxState = 0;
+}
+
+void stopBinary() {
+  Serial.flush();
+  Serial.begin(TEXT_BAUD);
+  binaryMode = false;
+  linkConfirmed = false;
+}
+
+void handleCommand(String command) {
+  if (command.startsWith("SYNC:")) {
+    handleSync(command);
+  }
+  else if (command.startsWith("PROTO?BIN:")) {
+    long baud = command.substring(10).toInt();
+    if (baud > 0) {
+      startBinary(baud);
+    }
+  }
+  else if (command.startsWith("ADD_PERMITTED:")) {
+    // Format: ADD_PERMITTED:UID:NAME:ROLE. Only acknowledged: the card
+    // reaches the table through the versioned SYNC:PUT that follows
+    sendText("Received command to add permitted user");
+  }
+  else if (command.startsWith("ADD_DENIED:")) {
+    // Format: ADD_DENIED:UID:NAME, acknowledged like ADD_PERMITTED
+    sendText("Received command to add denied user");
+  }
+}
+
+void handleFrame() {
+  if (rxType == MSG_PING) {
+    linkConfirmed = true;
+    sendFrame(MSG_PONG, nullptr, 0);
+  }
+  else if (rxType == MSG_COMMAND) {
+    char text[MAX_FRAME_PAYLOAD + 1];
+    memcpy(text, rxPayload, rxLength);
+    text[rxLength] = '\0';
+    handleCommand(String(text));
+  }
+}
+
+void readFrames() {
+  // Byte-at-a-time parser. Bad CRCs and oversized frames are dropped and
+  // the parser waits for the next start byte.
+  while (Serial.available() > 0) {
+    byte b = Serial.read();
+    switch (rxState) {
+      case 0:
+        if (b == FRAME_SOF) rxState = 1;
+        break;
+      case 1:
+        rxType = b;
+        rxCrc = crc16Update(0xFFFF, b);
+        rxState = 2;
+        break;
+      case 2:
+        rxLength = b;
+        rxCount = 0;
+        rxCrc = crc16Update(rxCrc, b);
+        if (rxLength > MAX_FRAME_PAYLOAD) {
+          rxState = 0;
+        } else {
+          rxState = rxLength ? 3 : 4;
+        }
+        break;
+      case 3:
+        rxPayload[rxCount++] = b;
+        rxCrc = crc16Update(rxCrc, b);
+        if (rxCount == rxLength) rxState = 4;
+        break;
+      case 4:
+        rxState = (rxCrc >> 8) == b ? 5 : 0;
+        break;
+      case 5:
+        rxState = 0;
+        if ((rxCrc & 0xFF) == b) handleFrame();
+        break;
+    }
+  }
+}
+
 void processSerialCommand() {
+  if (binaryMode) {
+    readFrames();
+    // No PING from the host after the switch: fall back to text
+    if (!linkConfirmed && millis() - binarySince > HANDSHAKE_MS) {
+      stopBinary();
+    }
+    return;
+  }
   if (Serial.available() > 0) {
     String command = Serial.readStringUntil('\n');
     command.trim();
-    
-    if (command.startsWith("ADD_PERMITTED:")) {
-      // Handle adding permitted user
-      // Format: ADD_PERMITTED:UID:NAME:ROLE
-      Serial.println("Received command to add permitted user");
-    }
-    else if (command.startsWith("ADD_DENIED:")) {
-      // Handle adding denied user
-      // Format: ADD_DENIED:UID:NAME
-      Serial.println("Received command to add denied user");
-    }
+    handleCommand(command);
   }
 }
 
@@ -81,21 +588,26 @@ void loop() {
     return;
   }
 
-  Serial.print("Card UID: ");
-  for (byte i = 0; i < rfid.uid.size; i++) {
-    Serial.print(rfid.uid.uidByte[i] < 0x10 ? "0" : "");
-    Serial.print(rfid.uid.uidByte[i], HEX);
-    Serial.print(" ");
+  if (binaryMode) {
+    sendUidFrame(MSG_CARD);
+  } else {
+    Serial.print("Card UID: ");
+    for (byte i = 0; i < rfid.uid.size; i++) {
+      Serial.print(rfid.uid.uidByte[i] < 0x10 ? "0" : "");
+      Serial.print(rfid.uid.uidByte[i], HEX);
+      Serial.print(" ");
+    }
+    Serial.println();
   }
-  Serial.println();
 
-  bool isPermitted = false;
+  // Decide from the synced table, the built-in lists only supply names
+  int card = findCard(uidKey(rfid.uid.uidByte, rfid.uid.size));
+  bool isPermitted = card >= 0 && !isDenied(card);
   const char* name = nullptr;
   const char* role = nullptr;
 
-  for (int i = 0; i < permittedCount; i++) {
+  for (int i = 0; i < permittedCount && rfid.uid.size == 4; i++) {
     if (compareUID(rfid.uid.uidByte, permittedUsers[i].uid)) {
-      isPermitted = true;
       name = permittedUsers[i].name;
       role = permittedUsers[i].role;
       break;
@@ -103,13 +615,15 @@ void loop() {
   }
 
   if (isPermitted) {
-    Serial.println("Access Granted!");
+    if (binaryMode) {
+      sendUidFrame(MSG_GRANTED);
+    } else {
+      Serial.println("Access Granted!");
+    }
     if (name && role) {
-      Serial.print("Welcome, ");
-      Serial.print(name);
-      Serial.print(" (");
-      Serial.print(role);
-      Serial.println(")");
+      char welcome[64];
+      snprintf(welcome, sizeof(welcome), "Welcome, %s (%s)", name, role);
+      sendText(welcome);
     }
 
     digitalWrite(GREEN_LED, HIGH);
@@ -121,17 +635,22 @@ void loop() {
   } else {
     // Check if explicitly denied
     const char* deniedName = nullptr;
-    for (int i = 0; i < deniedCount; i++) {
+    for (int i = 0; i < deniedCount && rfid.uid.size == 4; i++) {
       if (compareUID(rfid.uid.uidByte, deniedUsers[i].uid)) {
         deniedName = deniedUsers[i].name;
         break;
       }
     }
 
-    Serial.println("Access Denied!");
+    if (binaryMode) {
+      sendUidFrame(MSG_DENIED);
+    } else {
+      Serial.println("Access Denied!");
+    }
     if (deniedName) {
-      Serial.print("WARNING: ");
-      Serial.println(deniedName);
+      char warning[64];
+      snprintf(warning, sizeof(warning), "WARNING: %s", deniedName);
+      sendText(warning);
     }
 
     digitalWrite(RED_LED, HIGH);
@@ -1,14 +1,51 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import serial
-import serial.tools.list_ports
+from tkinter import ttk, messagebox, filedialog
 import threading
 import time
-from datetime import datetime
-from tkinter import font as tkfont
-import json
 import os
-from PIL import Image, ImageTk
+import importlib.util
+import json
+from registry import PERMITTED, DENIED, normalize_uid
+from events import EventQueue, CardScan, DeviceMessage, LinkStatus, PortsChanged
+from protocol import parse_line
+from port_monitor import PortMonitor
+from serial_link import SerialLink, CONNECTED, DOWN
+from engine import ParkingEngine, GRANTED
+from enrollment import DEFAULT_DECISIONS
+from slots import OCCUPIED, load_layout
+from slot_canvas import SlotCanvas
+from image_cache import load_image
+from board_sync import AllowlistSync
+from cardholders import REPLACE, SKIP, stage_import
+from user_index import UserIndex, MAX_RESULTS, key_uid
+from virtual_list import VirtualList
+from metrics import QUEUE_WAIT, END_TO_END, TK_DRAIN, TK_LOG
+from status_api import DEFAULT_PORT, StatusServer
+
+# GUI images and the size they are shown at; resized copies are cached
+IMAGES = {
+    'logo': ('images/logo.png', (100, 100)),
+    'car': ('images/car.png', (30, 30)),
+    'connected': ('images/connected.png', (20, 20)),
+    'disconnected': ('images/disconnected.png', (20, 20)),
+}
+# Startup finishes when the window is mapped, or after this at the latest
+STARTUP_FALLBACK_MS = 1000
+# How often the main loop drains serial events, and how many per tick
+EVENT_DRAIN_MS = 50
+EVENT_BATCH = 64
+# Lines kept in the log view and how often queued lines are inserted
+LOG_VIEW_LINES = 2000
+LOG_FLUSH_MS = 100
+# How often the performance panel redraws while it is shown
+PERF_REFRESH_MS = 1000
+# How often the pending-cards panel catches up with the queue
+PENDING_REFRESH_MS = 200
+# The Arduino resets when the port opens, give it time before syncing
+SYNC_START_MS = 2500
+# How often a running import is checked for, and problems shown after it
+IMPORT_POLL_MS = 100
+IMPORT_ISSUES_SHOWN = 10
 
 class NeonButton(ttk.Button):
     def __init__(self, master=None, **kwargs):
@@ -29,8 +66,11 @@ class ParkingSystemGUI:
         self.root.geometry("1400x800")
         self.root.configure(bg='#0a0a0a')
         
-        # Load images
-        self.load_images()
+        # Filled in by load_images() once the window is up
+        self.images = {}
+        # perf_counter() when the window was first mapped and when startup finished
+        self.startup_times = {}
+        self.ready = False
         
         # Set custom style
         self.style = ttk.Style()
@@ -68,27 +108,37 @@ class ParkingSystemGUI:
                            foreground=self.neon_blue,
                            insertcolor=self.neon_blue)
         
-        # Initialize default users
-        self.default_users = [
-            {
-                "uid": "89 D3 9D 94",
-                "name": "Swaroop",
-                "role": "Admin"
-            },
-            {
-                "uid": "13 D3 09 27",
-                "name": "Tester",
-                "role": "User"
-            }
-        ]
-        
-        # Create a lookup dictionary for quick user info access
-        self.user_lookup = {user["uid"]: user for user in self.default_users}
-        
-        # Serial connection
-        self.serial_port = None
-        self.serial_thread = None
-        self.running = False
+        # Access decisions, users, slots and the event log live in the engine
+        # An optional lot.json describes zones and slot counts, see slots.py
+        layout = load_layout('lot.json') if os.path.exists('lot.json') else None
+        # Occupancy history is kept only when numpy is installed
+        analytics_path = 'analytics' if importlib.util.find_spec('numpy') else None
+        # Role hours and reserved zones, picked up again when policy.json changes
+        self.engine = ParkingEngine('users.json', log_path=os.path.join('logs', 'access.log'),
+                                    layout=layout, analytics_path=analytics_path,
+                                    sessions_path='sessions.json', policy_path='policy.json',
+                                    reservations_path='reservations.json')
+        self.engine.log.listeners.append(self.show_log_line)
+        self.pending_log_lines = []
+        self.log_flush_scheduled = False
+        self.pending_refresh_scheduled = False
+        self.pending_uids = []
+        self.import_thread = None
+        self.import_result = None
+        self.import_job = None
+        self.user_lookup = self.engine.registry
+        self.default_users = self.engine.default_users
+        
+        # Serial connection, owned by the link's thread; reconnects by itself
+        self.link = None
+        # Combobox entry -> PortInfo of the last port scan
+        self.port_infos = {}
+        self.ports_seen = False
+        # Keeps the board's card table in step with ours while connected
+        self.sync = None
+        
+        # Reader thread -> main loop hand-off
+        self.events = EventQueue()
         
         # Create main container
         self.main_container = ttk.Frame(self.root)
@@ -107,52 +157,71 @@ class ParkingSystemGUI:
         # Create connection frame
         self.create_connection_frame()
         
+        # Stage timings, hidden (and not collected) until toggled on
+        self.create_performance_frame()
+        
         # Create parking status frame
         self.create_parking_status_frame()
         
         # Create user management frame
         self.create_user_management_frame()
         
+        # Unknown cards waiting for enrollment
+        self.create_pending_frame()
+        
         # Create log frame
         self.create_log_frame()
         
-        # Initialize serial port list
-        self.update_ports()
+        self.port_monitor = PortMonitor()
+        self.port_monitor.listeners.append(self.on_ports_changed)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
+        # The window is drawn first; users, images and ports follow
+        self.root.bind("<Map>", self.on_first_map, add="+")
+        self.root.after(STARTUP_FALLBACK_MS, self.finish_startup)
+        
+    def on_first_map(self, event):
+        if 'shown' not in self.startup_times:
+            self.startup_times['shown'] = time.perf_counter()
+            # Let Tk draw the widgets before the slow part
+            self.root.after_idle(lambda: self.root.after(1, self.finish_startup))
+            
+    def finish_startup(self):
+        if self.ready:
+            return
+        self.ready = True
         # Load saved users and add default users if not present
-        self.load_users()
-        self.add_default_users()
+        self.engine.start()
+        self.refresh_user_lists()
+        self.load_images()
+        # Watch for boards being plugged in and out, off the UI thread
+        self.port_monitor.start()
+        # Start draining serial events on the Tk main loop
+        self.root.after(EVENT_DRAIN_MS, self.drain_events)
+        self.startup_times['ready'] = time.perf_counter()
         
     def load_images(self):
-        # Load and resize images
-        try:
-            # You can add your own images to the images directory
-            # For now, we'll use placeholder paths
-            self.images = {
-                'logo': self.create_image('images/logo.png', (100, 100)),
-                'car': self.create_image('images/car.png', (30, 30)),
-                'connected': self.create_image('images/connected.png', (20, 20)),
-                'disconnected': self.create_image('images/disconnected.png', (20, 20))
-            }
-        except:
-            self.images = {}
+        # You can add your own images to the images directory
+        for name, (path, size) in IMAGES.items():
+            image = self.create_image(path, size)
+            if image is not None:
+                self.images[name] = image
+        if 'logo' in self.images:
+            self.logo_label.config(image=self.images['logo'])
+        state = 'connected' if self.link is not None and self.link.connected else 'disconnected'
+        if state in self.images:
+            self.status_image.config(image=self.images[state])
             
     def create_image(self, path, size):
-        try:
-            img = Image.open(path)
-            img = img.resize(size, Image.Resampling.LANCZOS)
-            return ImageTk.PhotoImage(img)
-        except:
-            return None
+        return load_image(path, size)
         
     def create_header(self):
         header_frame = ttk.Frame(self.left_panel)
         header_frame.pack(fill="x", pady=(0, 20))
         
-        # Logo
-        if 'logo' in self.images:
-            logo_label = ttk.Label(header_frame, image=self.images['logo'])
-            logo_label.pack(side="left", padx=5)
+        # Logo, set once the images are loaded
+        self.logo_label = ttk.Label(header_frame)
+        self.logo_label.pack(side="left", padx=5)
         
         # Title
         title_frame = ttk.Frame(header_frame)
@@ -170,6 +239,7 @@ class ParkingSystemGUI:
     def create_connection_frame(self):
         connection_frame = ttk.LabelFrame(self.left_panel, text="Connection", padding="15")
         connection_frame.pack(fill="x", pady=(0, 20))
+        self.connection_frame = connection_frame
         
         # Connection controls
         controls_frame = ttk.Frame(connection_frame)
@@ -189,51 +259,162 @@ class ParkingSystemGUI:
         self.connect_button = NeonButton(controls_frame, text="🔌 Connect", command=self.toggle_connection)
         self.connect_button.pack(side="left", padx=5)
         
+        # Capture the session to captures/ for later replay
+        self.record_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(controls_frame, text="⏺ Record", variable=self.record_var).pack(side="left", padx=5)
+        
+        # Show the performance panel and collect stage timings
+        self.perf_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(controls_frame, text="📈 Performance", variable=self.perf_var,
+                        command=self.toggle_performance).pack(side="left", padx=5)
+        
         # Status indicator
         status_frame = ttk.Frame(connection_frame)
         status_frame.pack(fill="x", pady=5)
         
-        if 'disconnected' in self.images:
-            self.status_image = ttk.Label(status_frame, image=self.images['disconnected'])
-            self.status_image.pack(side="left", padx=5)
+        self.status_image = ttk.Label(status_frame)
+        self.status_image.pack(side="left", padx=5)
             
         self.connection_status = ttk.Label(status_frame, text="Disconnected", 
                                          foreground=self.error_color, style='Status.TLabel')
         self.connection_status.pack(side="left", padx=5)
         
+        # Event queue counters
+        self.queue_status = ttk.Label(status_frame, text="", style='Status.TLabel')
+        self.queue_status.pack(side="right", padx=5)
+        
     def create_parking_status_frame(self):
         status_frame = ttk.LabelFrame(self.left_panel, text="Parking Status", padding="15")
         status_frame.pack(fill="both", expand=True, pady=(0, 20))
         
-        # Create a grid for parking slots
-        self.slots = []
-        for i in range(4):
-            slot_frame = ttk.Frame(status_frame)
-            slot_frame.pack(fill="x", pady=5)
-            
-            # Slot number with car icon
-            if 'car' in self.images:
-                car_label = ttk.Label(slot_frame, image=self.images['car'])
-                car_label.pack(side="left", padx=5)
-            
-            slot_label = ttk.Label(slot_frame, text=f"Slot {i+1}:", style='Status.TLabel')
-            slot_label.pack(side="left", padx=5)
-            
-            # Status with color
-            status_label = ttk.Label(slot_frame, text="Available", foreground=self.neon_green, 
-                                   style='Status.TLabel')
-            status_label.pack(side="left", padx=5)
-            
-            # User info
-            user_info = ttk.Label(slot_frame, text="", style='Status.TLabel')
-            user_info.pack(side="left", padx=5)
-            
-            # Time occupied
-            time_label = ttk.Label(slot_frame, text="", style='Status.TLabel')
-            time_label.pack(side="right", padx=5)
+        # Auto-assign parks permitted cards without waiting for a slot choice
+        self.auto_assign_var = tk.BooleanVar(value=self.engine.auto_assign)
+        auto_assign_check = ttk.Checkbutton(status_frame, text="Auto-assign slots",
+                                            variable=self.auto_assign_var,
+                                            command=self.toggle_auto_assign)
+        auto_assign_check.pack(anchor="w", pady=(0, 5))
+        
+        # Drop repeat reads of a card that is still on the reader
+        self.dedup_var = tk.BooleanVar(value=self.engine.dedup.enabled)
+        ttk.Checkbutton(status_frame, text="Ignore repeat reads", variable=self.dedup_var,
+                        command=self.toggle_dedup).pack(anchor="w", pady=(0, 5))
+        
+        # Occupancy over HTTP for lobby displays, served off the Tk thread
+        self.status_server = None
+        self.status_api_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(status_frame, text=f"Status API on localhost:{DEFAULT_PORT}",
+                        variable=self.status_api_var,
+                        command=self.toggle_status_api).pack(anchor="w", pady=(0, 5))
+        
+        # Summary, zoom controls and the selection prompt
+        toolbar = ttk.Frame(status_frame)
+        toolbar.pack(fill="x", pady=(0, 5))
+        self.lot_summary = ttk.Label(toolbar, text="", style='Status.TLabel')
+        self.lot_summary.pack(side="left", padx=5)
+        NeonButton(toolbar, text="➖", width=3,
+                   command=lambda: self.slot_map.set_zoom(self.slot_map.zoom * 0.8)).pack(side="right")
+        NeonButton(toolbar, text="➕", width=3,
+                   command=lambda: self.slot_map.set_zoom(self.slot_map.zoom * 1.25)).pack(side="right")
+        
+        self.slot_detail = ttk.Label(status_frame, text="", style='Status.TLabel')
+        self.slot_detail.pack(side="bottom", fill="x", pady=(5, 0))
+        
+        # Lot map, one canvas for every slot
+        map_frame = ttk.Frame(status_frame)
+        map_frame.pack(fill="both", expand=True)
+        colors = {
+            'available': '#12301f', 'occupied': self.neon_blue, 'denied': '#4d0000',
+            'highlight': self.neon_green, 'outline': '#333333',
+            'text': self.fg_color, 'occupied_text': '#000000',
+        }
+        self.slot_map = SlotCanvas(map_frame, self.engine.slots, colors,
+                                   on_select=self.on_slot_clicked, metrics=self.engine.metrics,
+                                   bg='#1a1a1a')
+        map_scroll = ttk.Scrollbar(map_frame, orient="vertical", command=self.slot_map.yview)
+        self.slot_map.configure(yscrollcommand=map_scroll.set)
+        map_scroll.pack(side="right", fill="y")
+        self.slot_map.pack(side="left", fill="both", expand=True)
+        self.engine.slots.listeners.append(lambda index: self.update_lot_summary())
+        self.selecting_slot = False
+        self.update_lot_summary()
+        
+    def create_performance_frame(self):
+        self.perf_frame = ttk.LabelFrame(self.left_panel, text="Performance", padding="15")
+        self.perf_text = tk.Text(self.perf_frame, height=14, wrap=tk.NONE,
+                                 font=('Consolas', 9), bg='#1a1a1a', fg=self.neon_green)
+        self.perf_text.pack(fill="x", padx=5, pady=5)
+        
+        button_frame = ttk.Frame(self.perf_frame)
+        button_frame.pack(fill="x")
+        self.profile_button = NeonButton(button_frame, text="⏱ Start Profiling",
+                                         command=self.toggle_profiling)
+        self.profile_button.pack(side="left", padx=5)
+        NeonButton(button_frame, text="💾 Export",
+                   command=self.export_metrics).pack(side="left", padx=5)
+        NeonButton(button_frame, text="Reset",
+                   command=self.engine.metrics.reset).pack(side="right", padx=5)
+        self.perf_refresh_scheduled = False
+        
+    def toggle_performance(self):
+        metrics = self.engine.metrics
+        metrics.enabled = self.perf_var.get()
+        if metrics.enabled:
+            self.perf_frame.pack(fill="x", pady=(0, 20), after=self.connection_frame)
+            if not self.perf_refresh_scheduled:
+                self.perf_refresh_scheduled = True
+                self.root.after(PERF_REFRESH_MS, self.refresh_performance)
+        else:
+            self.perf_frame.pack_forget()
             
-            self.slots.append((status_label, time_label, user_info))
+    def refresh_performance(self):
+        self.perf_refresh_scheduled = False
+        if not self.engine.metrics.enabled:
+            return
+        queue = self.events.stats()
+        text = (self.engine.metrics.report() +
+                f"\nqueue depth {queue['depth']}, dropped {queue['dropped']}, "
+                f"max wait {queue['max_wait_ms']:.1f} ms")
+        self.perf_text.delete(1.0, tk.END)
+        self.perf_text.insert(tk.END, text)
+        self.perf_refresh_scheduled = True
+        self.root.after(PERF_REFRESH_MS, self.refresh_performance)
+        
+    def toggle_profiling(self):
+        profiler = self.engine.metrics.profiler
+        if profiler.profiling:
+            report = profiler.stop_profile() + "\n" + profiler.stop_tracemalloc()
+            os.makedirs('logs', exist_ok=True)
+            path = os.path.join('logs', time.strftime('profile-%Y%m%d-%H%M%S.txt'))
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(report)
+            self.profile_button.config(text="⏱ Start Profiling")
+            self.log_message(f"Profile written to {path}")
+        else:
+            profiler.start_profile()
+            profiler.start_tracemalloc()
+            self.profile_button.config(text="⏹ Stop Profiling")
+            self.log_message("Profiling the main loop (cProfile and tracemalloc)")
             
+    def export_metrics(self):
+        os.makedirs('logs', exist_ok=True)
+        base = os.path.join('logs', time.strftime('metrics-%Y%m%d-%H%M%S'))
+        metrics = self.engine.metrics
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(metrics.snapshot(), f, indent=2)
+        with open(base + '.prom', 'w', encoding='utf-8') as f:
+            f.write(metrics.prometheus())
+        self.log_message(f"Metrics written to {base}.json and {base}.prom")
+        
+    def update_lot_summary(self):
+        slots = self.engine.slots
+        text = f"{slots.free_count()} of {len(slots)} slots free"
+        if self.engine.analytics is not None:
+            summary = self.engine.analytics.summary()
+            text += f" | {summary['entries_today']} entries today"
+            if summary['avg_dwell_min'] is not None:
+                text += f", avg stay {summary['avg_dwell_min']:.0f} min"
+        self.lot_summary.config(text=text)
+        
     def create_user_management_frame(self):
         management_frame = ttk.LabelFrame(self.right_panel, text="User Management", padding="15")
         management_frame.pack(fill="both", expand=True, pady=(0, 20))
@@ -269,6 +450,25 @@ class ParkingSystemGUI:
                                   command=self.add_denied_user)
         add_denied_btn.pack(side="left", padx=5)
         
+        # Bulk onboarding from CSV / JSON lines files
+        import_btn = NeonButton(button_frame, text="📥 Import", command=self.import_users)
+        import_btn.pack(side="left", padx=5)
+        
+        export_btn = NeonButton(button_frame, text="📤 Export", command=self.export_users)
+        export_btn.pack(side="left", padx=5)
+        
+        self.replace_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(button_frame, text="Replace existing",
+                        variable=self.replace_var).pack(side="left", padx=5)
+        
+        # Search by UID, name or role; filters both lists as you type
+        search_frame = ttk.Frame(management_frame)
+        search_frame.pack(fill="x", pady=5)
+        ttk.Label(search_frame, text="🔍 Search:").pack(side="left", padx=5)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", lambda *args: self.refresh_user_lists())
+        ttk.Entry(search_frame, textvariable=self.search_var, width=30).pack(side="left", padx=5)
+        
         # User lists
         lists_frame = ttk.Frame(management_frame)
         lists_frame.pack(fill="both", expand=True, pady=5)
@@ -281,13 +481,16 @@ class ParkingSystemGUI:
         permitted_header = ttk.Frame(permitted_frame)
         permitted_header.pack(fill="x")
         
-        ttk.Label(permitted_header, text="Permitted Users:", style='Status.TLabel').pack(side="left")
+        self.permitted_label = ttk.Label(permitted_header, text="Permitted Users:", style='Status.TLabel')
+        self.permitted_label.pack(side="left")
         clear_permitted_btn = NeonButton(permitted_header, text="🗑️ Clear", command=self.clear_permitted_users)
         clear_permitted_btn.pack(side="right")
         
-        self.permitted_list = tk.Listbox(permitted_frame, width=40, height=10,
-                                       bg='#1a1a1a', fg=self.neon_green,
-                                       selectbackground=self.neon_blue)
+        # Only the rows in view are in the Listbox, the rest come from the index
+        self.permitted_index = UserIndex(self.engine.registry, PERMITTED)
+        self.permitted_list = VirtualList(permitted_frame, self.permitted_index, self.user_display,
+                                          width=40, height=10, bg='#1a1a1a', fg=self.neon_green,
+                                          selectbackground=self.neon_blue)
         self.permitted_list.pack(fill="both", expand=True)
         
         # Denied users list
@@ -298,15 +501,56 @@ class ParkingSystemGUI:
         denied_header = ttk.Frame(denied_frame)
         denied_header.pack(fill="x")
         
-        ttk.Label(denied_header, text="Denied Users:", style='Status.TLabel').pack(side="left")
+        self.denied_label = ttk.Label(denied_header, text="Denied Users:", style='Status.TLabel')
+        self.denied_label.pack(side="left")
         clear_denied_btn = NeonButton(denied_header, text="🗑️ Clear", command=self.clear_denied_users)
         clear_denied_btn.pack(side="right")
         
-        self.denied_list = tk.Listbox(denied_frame, width=40, height=10,
-                                    bg='#1a1a1a', fg=self.neon_red,
-                                    selectbackground=self.neon_blue)
+        self.denied_index = UserIndex(self.engine.registry, DENIED)
+        self.denied_list = VirtualList(denied_frame, self.denied_index, self.user_display,
+                                       width=40, height=10, bg='#1a1a1a', fg=self.neon_red,
+                                       selectbackground=self.neon_blue)
         self.denied_list.pack(fill="both", expand=True)
         
+    def create_pending_frame(self):
+        # Non-modal: unknown cards queue up here while scanning carries on
+        self.pending_frame = ttk.LabelFrame(self.right_panel, text="Pending Cards (0)", padding="15")
+        self.pending_frame.pack(fill="x", pady=(0, 20))
+        
+        options_frame = ttk.Frame(self.pending_frame)
+        options_frame.pack(fill="x", pady=5)
+        
+        # What the gate does with an unknown card until someone decides
+        ttk.Label(options_frame, text="Unknown cards:", style='Status.TLabel').pack(side="left", padx=5)
+        self.unknown_default_var = tk.StringVar(value=self.engine.enrollments.default)
+        default_combo = ttk.Combobox(options_frame, textvariable=self.unknown_default_var,
+                                     values=DEFAULT_DECISIONS, width=8, state="readonly")
+        default_combo.pack(side="left", padx=5)
+        default_combo.bind("<<ComboboxSelected>>", lambda e: self.set_unknown_default())
+        
+        # Name and role given to the cards that are approved or denied
+        ttk.Label(options_frame, text="Name:").pack(side="left", padx=5)
+        self.pending_name_entry = ttk.Entry(options_frame, width=15)
+        self.pending_name_entry.pack(side="left", padx=5)
+        ttk.Label(options_frame, text="Role:").pack(side="left", padx=5)
+        self.pending_role_entry = ttk.Entry(options_frame, width=15)
+        self.pending_role_entry.pack(side="left", padx=5)
+        
+        self.pending_list = tk.Listbox(self.pending_frame, height=5, selectmode=tk.EXTENDED,
+                                       bg='#1a1a1a', fg=self.neon_yellow,
+                                       selectbackground=self.neon_blue)
+        self.pending_list.pack(fill="x", pady=5)
+        
+        button_frame = ttk.Frame(self.pending_frame)
+        button_frame.pack(fill="x")
+        NeonButton(button_frame, text="✅ Approve", command=self.approve_pending).pack(side="left", padx=5)
+        NeonButton(button_frame, text="❌ Deny", command=self.deny_pending).pack(side="left", padx=5)
+        NeonButton(button_frame, text="🗑️ Dismiss", command=self.dismiss_pending).pack(side="left", padx=5)
+        NeonButton(button_frame, text="Select All",
+                   command=lambda: self.pending_list.selection_set(0, tk.END)).pack(side="right", padx=5)
+        
+        self.engine.enrollments.listeners.append(self.schedule_pending_refresh)
+        
     def create_log_frame(self):
         log_frame = ttk.LabelFrame(self.right_panel, text="Access Log", padding="15")
         log_frame.pack(fill="both", expand=True)
@@ -327,47 +571,66 @@ class ParkingSystemGUI:
         clear_btn.pack(side="bottom", pady=5)
         
     def update_ports(self):
-        # Get both port device names and descriptions
-        ports = list(serial.tools.list_ports.comports())
-        port_list = []
-        for port in ports:
-            # Format: "COM1 - USB Serial Device" or similar
-            port_desc = f"{port.device} - {port.description}"
-            port_list.append(port_desc)
-            
+        # Refresh button: rescan now, on a worker thread; a change arrives
+        # as a PortsChanged event like any hot-plug
+        threading.Thread(target=self.port_monitor.scan, daemon=True).start()
+        
+    def on_ports_changed(self, ports, added, removed):
+        # Runs on the monitor thread, hand the change to the main loop
+        self.events.put(PortsChanged(ports, added, removed, time.perf_counter()))
+        
+    def show_ports(self, event):
+        # Format: "COM1 - USB Serial Device" or similar
+        self.port_infos = {port.display(): port for port in event.ports}
+        port_list = list(self.port_infos)
         self.port_combo['values'] = port_list
-        if port_list:
+        if port_list and self.port_var.get() not in self.port_infos:
             self.port_combo.set(port_list[0])
-            # Store the actual port device name
-            self.port_var.set(ports[0].device)
+        # The first scan lists what was already there
+        if self.ports_seen:
+            for port in event.added:
+                self.log_message(f"Port added: {port.display()}")
+            for port in event.removed:
+                self.log_message(f"Port removed: {port.display()}")
+        self.ports_seen = True
+        # Our board is back, retry now rather than after the backoff delay
+        if self.link is not None and not self.link.connected and event.added:
+            self.link.wake()
             
+    def selected_target(self):
+        # The board behind the selected port, by VID/PID and serial number
+        # where known, so a replug under another name still finds it
+        text = self.port_var.get()
+        port = self.port_infos.get(text)
+        if port is not None:
+            return port.board_id
+        # A typed name, or "replay:<capture file>" to replay a session
+        return text.split(' - ')[0] if ' - ' in text else text
+        
     def toggle_connection(self):
-        if self.serial_port is None:
-            try:
-                # Extract the actual port name from the selection
-                port_name = self.port_var.get().split(' - ')[0] if ' - ' in self.port_var.get() else self.port_var.get()
-                self.serial_port = serial.Serial(
-                    port=port_name,
-                    baudrate=9600,
-                    timeout=1
-                )
-                self.running = True
-                self.serial_thread = threading.Thread(target=self.read_serial)
-                self.serial_thread.start()
-                self.connect_button.config(text="🔌 Disconnect")
-                self.connection_status.config(text="Connected", foreground=self.success_color)
-                self.system_status.config(text="⚡ System Active", foreground=self.neon_blue)
-                if 'connected' in self.images:
-                    self.status_image.config(image=self.images['connected'])
-                self.log_message("Connected to Arduino")
-            except Exception as e:
-                messagebox.showerror("Connection Error", str(e))
+        # Never waits on the port: the link opens, reads and closes it on
+        # its own thread and reports back with LinkStatus events
+        if self.link is None:
+            target = self.selected_target()
+            if not target:
+                messagebox.showerror("Connection Error", "No port selected")
+                return
+            record = None
+            if self.record_var.get():
+                os.makedirs('captures', exist_ok=True)
+                record = os.path.join('captures', time.strftime('session-%Y%m%d-%H%M%S.log'))
+            self.link = SerialLink(target, self.events.put, 9600, record=record,
+                                   metrics=self.engine.metrics, resolve=self.port_monitor.resolve)
+            self.sync = AllowlistSync(self.engine.registry, self.send_command, log=self.log_message)
+            self.link.start()
+            self.connect_button.config(text="🔌 Disconnect")
+            self.connection_status.config(text=f"Connecting to {target}...", foreground=self.warning_color)
         else:
-            self.running = False
-            if self.serial_thread:
-                self.serial_thread.join()
-            self.serial_port.close()
-            self.serial_port = None
+            self.link.stop()
+            self.link = None
+            if self.sync is not None:
+                self.sync.close()
+                self.sync = None
             self.connect_button.config(text="🔌 Connect")
             self.connection_status.config(text="Disconnected", foreground=self.error_color)
             self.system_status.config(text="⚡ System Ready", foreground=self.neon_blue)
@@ -375,191 +638,208 @@ class ParkingSystemGUI:
                 self.status_image.config(image=self.images['disconnected'])
             self.log_message("Disconnected from Arduino")
             
-    def read_serial(self):
-        while self.running:
-            try:
-                if self.serial_port and self.serial_port.is_open:
-                    line = self.serial_port.readline().decode('utf-8').strip()
-                    if line:
-                        self.process_serial_data(line)
-            except Exception as e:
-                self.log_message(f"Error reading serial: {str(e)}")
-                time.sleep(1)
-                
-    def process_serial_data(self, data):
-        if "Card UID:" in data:
-            self.log_message(data)
-            self.current_uid = data.split(": ")[1].strip()
+    def show_link_status(self, event):
+        # Ignore what a link we already stopped still reports
+        if self.link is None or event.state not in (CONNECTED, DOWN):
+            return
+        stats = self.link.stats()
+        if event.state == CONNECTED:
+            self.connection_status.config(text=f"Connected to {event.port}", foreground=self.success_color)
+            self.system_status.config(text="⚡ System Active", foreground=self.neon_blue)
+            if 'connected' in self.images:
+                self.status_image.config(image=self.images['connected'])
+            if stats['reconnects']:
+                self.log_message(f"Reconnected to Arduino on {event.port}, {event.message}")
+            else:
+                self.log_message(f"Connected to Arduino on {event.port}")
+            # The board resets when the port opens and may have lost its table
+            self.root.after(SYNC_START_MS, self.start_sync)
+        else:
+            self.connection_status.config(text="Reconnecting...", foreground=self.error_color)
+            if 'disconnected' in self.images:
+                self.status_image.config(image=self.images['disconnected'])
+            self.log_message(f"Serial link down: {event.message}")
             
-            # First check if it's a default user
-            if self.current_uid in self.user_lookup:
-                user = self.user_lookup[self.current_uid]
-                self.log_message(f"Welcome, {user['name']} ({user['role']})")
-                self.current_user = user
-                self.handle_user_access()
-                return
-                
-            # Then check if it's in permitted users list
-            permitted_user = self.find_permitted_user(self.current_uid)
-            if permitted_user:
-                name, role = permitted_user
-                user = {
-                    "uid": self.current_uid,
-                    "name": name,
-                    "role": role
-                }
-                self.current_user = user
-                self.log_message(f"Welcome, {name} ({role})")
-                self.handle_user_access()
+    def send_command(self, command):
+        if self.link is not None:
+            self.link.write((command + "\n").encode())
+            
+    def start_sync(self):
+        if self.sync is not None and self.link is not None and self.link.connected:
+            self.sync.start()
+            
+    def drain_events(self):
+        start = self.engine.metrics.start()
+        if self.events.drain(self.handle_event, EVENT_BATCH):
+            self.engine.metrics.observe(TK_DRAIN, start)
+        if self.sync is not None:
+            self.sync.check()
+        stats = self.events.stats()
+        text = (f"Queue {stats['depth']}/{stats['maxsize']}  "
+                f"dropped {stats['dropped']}  "
+                f"repeats {self.engine.dedup.suppressed}  "
+                f"drain {stats['last_drain_ms']:.1f} ms")
+        if self.link is not None:
+            link = self.link.stats()
+            text += f"  reconnects {link['reconnects']}  down {link['downtime_s']:.0f} s"
+        self.queue_status.config(text=text)
+        # Come back sooner while a burst is still queued
+        self.root.after(1 if stats['depth'] else EVENT_DRAIN_MS, self.drain_events)
+        
+    def handle_event(self, event):
+        if isinstance(event, CardScan):
+            metrics = self.engine.metrics
+            if metrics.enabled:
+                metrics.record(QUEUE_WAIT, time.perf_counter() - event.received)
+            # A card held on the reader is reported over and over
+            if self.engine.is_duplicate(event):
                 return
-                
-            # If not found anywhere, show add user dialog
-            self.show_add_user_dialog(self.current_uid)
-                
-    def find_permitted_user(self, uid):
-        # Search through permitted users list
-        for i in range(self.permitted_list.size()):
-            item = self.permitted_list.get(i)
-            if uid in item:
-                # Extract name and role from the item text
-                # Format is "UID - Name (Role)"
-                parts = item.split(" - ")
-                if len(parts) == 2:
-                    name_role = parts[1].strip()
-                    # Extract name and role from "Name (Role)"
-                    if "(" in name_role and ")" in name_role:
-                        name = name_role[:name_role.rfind("(")].strip()
-                        role = name_role[name_role.rfind("(")+1:name_role.rfind(")")].strip()
-                        return (name, role)
-        return None
-        
-    def handle_user_access(self):
-        # Check if user is already in a slot
-        for slot in self.slots:
-            status_label, time_label, user_info = slot
-            if status_label.cget("text") == "Occupied":
-                # Extract UID from user info
-                user_text = user_info.cget("text")
-                if user_text and " - " in user_text:
-                    stored_uid = user_text.split(" - ")[0]
-                    if stored_uid == self.current_uid:
-                        # User is already in this slot, free it
-                        status_label.config(text="Available", foreground=self.neon_green)
-                        time_label.config(text="")
-                        user_info.config(text="")
-                        self.log_message(f"Slot freed for {self.current_user['name']}")
-                        return
-        
-        # If not in a slot, show slot selection
-        self.show_slot_selection()
-        
-    def show_slot_selection(self):
-        # Create a new window for slot selection
-        selection_window = tk.Toplevel(self.root)
-        selection_window.title("Select Parking Slot")
-        selection_window.geometry("300x400")
-        selection_window.configure(bg=self.bg_color)
-        
-        # Make window modal
-        selection_window.transient(self.root)
-        selection_window.grab_set()
-        
-        # Title
-        title_label = ttk.Label(selection_window, text="Available Parking Slots", 
-                              style='Header.TLabel')
-        title_label.pack(pady=10)
-        
-        # Create scrollable frame
-        scroll_frame = ttk.Frame(selection_window)
-        scroll_frame.pack(fill="both", expand=True, padx=10, pady=5)
+            self.engine.log.append(event.raw)
+            self.process_card(event.uid)
+            if metrics.enabled:
+                metrics.observe(END_TO_END, event.received)
+        elif isinstance(event, DeviceMessage):
+            if self.sync is not None:
+                self.sync.handle_message(event.text)
+        elif isinstance(event, LinkStatus):
+            self.show_link_status(event)
+        elif isinstance(event, PortsChanged):
+            self.show_ports(event)
+            
+    def process_serial_data(self, data):
+        event = parse_line(data)
+        if isinstance(event, CardScan):
+            self.handle_event(event)
+            
+    def process_card(self, uid):
+        self.current_uid = uid
+        decision = self.engine.handle_scan(uid)
+        
+        # Unknown cards go to the pending panel, nothing here waits on them
+        if decision.outcome == GRANTED:
+            self.current_user = decision.user
+            self.show_slot_selection()
+            
+    def toggle_auto_assign(self):
+        self.engine.auto_assign = self.auto_assign_var.get()
         
-        # Add canvas and scrollbar
-        canvas = tk.Canvas(scroll_frame, bg=self.bg_color)
-        scrollbar = ttk.Scrollbar(scroll_frame, orient="vertical", command=canvas.yview)
+    def toggle_dedup(self):
+        self.engine.dedup.enabled = self.dedup_var.get()
+        self.engine.dedup.clear()
         
-        # Create button frame
-        button_frame = ttk.Frame(canvas)
+    def toggle_status_api(self):
+        if self.status_api_var.get():
+            server = StatusServer(self.engine)
+            try:
+                url = server.start_thread()
+            except OSError as e:
+                self.status_api_var.set(False)
+                self.log_message(f"Status API not started: {e}")
+                return
+            self.status_server = server
+            self.log_message(f"Status API on {url}")
+        elif self.status_server is not None:
+            # The server's thread winds down on its own
+            self.status_server.stop_thread(timeout=0)
+            self.status_server = None
+            self.log_message("Status API stopped")
         
-        # Configure scrolling
-        canvas.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side="right", fill="y")
-        canvas.pack(side="left", fill="both", expand=True)
-        
-        # Add button frame to canvas
-        canvas.create_window((0, 0), window=button_frame, anchor="nw")
-        
-        # Create buttons for available slots
-        for i, slot in enumerate(self.slots):
-            status_label, time_label, user_info = slot
-            status = status_label.cget("text")
-            if status == "Available" or status == "Denied":
-                btn = NeonButton(button_frame, text=f"Slot {i+1}", 
-                               command=lambda idx=i: self.select_slot(idx, selection_window))
-                btn.pack(pady=5)
-        
-        # Update scroll region
-        button_frame.update_idletasks()
-        canvas.configure(scrollregion=canvas.bbox("all"))
-        
-        # Add mousewheel scrolling
-        canvas.bind_all("<MouseWheel>", lambda e: canvas.yview_scroll(-1*(e.delta//120), "units"))
-        
-        # Cleanup on window close
-        def on_closing():
-            canvas.unbind_all("<MouseWheel>")
-            selection_window.destroy()
-        selection_window.protocol("WM_DELETE_WINDOW", on_closing)
+    def show_slot_selection(self):
+        # Highlight free slots on the map and wait for the operator to click
+        # one; scanning carries on meanwhile
+        self.selecting_slot = True
+        user = self.current_user
+        # Slots in zones reserved for other roles or booked by other drivers stay unlit
+        self.slot_map.set_highlight_free(True, lambda index: self.engine.slot_allowed(index, user))
+        self.slot_detail.config(text=f"Select a slot for {self.current_user['name']} "
+                                     f"(Esc to cancel)", foreground=self.warning_color)
+        self.root.bind("<Escape>", lambda e: self.cancel_slot_selection())
+        
+    def cancel_slot_selection(self):
+        self.selecting_slot = False
+        self.slot_map.set_highlight_free(False)
+        self.slot_detail.config(text="", foreground=self.fg_color)
+        self.root.unbind("<Escape>")
+        
+    def on_slot_clicked(self, index):
+        slot = self.engine.slots[index]
+        if self.selecting_slot and slot.free:
+            if not self.engine.slot_allowed(index, self.current_user):
+                self.slot_detail.config(text=f"{slot.label} is reserved or booked, pick another slot "
+                                             f"for {self.current_user['name']} (Esc to cancel)",
+                                        foreground=self.warning_color)
+                return
+            self.select_slot(index)
+            return
+        if slot.state == OCCUPIED:
+            since = slot.since.strftime('%H:%M:%S')
+            self.slot_detail.config(text=f"{slot.label}: {slot.occupant()} since {since}",
+                                    foreground=self.fg_color)
+        else:
+            self.slot_detail.config(text=f"{slot.label}: {slot.state}", foreground=self.fg_color)
             
-    def select_slot(self, slot_index, window):
+    def select_slot(self, slot_index, window=None):
         # Update the selected slot
         self.update_parking_status(True, slot_index)
-        # Close the selection window
-        window.destroy()
+        self.cancel_slot_selection()
+        if window is not None:
+            window.destroy()
             
     def update_parking_status(self, granted, slot_index=None):
-        current_time = datetime.now().strftime("%H:%M:%S")
-        
         if slot_index is not None and granted and hasattr(self, 'current_user'):
             # Update specific slot with current user info
-            status_label, time_label, user_info = self.slots[slot_index]
-            current_status = status_label.cget("text")
-            if current_status == "Available" or current_status == "Denied":
-                status_label.config(text="Occupied", foreground=self.neon_green)
-                time_label.config(text=f"Since {current_time}")
-                # Use current_user info for consistent display
-                user_info.config(text=f"{self.current_uid} - {self.current_user['name']} ({self.current_user['role']})", 
-                               foreground=self.neon_blue)
+            self.engine.occupy_slot(slot_index, self.current_user)
         else:
             # Handle denied access
-            for slot in self.slots:
-                status_label, time_label, user_info = slot
-                current_status = status_label.cget("text")
-                if current_status == "Available" or current_status == "Denied":
-                    status_label.config(text="Denied",
-                                      foreground=self.neon_red)
-                    time_label.config(text=f"Since {current_time}")
-                    user_info.config(text="")
-                    break
+            self.engine.mark_denied()
                 
     def update_user_info(self, name, role):
-        for slot in self.slots:
-            status_label, time_label, user_info = slot
-            if status_label.cget("text") == "Occupied":
+        for slot in self.engine.slots:
+            if slot.state == OCCUPIED:
                 # Update only the name and role part, keeping the UID
-                current_text = user_info.cget("text")
-                if " - " in current_text:
-                    uid = current_text.split(" - ")[0]
-                    user_info.config(text=f"{uid} - {name} ({role})", foreground=self.neon_blue)
+                slot.name = name
+                slot.role = role
+                self.slot_map.mark_dirty(slot.index)
                 break
                 
     def log_message(self, message):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.log_text.insert("end", f"[{timestamp}] {message}\n")
+        self.engine.log.append(message)
+        
+    def show_log_line(self, line):
+        # Batch lines and insert them together on the next flush
+        self.pending_log_lines.append(line)
+        if not self.log_flush_scheduled:
+            self.log_flush_scheduled = True
+            self.root.after(LOG_FLUSH_MS, self.flush_log_view)
+            
+    def flush_log_view(self):
+        self.log_flush_scheduled = False
+        lines = self.pending_log_lines[-LOG_VIEW_LINES:]
+        self.pending_log_lines = []
+        if not lines:
+            return
+        start = self.engine.metrics.start()
+        self.log_text.insert("end", "\n".join(lines) + "\n")
+        # Trim the oldest lines so the widget never grows past LOG_VIEW_LINES
+        excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - LOG_VIEW_LINES
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
         self.log_text.see("end")
+        self.engine.metrics.observe(TK_LOG, start)
         
     def clear_log(self):
+        self.pending_log_lines = []
         self.log_text.delete(1.0, tk.END)
         
+    def on_close(self):
+        if self.link is not None:
+            self.toggle_connection()
+        self.port_monitor.stop()
+        if self.status_server is not None:
+            self.status_server.stop_thread()
+        self.engine.close()
+        self.root.destroy()
+        
     def add_permitted_user(self):
         uid = self.uid_entry.get()
         name = self.name_entry.get()
@@ -568,14 +848,16 @@ class ParkingSystemGUI:
         if not all([uid, name, role]):
             messagebox.showwarning("Input Error", "Please fill in all fields")
             return
+        if normalize_uid(uid) is None:
+            messagebox.showwarning("Input Error", f"Invalid UID: {uid}")
+            return
             
         # Format the command to send to Arduino
-        command = f"ADD_PERMITTED:{uid}:{name}:{role}\n"
-        if self.serial_port and self.serial_port.is_open:
-            self.serial_port.write(command.encode())
+        command = f"ADD_PERMITTED:{normalize_uid(uid)}:{name}:{role}\n"
+        if self.link is not None and self.link.write(command.encode()):
             self.log_message(f"Added permitted user: {name} ({role})")
-            self.permitted_list.insert(tk.END, f"{name} ({role})")
-            self.save_users()
+            self.engine.enroll(uid, name, role, PERMITTED)
+            self.refresh_user_lists()
         else:
             messagebox.showerror("Error", "Not connected to Arduino")
             
@@ -586,171 +868,181 @@ class ParkingSystemGUI:
         if not all([uid, name]):
             messagebox.showwarning("Input Error", "Please fill in UID and Name fields")
             return
+        if normalize_uid(uid) is None:
+            messagebox.showwarning("Input Error", f"Invalid UID: {uid}")
+            return
             
         # Format the command to send to Arduino
-        command = f"ADD_DENIED:{uid}:{name}\n"
-        if self.serial_port and self.serial_port.is_open:
-            self.serial_port.write(command.encode())
+        command = f"ADD_DENIED:{normalize_uid(uid)}:{name}\n"
+        if self.link is not None and self.link.write(command.encode()):
             self.log_message(f"Added denied user: {name}")
-            self.denied_list.insert(tk.END, name)
-            self.save_users()
+            self.engine.enroll(uid, name, self.role_entry.get(), DENIED)
+            self.refresh_user_lists()
         else:
             messagebox.showerror("Error", "Not connected to Arduino")
             
-    def save_users(self):
-        users = {
-            'permitted': [self.permitted_list.get(i) for i in range(self.permitted_list.size())],
-            'denied': [self.denied_list.get(i) for i in range(self.denied_list.size())]
-        }
-        with open('users.json', 'w') as f:
-            json.dump(users, f)
-            
-    def load_users(self):
+    def import_users(self):
+        if self.import_thread is not None or self.import_job is not None:
+            messagebox.showwarning("Import", "An import is already running")
+            return
+        path = filedialog.askopenfilename(title="Import cardholders",
+                                          filetypes=[("Cardholders", "*.csv *.jsonl *.ndjson"),
+                                                     ("All files", "*.*")])
+        if not path:
+            return
+        policy = REPLACE if self.replace_var.get() else SKIP
+        
+        def stage():
+            # Reading and checking the file is the slow part, keep it off
+            # the Tk loop. It does not touch the registry; the rows are
+            # compared and committed on the Tk thread in apply_import_batch()
+            try:
+                self.import_result = stage_import(path)
+            except Exception as e:
+                self.import_result = e
+                
+        self.import_result = None
+        self.import_thread = threading.Thread(target=stage, daemon=True)
+        self.import_thread.start()
+        self.log_message(f"Importing {os.path.basename(path)}...")
+        self.root.after(IMPORT_POLL_MS, lambda: self.finish_import(policy))
+        
+    def finish_import(self, policy):
+        if self.import_thread.is_alive():
+            self.root.after(IMPORT_POLL_MS, lambda: self.finish_import(policy))
+            return
+        self.import_thread = None
+        if isinstance(self.import_result, Exception):
+            messagebox.showerror("Import Error", str(self.import_result))
+            return
+        staged, report = self.import_result
+        self.import_result = None
+        self.import_job = (staged, report, self.engine.apply_import(staged, report, policy))
+        self.apply_import_batch()
+        
+    def apply_import_batch(self):
+        # One batch per turn of the Tk loop, so scans keep being served
+        staged, report, batches = self.import_job
         try:
-            with open('users.json', 'r') as f:
-                users = json.load(f)
-                for user in users['permitted']:
-                    self.permitted_list.insert(tk.END, user)
-                for user in users['denied']:
-                    self.denied_list.insert(tk.END, user)
-        except FileNotFoundError:
+            next(batches)
+        except StopIteration:
             pass
-
+        except Exception as e:
+            staged.close()
+            self.import_job = None
+            self.refresh_user_lists()
+            messagebox.showerror("Import Error", str(e))
+            return
+        else:
+            self.root.after(1, self.apply_import_batch)
+            return
+        staged.close()
+        self.import_job = None
+        # Once for the whole file
+        self.refresh_user_lists()
+        details = "\n".join(f"Line {line_no}: {message}"
+                            for line_no, kind, message in report.issues[:IMPORT_ISSUES_SHOWN])
+        messagebox.showinfo("Import", report.summary() + ("\n\n" + details if details else ""))
+        
+    def export_users(self):
+        path = filedialog.asksaveasfilename(title="Export cardholders", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON lines", "*.jsonl")])
+        if not path:
+            return
+        try:
+            self.engine.export_cardholders(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Export Error", str(e))
+            
+    def refresh_user_lists(self):
+        # The indexes follow the registry by themselves; this only redraws
+        # the rows in view, filtered by the search box
+        query = self.search_var.get()
+        for title, label, index, view in (
+                ("Permitted Users", self.permitted_label, self.permitted_index, self.permitted_list),
+                ("Denied Users", self.denied_label, self.denied_index, self.denied_list)):
+            results = index.search(query)
+            if results is None:
+                # Keep the scroll position unless a search was showing
+                if view.rows is index:
+                    view.refresh()
+                else:
+                    view.set_rows(index)
+                label.config(text=f"{title} ({len(index)}):")
+            else:
+                view.set_rows(results)
+                more = "+" if len(results) >= MAX_RESULTS else ""
+                label.config(text=f"{title} ({len(results)}{more} of {len(index)}):")
+                
+    def user_display(self, key):
+        record = self.engine.registry.get(key_uid(key))
+        return record.display() if record is not None else ""
+            
     def clear_permitted_users(self):
-        self.permitted_list.delete(0, tk.END)
-        self.save_users()
+        self.engine.clear_users(PERMITTED)
+        self.refresh_user_lists()
         self.log_message("Cleared permitted users list")
         
     def clear_denied_users(self):
-        self.denied_list.delete(0, tk.END)
-        self.save_users()
+        self.engine.clear_users(DENIED)
+        self.refresh_user_lists()
         self.log_message("Cleared denied users list")
 
-    def add_default_users(self):
-        for user in self.default_users:
-            # Check if user already exists in the permitted list
-            user_exists = False
-            for i in range(self.permitted_list.size()):
-                if user["uid"] in self.permitted_list.get(i):
-                    user_exists = True
-                    break
-                    
-            if not user_exists:
-                # Add user to permitted users list
-                user_text = f"{user['name']} ({user['role']})"
-                self.permitted_list.insert(tk.END, user_text)
-                self.save_users()
-                self.log_message(f"Added default user: {user_text}")
-
-    def add_to_permitted_list(self, uid, name, role):
-        # Check if user already exists in the permitted list
-        for i in range(self.permitted_list.size()):
-            if uid in self.permitted_list.get(i):
-                return  # User already in list
-                
-        # Add to permitted list
-        user_text = f"{uid} - {name} ({role})"
-        self.permitted_list.insert(tk.END, user_text)
-        self.save_users()
-        self.log_message(f"Added to permitted users: {user_text}")
-        
-    def show_add_user_dialog(self, uid):
-        # Create dialog window
-        dialog = tk.Toplevel(self.root)
-        dialog.title("Add New User")
-        dialog.geometry("400x300")
-        dialog.configure(bg=self.bg_color)
-        dialog.transient(self.root)
-        dialog.grab_set()
-        
-        # Title
-        title_label = ttk.Label(dialog, text="Add New User", style='Header.TLabel')
-        title_label.pack(pady=10)
-        
-        # UID display
-        uid_frame = ttk.Frame(dialog)
-        uid_frame.pack(fill="x", padx=10, pady=5)
-        ttk.Label(uid_frame, text="UID:").pack(side="left", padx=5)
-        ttk.Label(uid_frame, text=uid, foreground=self.neon_blue).pack(side="left")
-        
-        # Name input
-        name_frame = ttk.Frame(dialog)
-        name_frame.pack(fill="x", padx=10, pady=5)
-        ttk.Label(name_frame, text="Name:").pack(side="left", padx=5)
-        name_entry = ttk.Entry(name_frame, style='TEntry')
-        name_entry.pack(side="left", fill="x", expand=True)
-        
-        # Role input
-        role_frame = ttk.Frame(dialog)
-        role_frame.pack(fill="x", padx=10, pady=5)
-        ttk.Label(role_frame, text="Role:").pack(side="left", padx=5)
-        role_entry = ttk.Entry(role_frame, style='TEntry')
-        role_entry.pack(side="left", fill="x", expand=True)
-        
-        # User type selection
-        type_frame = ttk.Frame(dialog)
-        type_frame.pack(fill="x", padx=10, pady=10)
-        
-        user_type = tk.StringVar(value="permitted")  # Default to permitted
-        
-        type_label = ttk.Label(type_frame, text="User Type:", style='Status.TLabel')
-        type_label.pack(pady=5)
-        
-        # Radio buttons for user type
-        permitted_radio = ttk.Radiobutton(type_frame, text="Permitted User", 
-                                        variable=user_type, value="permitted")
-        permitted_radio.pack(pady=2)
-        
-        denied_radio = ttk.Radiobutton(type_frame, text="Denied User", 
-                                     variable=user_type, value="denied")
-        denied_radio.pack(pady=2)
-        
-        def save_user():
-            name = name_entry.get().strip()
-            role = role_entry.get().strip()
-            is_permitted = user_type.get() == "permitted"
+    def set_unknown_default(self):
+        self.engine.enrollments.default = self.unknown_default_var.get()
+        self.log_message(f"Unknown cards now default to: {self.engine.enrollments.default}")
+        
+    def schedule_pending_refresh(self):
+        # Bursts of unknown cards cost one Listbox rebuild per interval
+        if not self.pending_refresh_scheduled:
+            self.pending_refresh_scheduled = True
+            self.root.after(PENDING_REFRESH_MS, self.refresh_pending)
             
-            if name and role:
-                # Create user info
-                new_user = {
-                    "uid": uid,
-                    "name": name,
-                    "role": role
-                }
+    def refresh_pending(self):
+        self.pending_refresh_scheduled = False
+        selected = set(self.selected_pending())
+        entries = list(self.engine.enrollments)
+        self.pending_uids = [entry.uid for entry in entries]
+        self.pending_list.delete(0, tk.END)
+        if entries:
+            self.pending_list.insert(tk.END, *[entry.display() for entry in entries])
+        for index, uid in enumerate(self.pending_uids):
+            if uid in selected:
+                self.pending_list.selection_set(index)
+        self.pending_frame.config(text=f"Pending Cards ({len(entries)})")
+        
+    def selected_pending(self):
+        return [self.pending_uids[i] for i in self.pending_list.curselection()
+                if i < len(self.pending_uids)]
+        
+    def approve_pending(self):
+        uids = self.selected_pending()
+        if not uids:
+            messagebox.showwarning("Pending Cards", "Select one or more pending cards first")
+            return
+        decisions = self.engine.approve_pending(uids, self.pending_name_entry.get().strip(),
+                                                self.pending_role_entry.get().strip())
+        self.refresh_user_lists()
+        # A held driver is still at the gate: give the first one a slot now
+        granted = [d for d in decisions if d.outcome == GRANTED]
+        for decision in granted[1:]:
+            self.log_message(f"{decision.user.name} approved, scan again to pick a slot")
+        if granted:
+            self.current_uid = granted[0].uid
+            self.current_user = granted[0].user
+            self.show_slot_selection()
                 
-                if is_permitted:
-                    # Add to default users and lookup
-                    self.default_users.append(new_user)
-                    self.user_lookup[uid] = new_user
-                    
-                    # Add to permitted list
-                    self.add_to_permitted_list(uid, name, role)
-                    
-                    # Set as current user and show slot selection
-                    self.current_user = new_user
-                    dialog.destroy()
-                    self.show_slot_selection()
-                else:
-                    # Add to denied list
-                    user_text = f"{uid} - {name} ({role})"
-                    self.denied_list.insert(tk.END, user_text)
-                    self.save_users()
-                    self.log_message(f"Added to denied users: {user_text}")
-                    dialog.destroy()
-            else:
-                messagebox.showwarning("Input Error", "Please fill in all fields")
-        
-        # Buttons
-        button_frame = ttk.Frame(dialog)
-        button_frame.pack(fill="x", padx=10, pady=10)
-        
-        cancel_btn = NeonButton(button_frame, text="Cancel", 
-                              command=dialog.destroy)
-        cancel_btn.pack(side="right", padx=5)
+    def deny_pending(self):
+        uids = self.selected_pending()
+        if not uids:
+            messagebox.showwarning("Pending Cards", "Select one or more pending cards first")
+            return
+        self.engine.deny_pending(uids, self.pending_name_entry.get().strip(),
+                                 self.pending_role_entry.get().strip())
+        self.refresh_user_lists()
         
-        save_btn = NeonButton(button_frame, text="Save", 
-                             command=save_user)
-        save_btn.pack(side="right", padx=5)
+    def dismiss_pending(self):
+        self.engine.dismiss_pending(self.selected_pending())
 
 if __name__ == "__main__":
     root = tk.Tk()
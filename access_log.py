@@ -0,0 +1,89 @@
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from collections import deque
+from datetime import datetime
+
+DEFAULT_MAXLEN = 1000
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 10
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class AccessLogSink:
+    # Writes full log history to disk on a background thread. Callers only
+    # put records on an unbounded queue, so they never wait on disk I/O.
+    # Rotates by size, or by time when `when` is given (see
+    # TimedRotatingFileHandler), and gzips rotated files.
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUPS,
+                 when=None, compress=True):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if when:
+            handler = logging.handlers.TimedRotatingFileHandler(
+                path, when=when, backupCount=backup_count, encoding="utf-8")
+        else:
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        if compress:
+            handler.namer = _gzip_namer
+            handler.rotator = _gzip_rotator
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._handler = handler
+        self._listener.start()
+
+    def write(self, line):
+        self._queue.put(logging.makeLogRecord({"msg": line, "levelno": logging.INFO}))
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._handler.close()
+            self._listener = None
+
+
+class EventLog:
+    # Recent log lines in a fixed-size ring buffer, with optional listeners
+    # for live views and an optional sink that keeps the full history.
+    def __init__(self, maxlen=DEFAULT_MAXLEN, sink=None):
+        self.entries = deque(maxlen=maxlen)
+        self.listeners = []
+        self.sink = sink
+
+    def append(self, message):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        line = f"[{timestamp}] {message}"
+        self.entries.append(line)
+        if self.sink is not None:
+            self.sink.write(line)
+        for listener in self.listeners:
+            listener(line)
+        return line
+
+    def tail(self, count):
+        if count >= len(self.entries):
+            return list(self.entries)
+        return list(self.entries)[-count:]
+
+    def clear(self):
+        self.entries.clear()
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
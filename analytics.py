@@ -0,0 +1,424 @@
+import bisect
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Parking history for occupancy analytics. Entry and exit events are kept
+# as append-only columns, one raw little-endian file per column in a
+# directory, and read back through np.memmap so queries over months of
+# events never load them whole.
+#
+# Rolling aggregates (per-hour entries, exits and occupied slot-seconds, a
+# dwell histogram, per-role usage and entries by hour of day) are rebuilt
+# with a few vectorized passes when the store opens, then updated as each
+# event arrives.
+
+ENTRY = 1
+EXIT = 2
+# Session left open by a previous run, closed without counting a dwell
+CLEARED = 3
+
+COLUMNS = (
+    ("ts", "<f8"),      # time.time() of the event, never decreasing
+    ("kind", "u1"),
+    ("slot", "<u4"),
+    ("uid", "<u4"),     # line number in uids.txt
+    ("role", "<u2"),    # line number in roles.txt
+    ("dwell", "<f4"),   # seconds parked, on EXIT events
+)
+FLUSH_EVERY = 1024
+BUCKET = 3600
+# Dwell histogram bin edges in minutes, the last bin is open ended
+DWELL_EDGES = (0, 5, 15, 30, 60, 120, 240, 480, 720, 1440)
+
+
+class ColumnStore:
+    # Fixed-width columns appended in step. Rows are buffered and written
+    # every flush_every rows; column() flushes and returns a read-only
+    # memmap of one column.
+    def __init__(self, directory, columns=COLUMNS, flush_every=FLUSH_EVERY):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in columns}
+        self.flush_every = flush_every
+        self._pending = {name: [] for name in self.dtypes}
+        self._views = {}
+        self.length = self._repair()
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def _repair(self):
+        # A crash between column writes leaves some columns a few rows
+        # longer than others: cut them all back to the shortest
+        lengths = []
+        for name, dtype in self.dtypes.items():
+            path = self._path(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            lengths.append(size // dtype.itemsize)
+        length = min(lengths)
+        for name, dtype in self.dtypes.items():
+            with open(self._path(name), "ab") as f:
+                f.truncate(length * dtype.itemsize)
+        return length
+
+    def __len__(self):
+        return self.length + len(self._pending["ts"])
+
+    def append(self, **row):
+        for name, values in self._pending.items():
+            values.append(row[name])
+        if len(self._pending["ts"]) >= self.flush_every:
+            self.flush()
+
+    def extend(self, columns):
+        # Bulk append of equal-length arrays, one per column
+        self.flush()
+        count = len(columns["ts"])
+        for name, dtype in self.dtypes.items():
+            data = np.asarray(columns[name], dtype=dtype)
+            if len(data) != count:
+                raise ValueError(f"column {name} has {len(data)} rows, expected {count}")
+            with open(self._path(name), "ab") as f:
+                data.tofile(f)
+        self.length += count
+        self._views = {}
+
+    def flush(self):
+        count = len(self._pending["ts"])
+        if not count:
+            return
+        for name, dtype in self.dtypes.items():
+            with open(self._path(name), "ab") as f:
+                np.asarray(self._pending[name], dtype=dtype).tofile(f)
+            self._pending[name].clear()
+        self.length += count
+        self._views = {}
+
+    def column(self, name):
+        self.flush()
+        view = self._views.get(name)
+        if view is None:
+            if self.length:
+                view = np.memmap(self._path(name), self.dtypes[name], mode="r", shape=(self.length,))
+            else:
+                view = np.empty(0, self.dtypes[name])
+            self._views[name] = view
+        return view
+
+
+class _Names:
+    # Append-only string table, one name per line, addressed by line number
+    def __init__(self, path):
+        self.names = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.names = [line.rstrip("\n") for line in f]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def intern(self, name):
+        i = self.index.get(name)
+        if i is None:
+            i = len(self.names)
+            self.names.append(name)
+            self.index[name] = i
+            self._file.write(name + "\n")
+            self._file.flush()
+        return i
+
+    def close(self):
+        self._file.close()
+
+
+def _local_offset():
+    return datetime.now().astimezone().utcoffset().total_seconds()
+
+
+class OccupancyAnalytics:
+    def __init__(self, directory, slot_count=None, bucket=BUCKET):
+        self.store = ColumnStore(directory)
+        self.slot_count = slot_count
+        self.bucket = bucket
+        self.uids = _Names(os.path.join(directory, "uids.txt"))
+        self.roles = _Names(os.path.join(directory, "roles.txt"))
+        # Hour-of-day figures use the current UTC offset for all events
+        self.utc_offset = _local_offset()
+        # Open sessions: slot -> (entry time, uid index, role index)
+        self.open = {}
+        self.parked = 0
+        self._last_ts = 0.0
+        # bucket number (time // bucket) -> value
+        self.entries = {}
+        self.exits = {}
+        self.occupied_seconds = {}
+        self.dwell_counts = [0] * len(DWELL_EDGES)
+        self.hour_entries = [0] * 24
+        # role index -> [entries, exits, dwell seconds]
+        self.role_totals = {}
+        self._rebuild()
+
+    # Loading
+
+    def _rebuild(self):
+        store = self.store
+        ts = store.column("ts")
+        if not len(ts):
+            return
+        kind = store.column("kind")
+        dwell = store.column("dwell")
+        role = store.column("role")
+        entry = kind == ENTRY
+        exit_ = kind == EXIT
+        buckets = (ts // self.bucket).astype(np.int64)
+        self.entries = _bucket_counts(buckets[entry])
+        self.exits = _bucket_counts(buckets[exit_])
+
+        # Occupied slot-seconds per bucket from the integral of occupancy,
+        # F(t) = t * C(t) - sum(delta * t_event) over events up to t
+        delta = np.where(entry, 1, -1)
+        rel = ts - ts[0]
+        occupancy = np.cumsum(delta)
+        weighted = np.cumsum(delta * rel)
+        first, last = int(buckets[0]), int(buckets[-1])
+        points = np.concatenate(([ts[0]], np.arange(first + 1, last + 1) * float(self.bucket), [ts[-1]]))
+        index = np.searchsorted(ts, points, side="right") - 1
+        area = (points - ts[0]) * occupancy[index] - weighted[index]
+        seconds = np.diff(area)
+        self.occupied_seconds = {first + i: float(s) for i, s in enumerate(seconds) if s > 0}
+        self.parked = int(occupancy[-1])
+        self._last_ts = float(ts[-1])
+
+        exit_dwell = dwell[exit_]
+        bins = np.searchsorted(DWELL_EDGES, exit_dwell / 60.0, side="right") - 1
+        self.dwell_counts = np.bincount(np.clip(bins, 0, None), minlength=len(DWELL_EDGES)).tolist()
+        hours = ((ts[entry] + self.utc_offset) // 3600 % 24).astype(np.int64)
+        self.hour_entries = np.bincount(hours, minlength=24).tolist()
+
+        role_entries = np.bincount(role[entry])
+        role_exits = np.bincount(role[exit_])
+        role_dwell = np.bincount(role[exit_], weights=exit_dwell)
+        for i in range(max(len(role_entries), len(role_exits))):
+            totals = [int(_at(role_entries, i)), int(_at(role_exits, i)), float(_at(role_dwell, i))]
+            if any(totals):
+                self.role_totals[i] = totals
+
+        # Last event per slot: an ENTRY there means the slot is still taken
+        slot = np.asarray(store.column("slot"))
+        last = np.full(int(slot.max()) + 1, -1, np.int64)
+        np.maximum.at(last, slot, np.arange(len(slot)))
+        last = last[last >= 0]
+        last = last[np.asarray(kind)[last] == ENTRY]
+        uid = np.asarray(store.column("uid"))
+        for i, s, t, u, r in zip(last.tolist(), slot[last].tolist(), np.asarray(ts)[last].tolist(),
+                                 uid[last].tolist(), np.asarray(role)[last].tolist()):
+            self.open[s] = (t, u, r)
+
+    # Recording
+
+    def _advance(self, now):
+        # Credits occupied slot-seconds since the last event to their buckets
+        t = self._last_ts
+        if self.parked and t:
+            while t < now:
+                bucket = int(t // self.bucket)
+                end = min(now, (bucket + 1) * self.bucket)
+                self.occupied_seconds[bucket] = self.occupied_seconds.get(bucket, 0.0) + self.parked * (end - t)
+                t = end
+        self._last_ts = now
+
+    def _record(self, kind, slot, uid, role, dwell, now):
+        self._advance(now)
+        self.store.append(ts=now, kind=kind, slot=slot, uid=uid, role=role, dwell=dwell)
+        bucket = int(now // self.bucket)
+        totals = self.role_totals.setdefault(role, [0, 0, 0.0])
+        if kind == ENTRY:
+            self.parked += 1
+            self.entries[bucket] = self.entries.get(bucket, 0) + 1
+            self.hour_entries[int((now + self.utc_offset) // 3600 % 24)] += 1
+            totals[0] += 1
+            return
+        self.parked -= 1
+        if kind == EXIT:
+            self.exits[bucket] = self.exits.get(bucket, 0) + 1
+            bin_index = max(0, bisect.bisect_right(DWELL_EDGES, dwell / 60.0) - 1)
+            self.dwell_counts[bin_index] += 1
+            totals[1] += 1
+            totals[2] += dwell
+
+    def _now(self, now):
+        # Event times must not go backwards, the queries rely on it
+        return max(time.time() if now is None else now, self._last_ts)
+
+    def record_entry(self, slot, uid, role="", now=None):
+        if slot in self.open:
+            self.record_exit(slot, now)
+        now = self._now(now)
+        uid_index = self.uids.intern(uid)
+        role_index = self.roles.intern(role or "")
+        self.open[slot] = (now, uid_index, role_index)
+        self._record(ENTRY, slot, uid_index, role_index, 0.0, now)
+
+    def record_exit(self, slot, now=None):
+        # Returns the dwell in seconds, None when the slot had no entry
+        session = self.open.pop(slot, None)
+        if session is None:
+            return None
+        now = self._now(now)
+        entered, uid_index, role_index = session
+        dwell = now - entered
+        self._record(EXIT, slot, uid_index, role_index, dwell, now)
+        return dwell
+
+    def clear_open(self, now=None, keep=None):
+        # Closes sessions a previous run left open, e.g. after a restart
+        # with every slot free again. keep maps slot -> uid for cars still
+        # parked, whose sessions carry on. Returns how many were closed.
+        now = self._now(now)
+        keep = keep or {}
+        closed = []
+        for slot, (_, uid_index, role_index) in sorted(self.open.items()):
+            if keep.get(slot) != self.uids.names[uid_index]:
+                self._record(CLEARED, slot, uid_index, role_index, 0.0, now)
+                closed.append(slot)
+        for slot in closed:
+            del self.open[slot]
+        return len(closed)
+
+    def flush(self):
+        self.store.flush()
+
+    def close(self):
+        self.store.flush()
+        self.uids.close()
+        self.roles.close()
+
+    # Queries on the rolling aggregates
+
+    def occupancy(self, start=None, end=None, now=None):
+        # One row per bucket between start and end (times, default all)
+        now = self._now(now)
+        seconds = dict(self.occupied_seconds)
+        # The current stretch since the last event has not been credited yet
+        t = self._last_ts
+        while self.parked and t < now:
+            bucket = int(t // self.bucket)
+            stop = min(now, (bucket + 1) * self.bucket)
+            seconds[bucket] = seconds.get(bucket, 0.0) + self.parked * (stop - t)
+            t = stop
+        keys = set(self.entries) | set(self.exits) | set(seconds)
+        first = int(start // self.bucket) if start is not None else None
+        last = int(end // self.bucket) if end is not None else None
+        rows = []
+        for bucket in sorted(keys):
+            if (first is not None and bucket < first) or (last is not None and bucket > last):
+                continue
+            occupied = seconds.get(bucket, 0.0)
+            row = {
+                "start": bucket * self.bucket,
+                "entries": self.entries.get(bucket, 0),
+                "exits": self.exits.get(bucket, 0),
+                "avg_parked": round(occupied / self.bucket, 3),
+            }
+            if self.slot_count:
+                row["utilization"] = round(occupied / (self.bucket * self.slot_count), 4)
+            rows.append(row)
+        return rows
+
+    def dwell_histogram(self, start=None, end=None, role=None):
+        # [(low minutes, high minutes or None, count), ...]. The whole
+        # history comes from the rolling counts, a time range or role is
+        # answered from the columns.
+        if start is None and end is None and role is None:
+            counts = self.dwell_counts
+        else:
+            columns = self.window(start, end)
+            mask = columns["kind"] == EXIT
+            if role is not None:
+                role_index = self.roles.index.get(role)
+                if role_index is None:
+                    return _dwell_rows([0] * len(DWELL_EDGES))
+                mask &= columns["role"] == role_index
+            bins = np.searchsorted(DWELL_EDGES, columns["dwell"][mask] / 60.0, side="right") - 1
+            counts = np.bincount(np.clip(bins, 0, None), minlength=len(DWELL_EDGES)).tolist()
+        return _dwell_rows(counts)
+
+    def role_usage(self):
+        usage = {}
+        for role_index, (entries, exits, dwell) in self.role_totals.items():
+            usage[self.roles.names[role_index] or "(none)"] = {
+                "entries": entries,
+                "exits": exits,
+                "avg_dwell_min": round(dwell / exits / 60.0, 1) if exits else None,
+            }
+        return usage
+
+    def peak_hours(self, top=3):
+        # [(hour of day, entries), ...] busiest first
+        hours = sorted(range(24), key=lambda h: -self.hour_entries[h])
+        return [(h, self.hour_entries[h]) for h in hours[:top] if self.hour_entries[h]]
+
+    def summary(self, now=None):
+        now = self._now(now)
+        midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        today = int(midnight.timestamp() // self.bucket)
+        exits = sum(totals[1] for totals in self.role_totals.values())
+        dwell = sum(totals[2] for totals in self.role_totals.values())
+        peak = self.peak_hours(1)
+        return {
+            "events": len(self.store),
+            "parked": self.parked,
+            "entries_today": sum(count for bucket, count in self.entries.items() if bucket >= today),
+            "avg_dwell_min": round(dwell / exits / 60.0, 1) if exits else None,
+            "peak_hour": peak[0][0] if peak else None,
+        }
+
+    # Queries on the columns
+
+    def window(self, start=None, end=None):
+        # Column slices (memmap views, no copy) for start <= ts < end
+        ts = self.store.column("ts")
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, end, side="left"))
+        return {name: self.store.column(name)[lo:hi] for name in self.store.dtypes}
+
+    def occupancy_series(self, start, end, interval=BUCKET):
+        # Average number of parked cars per interval between start and end,
+        # for any interval, straight from the columns
+        ts = self.store.column("ts")
+        edges = np.arange(start, end + interval, interval, dtype=np.float64)
+        lo = int(np.searchsorted(ts, start, side="right"))
+        hi = int(np.searchsorted(ts, edges[-1], side="right"))
+        kind = self.store.column("kind")
+        # Cars already parked at start, then the integral over the window only
+        parked = 2 * int(np.count_nonzero(kind[:lo] == ENTRY)) - lo
+        times = np.concatenate(([start], ts[lo:hi]))
+        delta = np.concatenate(([parked], np.where(kind[lo:hi] == ENTRY, 1, -1)))
+        occupancy = np.cumsum(delta)
+        weighted = np.cumsum(delta * (times - start))
+        index = np.searchsorted(times, edges, side="right") - 1
+        area = (edges - start) * occupancy[index] - weighted[index]
+        return edges[:-1], np.diff(area) / interval
+
+
+def _bucket_counts(buckets):
+    if not len(buckets):
+        return {}
+    base = int(buckets.min())
+    counts = np.bincount(buckets - base)
+    nonzero = np.nonzero(counts)[0]
+    return dict(zip((nonzero + base).tolist(), counts[nonzero].tolist()))
+
+
+def _at(array, index):
+    return array[index] if index < len(array) else 0
+
+
+def _dwell_rows(counts):
+    rows = []
+    for i, count in enumerate(counts):
+        high = DWELL_EDGES[i + 1] if i + 1 < len(DWELL_EDGES) else None
+        rows.append((DWELL_EDGES[i], high, int(count)))
+    return rows
@@ -0,0 +1,135 @@
+# Occupancy analytics over a long synthetic history. Measures the live
+# append rate through record_entry/record_exit, then bulk-writes EVENTS
+# events (a few years of a busy lot) straight into the columns and times
+# opening the store, which rebuilds every rolling aggregate, and the
+# dashboard queries on top of it.
+# Run from the repository root: python benchmarks/bench_analytics.py [events]
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import ENTRY, EXIT, OccupancyAnalytics
+
+EVENTS = 10_000_000
+LIVE_EVENTS = 1_000_000
+SLOTS = 500
+ROLES = ("Student", "Faculty", "Staff", "Visitor")
+DAY = 86400
+
+
+def synthetic_columns(events, start, seed=1):
+    # Back-to-back sessions per slot: a gap, then a stay of a few minutes
+    # to most of a day, with times sorted across the whole lot
+    rng = np.random.default_rng(seed)
+    per_slot = events // 2 // SLOTS
+    gaps = rng.exponential(1800.0, (SLOTS, per_slot))
+    stays = np.minimum(rng.lognormal(4.0, 1.0, (SLOTS, per_slot)) * 60.0, DAY)
+    entered = start + np.cumsum(gaps + stays, axis=1) - stays
+    left = entered + stays
+    sessions = SLOTS * per_slot
+    slot = np.repeat(np.arange(SLOTS, dtype=np.uint32), per_slot)
+    uid = rng.integers(0, 20_000, sessions, dtype=np.uint32)
+    role = rng.integers(0, len(ROLES), sessions, dtype=np.uint16)
+    ts = np.concatenate((entered.ravel(), left.ravel()))
+    order = np.argsort(ts, kind="stable")
+    return {
+        "ts": ts[order],
+        "kind": np.concatenate((np.full(sessions, ENTRY, np.uint8), np.full(sessions, EXIT, np.uint8)))[order],
+        "slot": np.concatenate((slot, slot))[order],
+        "uid": np.concatenate((uid, uid))[order],
+        "role": np.concatenate((role, role))[order],
+        "dwell": np.concatenate((np.zeros(sessions, np.float32), stays.ravel().astype(np.float32)))[order],
+    }
+
+
+def timed(label, func, repeat=5):
+    result = func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    per = (time.perf_counter() - start) / repeat * 1000
+    print(f"  {label:<34} {per:>9.2f} ms")
+    return result
+
+
+def bench_live(directory):
+    analytics = OccupancyAnalytics(directory, slot_count=SLOTS)
+    now = time.time() - LIVE_EVENTS * 2
+    start = time.perf_counter()
+    for i in range(LIVE_EVENTS // 2):
+        slot = i % SLOTS
+        now += 1.0
+        analytics.record_entry(slot, f"{i % 20_000:08X}", ROLES[i % len(ROLES)], now=now)
+        now += 1.0
+        analytics.record_exit((i * 7) % SLOTS, now=now)
+    analytics.close()
+    elapsed = time.perf_counter() - start
+    print(f"live recording: {LIVE_EVENTS:,} events in {elapsed:.2f} s, "
+          f"{elapsed / LIVE_EVENTS * 1e6:.2f} us/event")
+
+
+def bench_history(directory, events):
+    end = time.time()
+    # Each session takes a 30 minute gap plus a 90 minute stay on average
+    span = events / 2 / SLOTS * 7200.0
+    start = time.perf_counter()
+    columns = synthetic_columns(events, end - span)
+    generated = time.perf_counter() - start
+    store = OccupancyAnalytics(directory, slot_count=SLOTS)
+    for role in ROLES:
+        store.roles.intern(role)
+    start = time.perf_counter()
+    store.store.extend(columns)
+    written = time.perf_counter() - start
+    store.close()
+    count = len(columns["ts"])
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    last = float(columns["ts"][-1])
+    del columns
+    print(f"history: {count:,} events over {span / DAY:.0f} days, {size / 1e6:.0f} MB on disk "
+          f"(generated in {generated:.1f} s, written in {written:.2f} s)")
+
+    start = time.perf_counter()
+    analytics = OccupancyAnalytics(directory, slot_count=SLOTS)
+    print(f"open and rebuild aggregates: {time.perf_counter() - start:.2f} s, "
+          f"{len(analytics.occupied_seconds):,} hourly buckets")
+
+    print("queries:")
+    day_start = last - DAY
+    month_start = last - 30 * DAY
+    timed("summary", lambda: analytics.summary(now=last))
+    timed("occupancy, last day (hourly)", lambda: analytics.occupancy(day_start, last, now=last))
+    timed("occupancy, all history", lambda: analytics.occupancy(now=last))
+    timed("occupancy_series, month at 15 min", lambda: analytics.occupancy_series(month_start, last, 900))
+    timed("dwell_histogram, all history", lambda: analytics.dwell_histogram())
+    timed("dwell_histogram, last month", lambda: analytics.dwell_histogram(month_start, last))
+    timed("dwell_histogram, month, one role", lambda: analytics.dwell_histogram(month_start, last, "Visitor"))
+    timed("role_usage", analytics.role_usage)
+    timed("peak_hours", analytics.peak_hours)
+
+    start = time.perf_counter()
+    for i in range(10_000):
+        analytics.record_entry(i % SLOTS, "DEADBEEF", "Visitor", now=last + i)
+    print(f"recording on top of the history: {(time.perf_counter() - start) / 10_000 * 1e6:.2f} us/event")
+    analytics.close()
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else EVENTS
+    directory = tempfile.mkdtemp(prefix="bench_analytics_")
+    try:
+        bench_live(os.path.join(directory, "live"))
+        print()
+        bench_history(os.path.join(directory, "history"), events)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
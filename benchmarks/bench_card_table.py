@@ -0,0 +1,116 @@
+# Card table (card_table.py) vs the JSON snapshot and in-memory registry
+# at up to five million cards. For each size, reports the table file size
+# per card, the time and Python memory to open it (the cold start of a
+# .cards store), lookup latency for canonical and raw serial UIDs and for
+# unknown cards, and the time to fold 1000 changes into a new table. Up
+# to a million cards the same is measured for a users.json snapshot
+# loaded into a CardRegistry. Tables are built a million cards at a time.
+# Run from the repository root: python benchmarks/bench_card_table.py
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_table import CardTable, write_card_table
+from journal import read_snapshot, write_snapshot
+from registry import PERMITTED, CardRecord, CardRegistry
+
+SIZES = (100_000, 1_000_000, 5_000_000)
+JSON_LIMIT = 1_000_000
+BATCH = 1_000_000
+LOOKUPS = 100_000
+CHANGES = 1000
+
+
+def make_records(rng, count, start):
+    # 4-byte cards, a few 7-byte ones
+    records = []
+    for i in range(start, start + count):
+        n = 7 if i % 20 == 0 else 4
+        uid = " ".join(f"{rng.randrange(256):02X}" for _ in range(n))
+        records.append(CardRecord(uid, f"Tenant {i}", "Resident", PERMITTED))
+    return records
+
+
+def timed_lookups(lookup, uids):
+    start = time.perf_counter()
+    for uid in uids:
+        lookup(uid)
+    return (time.perf_counter() - start) / len(uids) * 1e9
+
+
+def build_table(path, size, rng):
+    # Duplicate random UIDs collapse, so the table ends up slightly short
+    table = None
+    for start in range(0, size, BATCH):
+        records = make_records(rng, min(BATCH, size - start), start)
+        write_card_table(f"{path}.tmp", records, base=table)
+        if table is not None:
+            table.close()
+        os.replace(f"{path}.tmp", path)
+        table = CardTable(path)
+    table.close()
+
+
+def bench_json(directory, table, rng):
+    path = os.path.join(directory, "users.json")
+    write_snapshot(path, {"version": 2, "seq": 0,
+                          "users": [[r.uid, r.name, r.role, r.status] for r in table]})
+    tracemalloc.start()
+    start = time.perf_counter()
+    registry = CardRegistry()
+    registry.load_rows(read_snapshot(path)["users"])
+    loaded = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    uids = [table.record(rng.randrange(len(table))).uid for _ in range(LOOKUPS)]
+    exact = timed_lookups(registry.lookup, uids)
+    raw = timed_lookups(registry.lookup, [uid.lower() + " " for uid in uids])
+    return loaded, memory / len(registry), exact, raw
+
+
+def main():
+    rng = random.Random(7)
+    print(f"{'cards':>9} {'store':>6} {'B/card file':>12} {'B/card RAM':>11} {'open ms':>9} "
+          f"{'get ns':>8} {'raw ns':>8} {'miss ns':>8} {'compact ms':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in SIZES:
+            path = os.path.join(directory, f"{size}.cards")
+            build_table(path, size, rng)
+            tracemalloc.start()
+            start = time.perf_counter()
+            table = CardTable(path)
+            opened = time.perf_counter() - start
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            count = len(table)
+            uids = [table.record(rng.randrange(count)).uid for _ in range(LOOKUPS)]
+            registry = CardRegistry()
+            registry.attach(table)
+            get = timed_lookups(registry.get, uids)
+            registry.attach(table)
+            raw = timed_lookups(registry.lookup, [uid.lower() + " " for uid in uids])
+            missing = [f"{i:08X}" for i in range(LOOKUPS)]
+            miss = timed_lookups(table.get, missing)
+            changes = make_records(rng, CHANGES, size)
+            start = time.perf_counter()
+            write_card_table(f"{path}.new", changes, base=table, removed=uids[:CHANGES // 10])
+            compact = time.perf_counter() - start
+            print(f"{count:>9} {'table':>6} {os.path.getsize(path) / count:>12.1f} {memory / count:>11.2f} "
+                  f"{opened * 1000:>9.1f} {get:>8.0f} {raw:>8.0f} {miss:>8.0f} {compact * 1000:>11.0f}")
+            if size <= JSON_LIMIT:
+                loaded, per_card, exact, raw = bench_json(directory, table, rng)
+                json_size = os.path.getsize(os.path.join(directory, "users.json"))
+                print(f"{count:>9} {'json':>6} {json_size / count:>12.1f} {per_card:>11.0f} "
+                      f"{loaded * 1000:>9.0f} {exact:>8.0f} {raw:>8.0f} {'':>8} {'':>11}")
+            table.close()
+            os.remove(path)
+            os.remove(f"{path}.new")
+
+
+if __name__ == "__main__":
+    main()
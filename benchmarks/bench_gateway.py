@@ -0,0 +1,102 @@
+# Per-gate throughput and latency of the asyncio gateway as gates are added.
+# Each gate board is replaced by a pseudo-terminal whose master side is fed
+# "Card UID: ..." lines by a writer thread. POSIX only, needs pyserial.
+# Run from the repository root: python benchmarks/bench_gateway.py
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import ParkingEngine
+from gateway import Gateway, percentile
+
+GATE_COUNTS = (1, 2, 4, 8)
+SCANS_PER_GATE = 2000
+# Lines per second written by each fake board
+RATE = 2000
+
+
+def uid_for(gate, seq):
+    return f"{gate:02X} {(seq >> 16) & 0xFF:02X} {(seq >> 8) & 0xFF:02X} {seq & 0xFF:02X}"
+
+
+def writer(fd, gate, sent, start_event):
+    start_event.wait()
+    interval = 1.0 / RATE
+    next_time = time.perf_counter()
+    for seq in range(SCANS_PER_GATE):
+        uid = uid_for(gate, seq)
+        sent[uid] = time.perf_counter()
+        os.write(fd, f"Card UID: {uid} \r\n".encode())
+        next_time += interval
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+async def run_gates(count, users_path):
+    engine = ParkingEngine(users_path, default_users=())
+    engine.registry.load_rows([uid_for(g, s), f"Driver {g}-{s}", "User", "permitted"]
+                              for g in range(count) for s in range(SCANS_PER_GATE))
+    ptys = []
+    for _ in range(count):
+        master, slave = os.openpty()
+        tty.setraw(master)
+        ptys.append((master, slave, os.ttyname(slave)))
+    gateway = Gateway(engine, [(f"gate{g}", path) for g, (_, _, path) in enumerate(ptys)])
+
+    sent = {}
+    done = {}
+    finished = asyncio.Event()
+    total = count * SCANS_PER_GATE
+
+    def on_decision(decision, event):
+        done[decision.uid] = time.perf_counter()
+        if len(done) >= total:
+            finished.set()
+
+    gateway.decision_listeners.append(on_decision)
+    task = asyncio.create_task(gateway.run())
+    await asyncio.sleep(0.2)
+
+    start_event = threading.Event()
+    threads = [threading.Thread(target=writer, args=(master, g, sent, start_event), daemon=True)
+               for g, (master, _, _) in enumerate(ptys)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    start_event.set()
+    try:
+        await asyncio.wait_for(finished.wait(), timeout=60)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+    gateway.stop()
+    await task
+    for master, slave, _ in ptys:
+        os.close(master)
+        os.close(slave)
+
+    end_to_end = [done[uid] - sent[uid] for uid in done if uid in sent]
+    stats = gateway.stats()
+    per_gate = sum(s["scans"] for s in stats.values()) / count / elapsed
+    decision_p99 = max(s["decision_p99_ms"] for s in stats.values())
+    return len(done), per_gate, percentile(end_to_end, 50) * 1000, percentile(end_to_end, 99) * 1000, decision_p99
+
+
+def main():
+    print(f"{'gates':>6} {'scans':>7} {'scans/s/gate':>13} {'e2e p50 ms':>11} {'e2e p99 ms':>11} {'decide p99 ms':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in GATE_COUNTS:
+            users_path = os.path.join(tmp, f"users{count}.json")
+            scans, per_gate, p50, p99, decide = asyncio.run(run_gates(count, users_path))
+            print(f"{count:>6} {scans:>7} {per_gate:>13.0f} {p50:>11.3f} {p99:>11.3f} {decide:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
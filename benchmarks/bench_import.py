@@ -0,0 +1,108 @@
+# Bulk cardholder import. Writes CSV and JSONL files of increasing size
+# (with a few invalid, duplicate and conflicting rows mixed in), imports
+# them into a fresh engine and reports rows per second, the peak memory
+# traced while reading, checking and staging the file (it should barely
+# grow with the file: only packed UIDs are kept, the rows go to a
+# temporary file), the time to commit the staged batches and the export
+# time. For
+# comparison, the old way of enrolling card by card (one journal record
+# and fsync per card) is timed on the first few thousand rows; the GUI
+# also rebuilt both user lists after every card, which is not counted.
+# Run from the repository root: python benchmarks/bench_import.py
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cardholders import stage_import
+from engine import ParkingEngine
+
+SIZES = (10_000, 100_000, 300_000)
+ONE_BY_ONE = 2_000
+ROLES = ("Staff", "Visitor", "Contractor", "Resident")
+
+
+def write_file(path, count, seed=1):
+    rng = random.Random(seed)
+    csv = path.endswith(".csv")
+    with open(path, "w", encoding="utf-8") as f:
+        if csv:
+            f.write("uid,name,role,status\n")
+        for i in range(count):
+            uid = f"{i:08X}" if rng.random() > 0.001 else "not-a-uid"
+            if rng.random() < 0.001:
+                uid = f"{max(i - 1, 0):08X}"
+            status = "denied" if rng.random() < 0.05 else "permitted"
+            name, role = f"Tenant {i}", rng.choice(ROLES)
+            if i == 0:
+                # A conflict: the default admin's card under another name
+                uid = "89 D3 9D 94"
+            if csv:
+                f.write(f"{uid},{name},{role},{status}\n")
+            else:
+                f.write(json.dumps({"uid": uid, "name": name, "role": role, "status": status}) + "\n")
+
+
+def make_engine(directory):
+    engine = ParkingEngine(os.path.join(directory, "users.json"), slot_count=4)
+    engine.start()
+    return engine
+
+
+def one_by_one(directory, path, count):
+    engine = make_engine(directory)
+    staged, _ = stage_import(path)
+    rows = [row for batch in staged.batches() for _, row in batch][:count]
+    staged.close()
+    start = time.perf_counter()
+    for uid, name, role, status in rows:
+        engine.enroll(uid, name, role, status)
+    elapsed = time.perf_counter() - start
+    engine.close()
+    return count / elapsed
+
+
+def main():
+    print(f"{'rows':>8} {'format':>6} {'rows/s':>10} {'stage peak MiB':>14} {'commit ms':>10} "
+          f"{'export ms':>10} {'added':>8} {'invalid':>8} {'dup':>5} {'conflicts':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in SIZES:
+            for ext in (".csv", ".jsonl"):
+                work = os.path.join(directory, f"{size}{ext[1:]}")
+                os.makedirs(work)
+                path = os.path.join(work, f"cards{ext}")
+                write_file(path, size)
+                engine = make_engine(work)
+                tracemalloc.start()
+                start = time.perf_counter()
+                staged, report = stage_import(path)
+                planned = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1] / 2**20
+                tracemalloc.stop()
+                start = time.perf_counter()
+                for _ in engine.apply_import(staged, report):
+                    pass
+                committed = time.perf_counter() - start
+                staged.close()
+                start = time.perf_counter()
+                engine.export_cardholders(os.path.join(work, f"out{ext}"))
+                exported = time.perf_counter() - start
+                engine.close()
+                print(f"{size:>8} {ext[1:]:>6} {size / (planned + committed):>10.0f} {peak:>14.1f} "
+                      f"{committed * 1000:>10.1f} {exported * 1000:>10.1f} {report.added:>8} "
+                      f"{report.invalid:>8} {report.duplicates:>5} {report.conflicts:>9}")
+        work = os.path.join(directory, "one_by_one")
+        os.makedirs(work)
+        path = os.path.join(work, "cards.csv")
+        write_file(path, ONE_BY_ONE)
+        print(f"one enroll() per card: {one_by_one(work, path, ONE_BY_ONE):.0f} rows/s "
+              f"({ONE_BY_ONE} rows)")
+
+
+if __name__ == "__main__":
+    main()
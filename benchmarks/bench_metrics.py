@@ -0,0 +1,91 @@
+# Cost of the stage instrumentation. Pushes the same synthetic board lines
+# through ParkingEngine.handle_line with metrics disabled and enabled and
+# reports the per-line difference, the raw cost of one histogram record,
+# and how close the histogram percentiles are to exact ones.
+# Run from the repository root: python benchmarks/bench_metrics.py
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import ParkingEngine
+from gateway import percentile
+from metrics import LatencyHistogram, Metrics
+
+USERS = 10_000
+LINES = 100_000
+ROUNDS = 5
+
+
+def random_uid(rng):
+    return " ".join(f"{rng.randrange(256):02X}" for _ in range(4))
+
+
+def make_engine(directory, metrics):
+    os.makedirs(directory)
+    engine = ParkingEngine(os.path.join(directory, "users.json"), slot_count=USERS,
+                           auto_assign=True, dedup_window=0, metrics=metrics)
+    engine.start()
+    return engine
+
+
+def make_lines(rng, uids):
+    lines = []
+    for _ in range(LINES):
+        uid = rng.choice(uids) if rng.random() < 0.9 else random_uid(rng)
+        lines.append(f"Card UID: {uid.lower()} ")
+    return lines
+
+
+def run(engine, lines):
+    start = time.perf_counter()
+    for line in lines:
+        engine.handle_line(line)
+    return (time.perf_counter() - start) / len(lines) * 1e6
+
+
+def main():
+    rng = random.Random(1)
+    uids = list({random_uid(rng) for _ in range(USERS)})
+    lines = make_lines(rng, uids)
+    engines = {}
+    results = {False: [], True: []}
+    with tempfile.TemporaryDirectory() as directory:
+        for enabled in (False, True):
+            engine = make_engine(os.path.join(directory, str(enabled)), Metrics(enabled=enabled))
+            with engine.store.batch():
+                for i, uid in enumerate(uids):
+                    engine.enroll(uid, f"Driver {i}", "User")
+            engines[enabled] = engine
+        # Alternate so both see the same machine noise, keep the best round;
+        # parking and freeing alternate per card
+        for _ in range(ROUNDS):
+            for enabled, engine in engines.items():
+                results[enabled].append(run(engine, lines))
+        print(engines[True].metrics.report())
+        print()
+        for engine in engines.values():
+            engine.close()
+    off, on = min(results[False]), min(results[True])
+    print(f"handle_line: {off:.2f} us disabled, {on:.2f} us enabled, "
+          f"{on - off:+.2f} us ({(on - off) / off * 100:+.1f}%) per line")
+
+    histogram = LatencyHistogram()
+    samples = [rng.lognormvariate(-9, 1.2) for _ in range(LINES)]
+    start = time.perf_counter()
+    for sample in samples:
+        histogram.record(sample)
+    per = (time.perf_counter() - start) / len(samples) * 1e9
+    print(f"histogram record: {per:.0f} ns")
+    for pct in (50, 90, 99, 99.9):
+        exact = percentile(samples, pct)
+        approx = histogram.percentile(pct)
+        print(f"  p{pct:<5g} exact {exact * 1e6:9.2f} us, histogram {approx * 1e6:9.2f} us "
+              f"({(approx - exact) / exact * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# End-to-end throughput and scan-to-decision latency without hardware.
+# A ReplayTransport stands in for the board and feeds synthetic sessions
+# through the same paths the GUI and the daemon use:
+#   threaded - reader thread -> EventQueue -> batched drain -> engine
+#   gateway  - asyncio Gateway polling the transport -> engine
+# Duplicate suppression is off (dedup_window=0): the session repeats cards
+# within seconds, and the gateway path only reports decisions, so with it
+# on the two paths would count different scans.
+# Run from the repository root: python benchmarks/bench_pipeline.py
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import ParkingEngine
+from events import CardScan, EventQueue
+from gateway import Gateway, percentile
+from protocol import parse_line
+from transport import ReplayTransport
+
+SCANS = 20_000
+ENROLLED = 5_000
+# (label, lines per second, jitter seconds); None rate means as fast as possible
+RATES = (("max", None, 0.0), ("500/s", 500.0, 0.001))
+DRAIN_MS = 50
+DRAIN_BATCH = 64
+
+
+def synthetic_session(rng):
+    uids = [" ".join(f"{rng.randrange(256):02X}" for _ in range(4)) for _ in range(ENROLLED)]
+    lines = []
+    for _ in range(SCANS):
+        if rng.random() < 0.1:
+            uid = " ".join(f"{rng.randrange(256):02X}" for _ in range(4))
+        else:
+            uid = rng.choice(uids)
+        if rng.random() < 0.2:
+            # RFIDinput.ino style
+            lines.append("UID tag: " + "".join(f" {part}" for part in uid.split()))
+        else:
+            lines.append(f"Card UID: {uid} ")
+            lines.append("Access Granted!")
+    return uids, lines
+
+
+def make_engine(path, uids):
+    engine = ParkingEngine(path, slot_count=ENROLLED, default_users=(), auto_assign=True,
+                           dedup_window=0)
+    engine.registry.load_rows([uid, f"Driver {i}", "User", "permitted"] for i, uid in enumerate(uids))
+    return engine
+
+
+def make_transport(lines, rate, jitter, timeout):
+    return ReplayTransport([(None, line) for line in lines], rate=rate or 1e9,
+                           jitter=jitter, timeout=timeout, seed=1)
+
+
+def run_threaded(engine, lines, rate, jitter):
+    transport = make_transport(lines, rate, jitter, timeout=0.1)
+    events = EventQueue(maxsize=4096)
+    latencies = []
+    done = threading.Event()
+
+    def reader():
+        while not transport.finished:
+            event = parse_line(transport.readline().decode("utf-8"))
+            if event is not None:
+                # Spin rather than drop so every scan is measured
+                while not events.put(event):
+                    time.sleep(0.0005)
+        done.set()
+
+    def handle(event):
+        if isinstance(event, CardScan):
+            engine.handle_event(event)
+            latencies.append(time.perf_counter() - event.received)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    while not (done.is_set() and events.depth() == 0):
+        if not events.drain(handle, DRAIN_BATCH):
+            time.sleep(DRAIN_MS / 1000)
+    return time.perf_counter() - start, latencies
+
+
+def run_gateway(engine, lines, rate, jitter):
+    transport = make_transport(lines, rate, jitter, timeout=0)
+    gateway = Gateway(engine, [("bench", "replay")], opener=lambda port, baud: transport)
+    latencies = []
+    gateway.decision_listeners.append(
+        lambda decision, event: latencies.append(time.perf_counter() - event.received))
+
+    async def main():
+        task = asyncio.create_task(gateway.run())
+        while not transport.finished:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        gateway.stop()
+        await task
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    rng = random.Random(7)
+    uids, lines = synthetic_session(rng)
+    print(f"{SCANS} scans per run, duplicate suppression off")
+    print(f"{'path':>9} {'rate':>6} {'scans':>7} {'events/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, rate, jitter in RATES:
+            for name, runner in (("threaded", run_threaded), ("gateway", run_gateway)):
+                engine = make_engine(os.path.join(tmp, f"{name}-{label}.json"), uids)
+                elapsed, latencies = runner(engine, lines, rate, jitter)
+                print(f"{name:>9} {label:>6} {len(latencies):>7} {len(latencies) / elapsed:>10.0f} "
+                      f"{percentile(latencies, 50) * 1000:>8.3f} {percentile(latencies, 99) * 1000:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# Cost of access policies (policy.py) on the scan path. Enrols CARDS
+# cards, then scans SCANNED of them in turn at a lot of as many slots, so
+# every scan parks or releases a car, and reports the time per scan:
+#   no policy      engine without a policy file
+#   policy         hours, a max stay and a reserved zone the nearest free
+#                  slot is always in, so every entry is re-placed
+#   policy, cold   the same with the decision cache cleared before each scan
+#   reloading      the policy file rewritten every RELOAD_EVERY seconds
+#                  while scanning, checked on every scan
+# Also reports how long a policy of many roles takes to compile.
+# Run from the repository root: python benchmarks/bench_policy.py
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import ParkingEngine
+from gateway import percentile
+from policy import compile_policy
+
+CARDS = 100_000
+SCANNED = 1000
+SCANS = 50_000
+RELOAD_EVERY = 0.05
+ROLES = 200
+
+POLICY = {
+    "roles": {
+        "Resident": {"hours": [{"days": "daily", "from": "00:00", "to": "24:00"}], "max_stay": "12h"},
+        "Visitor": {"hours": [{"days": "mon-fri", "from": "08:00", "to": "18:00"}], "max_stay": "2h"},
+    },
+    "zones": {"Reserved": ["Admin"]},
+}
+
+
+def uid(i):
+    return " ".join(f"{(i >> s) & 0xFF:02X}" for s in (24, 16, 8, 0))
+
+
+def write_users(path, count):
+    users = [[uid(i), f"Tenant {i}", "Resident", "permitted"] for i in range(count)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": 2, "seq": 0, "users": users}, f)
+
+
+def write_policy(path, policy):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(policy, f)
+    os.replace(path + ".tmp", path)
+
+
+def run(directory, policy_path, cold=False, reload=False):
+    layout = [{"zone": "Reserved", "count": 10}, {"zone": "A", "count": SCANNED}]
+    engine = ParkingEngine(os.path.join(directory, "users.json"), layout=layout, auto_assign=True,
+                           default_users=(), policy_path=policy_path)
+    engine.start()
+    if engine.policies is not None:
+        engine.policies.check_interval = 0
+    stop = threading.Event()
+    reloader = None
+    if reload:
+        def rewrite():
+            n = 0
+            while not stop.wait(RELOAD_EVERY):
+                n += 1
+                policy = json.loads(json.dumps(POLICY))
+                policy["roles"]["Visitor"]["max_stay"] = f"{2 + n % 3}h"
+                write_policy(policy_path, policy)
+        reloader = threading.Thread(target=rewrite)
+        reloader.start()
+    uids = [uid(i * (CARDS // SCANNED)) for i in range(SCANNED)]
+    latencies = []
+    perf = time.perf_counter
+    try:
+        for n in range(SCANS):
+            if cold:
+                engine.decisions.clear()
+            start = perf()
+            engine.handle_scan(uids[n % SCANNED])
+            latencies.append(perf() - start)
+    finally:
+        stop.set()
+        if reloader is not None:
+            reloader.join()
+    loaded = engine.policies.loaded if engine.policies is not None else 0
+    engine.close()
+    return [t * 1e6 for t in latencies], loaded
+
+
+def bench_compile():
+    policy = {"roles": {f"Role {i}": {"hours": [{"days": "mon-fri", "from": "06:00", "to": "20:00"},
+                                                {"days": "sat,sun", "from": "22:00", "to": "04:00"}],
+                                      "max_stay": "1h30m"}
+                        for i in range(ROLES)},
+              "zones": {f"Z{i}": [f"Role {j}" for j in range(i, ROLES, 10)] for i in range(10)}}
+    start = time.perf_counter()
+    compile_policy(policy)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        write_users(os.path.join(directory, "users.json"), CARDS)
+        policy_path = os.path.join(directory, "policy.json")
+        write_policy(policy_path, POLICY)
+        print(f"{CARDS} cards, {SCANS} scans of {SCANNED} cards, times per scan")
+        print(f"{'mode':>14} {'mean us':>8} {'p50 us':>8} {'p99 us':>8} {'max us':>8} {'reloads':>8}")
+        for mode, args in (("no policy", (None,)), ("policy", (policy_path,)),
+                           ("policy, cold", (policy_path, True)),
+                           ("reloading", (policy_path, False, True))):
+            latencies, loaded = run(directory, *args)
+            print(f"{mode:>14} {sum(latencies) / len(latencies):>8.1f} {percentile(latencies, 50):>8.1f} "
+                  f"{percentile(latencies, 99):>8.1f} {max(latencies):>8.1f} {loaded:>8}")
+    print(f"compiling {ROLES} roles: {bench_compile():.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
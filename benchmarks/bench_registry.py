@@ -0,0 +1,59 @@
+# Card lookup latency for CardRegistry at increasing registry sizes.
+# Run from the repository root: python benchmarks/bench_registry.py
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from registry import CardRegistry, normalize_uid
+
+SIZES = (10_000, 100_000, 1_000_000)
+LOOKUPS = 200_000
+
+
+def random_uid(rng):
+    return " ".join(f"{rng.randrange(256):02X}" for _ in range(4))
+
+
+def bench(size, rng):
+    registry = CardRegistry()
+    uids = set()
+    while len(uids) < size:
+        uids.add(random_uid(rng))
+    uids = list(uids)
+    for i, uid in enumerate(uids):
+        registry.add(uid, f"User {i}", "User")
+
+    hits = [rng.choice(uids) for _ in range(LOOKUPS)]
+    # Raw serial form as printed by RFID.ino, forces the normalizing path
+    raw = [uid.lower() + " " for uid in hits]
+
+    start = time.perf_counter()
+    for uid in hits:
+        registry.lookup(uid)
+    exact = (time.perf_counter() - start) / LOOKUPS
+
+    start = time.perf_counter()
+    for uid in raw:
+        registry.lookup(uid)
+    normalized = (time.perf_counter() - start) / LOOKUPS
+
+    start = time.perf_counter()
+    for uid in hits:
+        normalize_uid(uid)
+    norm_only = (time.perf_counter() - start) / LOOKUPS
+    return exact, normalized, norm_only
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'cards':>10} {'exact (ns)':>12} {'raw (ns)':>12} {'normalize (ns)':>16}")
+    for size in SIZES:
+        exact, normalized, norm_only = bench(size, rng)
+        print(f"{size:>10} {exact * 1e9:>12.0f} {normalized * 1e9:>12.0f} {norm_only * 1e9:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Slot bookings at scale (reservations.py). Books BOOKINGS random bookings
+# of 1 to 8 hours over DAYS days across SLOTS slots, then times:
+#   is free        one slot checked for a random window
+#   find free      lowest slot free for a random window of 1, 8 or 24
+#                  hours, against a scan of every slot's bookings
+#   book + cancel  a booking made in a free slot and taken back
+# Loading is timed both through load() and booking one at a time.
+# Run from the repository root: python benchmarks/bench_reservations.py
+import os
+import random
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gateway import percentile
+from reservations import ReservationBook
+
+SLOTS = 10_000
+BOOKINGS = 1_000_000
+DAYS = 30
+QUERIES = 2000
+SCAN_QUERIES = 20
+HOUR = 3600
+EPOCH = 1_800_000_000
+
+
+def make_bookings(rng):
+    # Non-overlapping bookings per slot, spread over DAYS days
+    rows = []
+    per_slot = BOOKINGS // SLOTS
+    span = DAYS * 24 * HOUR
+    for slot in range(SLOTS):
+        t = EPOCH + rng.randrange(HOUR)
+        gap = span // per_slot
+        for _ in range(per_slot):
+            length = rng.randrange(1, 9) * HOUR
+            start = t + rng.randrange(max(1, gap - length))
+            rows.append((slot, start, start + length, f"{rng.randrange(1 << 32):08X}"))
+            t = max(start + length, t + gap)
+    return rows
+
+
+def scan_free(rows_by_slot, start, end):
+    # What find_free() answers, without an index
+    for slot, bookings in enumerate(rows_by_slot):
+        if all(e <= start or s >= end for s, e in bookings):
+            return slot
+    return None
+
+
+def timed(fn, args_list):
+    latencies = []
+    results = []
+    perf = time.perf_counter
+    for args in args_list:
+        t = perf()
+        results.append(fn(*args))
+        latencies.append((perf() - t) * 1e6)
+    return latencies, results
+
+
+def row(name, latencies):
+    print(f"{name:>22} {percentile(latencies, 50):>9.1f} {percentile(latencies, 99):>9.1f} "
+          f"{max(latencies):>9.1f}")
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def main():
+    rng = random.Random(1)
+    rows = make_bookings(rng)
+    before = peak_rss_mb()
+    book = ReservationBook(SLOTS)
+    start = time.perf_counter()
+    book.load(rows)
+    load_s = time.perf_counter() - start
+    print(f"{len(book)} bookings in {SLOTS} slots over {DAYS} days, {book.stats()['buckets']} buckets")
+    print(f"load(): {load_s:.1f} s, peak RSS +{peak_rss_mb() - before:.0f} MB")
+
+    sample = rng.sample(rows, 20_000)
+    one_by_one = ReservationBook(SLOTS)
+    start = time.perf_counter()
+    for slot, begin, end, uid in sample:
+        one_by_one.book(slot, begin, end, uid)
+    print(f"book() one at a time: {(time.perf_counter() - start) / len(sample) * 1e6:.1f} us per booking")
+
+    span = DAYS * 24 * HOUR
+    print(f"{'query (us)':>22} {'p50':>9} {'p99':>9} {'max':>9}")
+    windows = [(rng.randrange(SLOTS), t, t + rng.randrange(1, 9) * HOUR)
+               for t in (EPOCH + rng.randrange(span) for _ in range(QUERIES))]
+    row("is free", timed(book.is_free, windows)[0])
+    rows_by_slot = [[] for _ in range(SLOTS)]
+    for slot, begin, end, _ in rows:
+        rows_by_slot[slot].append((begin, end))
+    for hours in (1, 8, 24):
+        queries = [(t, t + hours * HOUR) for t in (EPOCH + rng.randrange(span) for _ in range(QUERIES))]
+        latencies, found = timed(book.find_free, queries)
+        row(f"find free {hours} h", latencies)
+        scanned, expected = timed(lambda s, e: scan_free(rows_by_slot, s, e), queries[:SCAN_QUERIES])
+        assert found[:SCAN_QUERIES] == expected
+        row(f"  scan every slot {hours} h", scanned)
+        print(f"{'':>22} {sum(f is None for f in found)} of {QUERIES} windows had no free slot")
+
+    def book_and_cancel(begin, end):
+        slot = book.find_free(begin, end)
+        if slot is not None:
+            book.book(slot, begin, end, "BENCH")
+            book.cancel(slot, begin)
+    queries = [(t, t + 2 * HOUR) for t in (EPOCH + rng.randrange(span) for _ in range(QUERIES))]
+    row("find + book + cancel", timed(book_and_cancel, queries)[0])
+    assert len(book) == len(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Load test of the decision service. Starts parking_daemon.py --socket
+# with CARDS enrolled cards in a scratch directory, then runs CLIENTS
+# concurrent clients (threads spread over a few processes, each process
+# sharing one pooled DecisionClient) for DURATION seconds per mode:
+#   single     one check per request
+#   pipelined  PIPELINE checks written at once, answers read after
+#   batch      BATCH UIDs in one check request
+#   no pool    a new connection for every check
+# Reports UIDs checked per second and request latency percentiles.
+# Run from the repository root: python benchmarks/bench_service.py
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from decision_client import DecisionClient
+from gateway import percentile
+
+CARDS = 100_000
+CLIENTS = 50
+PROCESSES = 5
+DURATION = 5.0
+PIPELINE = 16
+BATCH = 100
+MODES = ("single", "pipelined", "batch", "no pool")
+
+
+def write_users(path, count):
+    users = [[" ".join(f"{(i >> s) & 0xFF:02X}" for s in (24, 16, 8, 0)), f"Tenant {i}", "Resident",
+              "permitted"] for i in range(count)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": 2, "seq": 0, "users": users}, f)
+    return [user[0] for user in users]
+
+
+def client_thread(client, path, mode, uids, deadline, rng, out):
+    done = 0
+    latencies = []
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        if mode == "single":
+            client.check(rng.choice(uids))
+            done += 1
+        elif mode == "pipelined":
+            client.pipeline([("check", {"uid": rng.choice(uids)}) for _ in range(PIPELINE)])
+            done += PIPELINE
+        elif mode == "batch":
+            client.check_many(rng.choices(uids, k=BATCH))
+            done += BATCH
+        else:
+            with DecisionClient(path, pool_size=1) as once:
+                once.check(rng.choice(uids))
+            done += 1
+        latencies.append(time.perf_counter() - start)
+    out.append((done, latencies))
+
+
+def client_process(path, mode, threads, uids, seed, start_at):
+    client = DecisionClient(path, pool_size=threads)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = time.perf_counter() + DURATION
+    out = []
+    workers = [threading.Thread(target=client_thread,
+                                args=(client, path, mode, uids, deadline, random.Random(seed + i), out))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    client.close()
+    return sum(done for done, _ in out), [t for _, latencies in out for t in latencies]
+
+
+def wait_for(path, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with DecisionClient(path) as client:
+                return client.ping()
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        users = os.path.join(directory, "users.json")
+        uids = write_users(users, CARDS)
+        path = os.path.join(directory, "parking.sock")
+        daemon = subprocess.Popen([sys.executable, os.path.join(ROOT, "parking_daemon.py"),
+                                   "--socket", path, "--users", users,
+                                   "--sessions", os.path.join(directory, "sessions.json")],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            wait_for(path)
+            print(f"{CARDS} cards, {CLIENTS} clients in {PROCESSES} processes, {DURATION:.0f} s per mode")
+            print(f"{'mode':>10} {'UIDs/s':>10} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9}")
+            threads = CLIENTS // PROCESSES
+            with multiprocessing.Pool(PROCESSES) as pool:
+                for mode in MODES:
+                    start_at = time.time() + 0.5
+                    results = pool.starmap(client_process,
+                                           [(path, mode, threads, uids, p * 1000, start_at)
+                                            for p in range(PROCESSES)])
+                    done = sum(r[0] for r in results)
+                    latencies = [t * 1000 for r in results for t in r[1]]
+                    print(f"{mode:>10} {done / DURATION:>10.0f} {len(latencies) / DURATION:>10.0f} "
+                          f"{percentile(latencies, 50):>8.2f} {percentile(latencies, 99):>8.2f} "
+                          f"{percentile(latencies, 99.9):>9.2f}")
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Restart time of the parked-car store. Runs a busy lot for an increasing
+# number of park/free changes, "crashes" without closing, and times how
+# long a new SessionStore takes to load the snapshot, replay the journal
+# and park every car again. The journal never holds more than
+# COMPACT_EVERY records, so restart time stays flat as history grows.
+# Run from the repository root: python benchmarks/bench_sessions.py
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from registry import CardRecord
+from session_store import COMPACT_EVERY, SessionStore
+from slots import SlotMap
+
+SLOTS = 2000
+CHANGES = (1_250, 10_250, 100_250)
+
+
+def run_lot(path, changes, seed=1):
+    rng = random.Random(seed)
+    slots = SlotMap(SLOTS)
+    store = SessionStore(slots, path)
+    store.load()
+    parked = []
+    start = time.perf_counter()
+    for i in range(changes):
+        if parked and (rng.random() < 0.5 or not slots.free_count()):
+            index = parked.pop(rng.randrange(len(parked)))
+            slots.release(index)
+        else:
+            slot = slots.first_free()
+            slots.occupy(slot.index, CardRecord(f"{i:08X}", f"Driver {i}", "User"))
+            parked.append(slot.index)
+    per = (time.perf_counter() - start) / changes * 1e6
+    # No close(): whatever the journal holds is what a crash leaves behind
+    state = {slot.index: slot.uid for slot in slots if slot.uid is not None}
+    return state, store.journal.count, per
+
+
+def main():
+    print(f"{'changes':>8} {'us/change':>10} {'journal':>8} {'parked':>7} {'restart ms':>11} {'match':>6}")
+    for changes in CHANGES:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sessions.json")
+            expected, journal, per = run_lot(path, changes)
+            start = time.perf_counter()
+            slots = SlotMap(SLOTS)
+            store = SessionStore(slots, path)
+            store.load()
+            elapsed = (time.perf_counter() - start) * 1000
+            restored = {slot.index: slot.uid for slot in slots if slot.uid is not None}
+            store.close()
+            print(f"{changes:>8} {per:>10.1f} {journal:>8} {len(restored):>7} {elapsed:>11.2f} "
+                  f"{str(restored == expected):>6}")
+    print(f"(journal compacted into the snapshot every {COMPACT_EVERY} records, "
+          f"each change is written and fsynced on its own)")
+
+
+if __name__ == "__main__":
+    main()
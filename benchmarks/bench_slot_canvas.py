@@ -0,0 +1,71 @@
+# Rendering cost of the canvas lot map at increasing lot sizes: first draw,
+# restyling 1% of the slots after state changes, and scrolling to the end.
+# Needs a display. Run from the repository root:
+#     python benchmarks/bench_slot_canvas.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tkinter as tk
+
+from registry import CardRecord
+from slot_canvas import SlotCanvas
+from slots import SlotMap
+
+SIZES = (100, 1_000, 10_000)
+COLORS = {
+    "available": "#12301f", "occupied": "#00f3ff", "denied": "#4d0000",
+    "highlight": "#00ff9d", "outline": "#333333", "text": "#ffffff", "occupied_text": "#000000",
+}
+
+
+def timed(root, action):
+    start = time.perf_counter()
+    action()
+    root.update_idletasks()
+    root.update()
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(root, size):
+    slots = SlotMap(size)
+    canvas = SlotCanvas(root, slots, COLORS, bg="#1a1a1a", width=1200, height=700)
+    canvas.pack(fill="both", expand=True)
+    root.update()
+
+    first = timed(root, canvas.redraw)
+    items = len(canvas.find_all())
+
+    changed = max(1, size // 100)
+    user = CardRecord("89 D3 9D 94", "Bench", "User")
+
+    def change():
+        for index in range(0, size, size // changed):
+            slots.occupy(index, user)
+        canvas.flush()
+
+    update = timed(root, change)
+    scroll = timed(root, lambda: canvas.yview("moveto", 1.0))
+    canvas.destroy()
+    return first, items, update, scroll
+
+
+def main():
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"No display available: {e}")
+        return 1
+    root.geometry("1200x700")
+    print(f"{'slots':>7} {'first draw ms':>14} {'canvas items':>13} {'1% update ms':>13} {'scroll ms':>10}")
+    for size in SIZES:
+        first, items, update, scroll = bench(root, size)
+        print(f"{size:>7} {first:>14.1f} {items:>13} {update:>13.1f} {scroll:>10.1f}")
+    root.destroy()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
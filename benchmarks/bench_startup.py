@@ -0,0 +1,130 @@
+# Startup time and peak memory of the headless engine vs the Tk GUI.
+# Each mode runs in a fresh interpreter so import costs are included, in
+# a scratch directory with a set of generated GUI images. For each mode:
+#   import   - importing the modules
+#   frame    - the window first mapped (GUI only)
+#   ready    - users loaded, images shown and the port monitor started
+# The GUI runs twice per repeat, with the resized image cache removed
+# ("cold") and then kept ("warm"). Needs a display for the GUI rows.
+# Run from the repository root: python benchmarks/bench_startup.py
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from image_cache import CACHE_DIR
+
+# Size of the generated source images, as exported from a design tool
+IMAGE_SIZE = 512
+IMAGES = ("logo", "car", "connected", "disconnected")
+
+PRELUDE = f"""
+import json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {ROOT!r})
+"""
+
+REPORT = """
+elapsed = time.perf_counter() - start
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+except ImportError:
+    rss_mb = None
+times["ready"] = elapsed
+print(json.dumps({"times": times, "rss_mb": rss_mb}))
+"""
+
+MODES = {
+    "headless": """
+from engine import ParkingEngine
+times = {"import": time.perf_counter() - start}
+engine = ParkingEngine("users.json")
+engine.start()
+""",
+    "gui": """
+import tkinter as tk
+from RFID import ParkingSystemGUI
+times = {"import": time.perf_counter() - start}
+root = tk.Tk()
+app = ParkingSystemGUI(root)
+while not app.ready:
+    root.update()
+    time.sleep(0.001)
+times["frame"] = app.startup_times["shown"] - start
+root.update()
+app.port_monitor.stop()
+""",
+}
+
+
+def write_png(path, size):
+    # A size x size RGB gradient, without needing Pillow
+    rows = b"".join(b"\0" + bytes(value for x in range(size)
+                                  for value in (x * 255 // size, y * 255 // size, 128))
+                    for y in range(size))
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(rows)))
+        f.write(chunk(b"IEND", b""))
+
+
+def run_mode(code, cwd):
+    proc = subprocess.run([sys.executable, "-c", PRELUDE + code + REPORT],
+                          cwd=cwd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None, proc.stderr.strip().splitlines()[-1] if proc.stderr else "failed"
+    return json.loads(proc.stdout.strip().splitlines()[-1]), None
+
+
+def ms(results, key):
+    values = [r["times"][key] for r in results if key in r["times"]]
+    return f"{min(values) * 1000:.1f}" if values else "-"
+
+
+def main(repeats=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy(os.path.join(ROOT, "users.json"), tmp)
+        os.makedirs(os.path.join(tmp, "images"))
+        for name in IMAGES:
+            write_png(os.path.join(tmp, "images", f"{name}.png"), IMAGE_SIZE)
+        runs = [("headless", MODES["headless"], False),
+                ("gui cold", MODES["gui"], True),
+                ("gui warm", MODES["gui"], False)]
+        print(f"{'mode':>10} {'import ms':>10} {'frame ms':>10} {'ready ms':>10} {'peak RSS (MB)':>15}")
+        for name, code, cold in runs:
+            results = []
+            error = None
+            for _ in range(repeats):
+                if cold:
+                    shutil.rmtree(os.path.join(tmp, CACHE_DIR), ignore_errors=True)
+                result, error = run_mode(code, tmp)
+                if result is None:
+                    break
+                results.append(result)
+            if not results:
+                print(f"{name:>10} {'unavailable':>10}  ({error})")
+                continue
+            rss = results[-1]["rss_mb"]
+            rss_text = f"{rss:.1f}" if rss is not None else "n/a"
+            print(f"{name:>10} {ms(results, 'import'):>10} {ms(results, 'frame'):>10} "
+                  f"{ms(results, 'ready'):>10} {rss_text:>15}")
+
+
+if __name__ == "__main__":
+    main()
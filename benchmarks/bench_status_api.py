@@ -0,0 +1,140 @@
+# What the status API (status_api.py) costs the process that serves it.
+# Runs an engine with the API on its own thread, as the GUI does, while
+# the main thread scans cards at SCAN_RATE per second, and CLIENTS clients
+# in a few other processes read /occupancy for DURATION seconds per mode:
+#   idle       no clients
+#   poll       a conditional GET (If-None-Match) every POLL_INTERVAL s
+#   long poll  If-None-Match with ?wait=, answered when occupancy changes
+#   sse        /stream?docs=occupancy
+#   hammer     HAMMER connections sending conditional GETs back to back
+# Reports responses per second, the serving process's CPU use and the
+# latency of the scans made meanwhile.
+# Run from the repository root: python benchmarks/bench_status_api.py
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import ParkingEngine
+from gateway import percentile
+from status_api import StatusServer
+
+CLIENTS = 300
+HAMMER = 50
+PROCESSES = 3
+DURATION = 5.0
+SCAN_RATE = 50
+POLL_INTERVAL = 1.0
+SLOTS = 200
+MODES = ("idle", "poll", "long poll", "sse", "hammer")
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    etag = None
+    length = 0
+    for line in head.decode("latin-1").split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        if name.lower() == "etag":
+            etag = value.strip()
+        elif name.lower() == "content-length":
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return etag
+
+
+async def client(port, mode, deadline):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    responses = 0
+    try:
+        if mode == "sse":
+            writer.write(b"GET /stream?docs=occupancy HTTP/1.1\r\nHost: bench\r\n\r\n")
+            await reader.readuntil(b"\r\n\r\n")
+            while time.time() < deadline:
+                try:
+                    await asyncio.wait_for(reader.readuntil(b"\n\n"), deadline - time.time())
+                except asyncio.TimeoutError:
+                    break
+                responses += 1
+            return responses
+        etag = None
+        path = "/occupancy?wait=1" if mode == "long poll" else "/occupancy"
+        while time.time() < deadline:
+            condition = f"If-None-Match: {etag}\r\n" if etag else ""
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\n{condition}\r\n".encode())
+            etag = await read_response(reader) or etag
+            responses += 1
+            if mode == "poll":
+                await asyncio.sleep(POLL_INTERVAL)
+    finally:
+        writer.close()
+    return responses
+
+
+def client_process(port, mode, count, start_at):
+    async def main():
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        deadline = start_at + DURATION
+        return sum(await asyncio.gather(*(client(port, mode, deadline) for _ in range(count))))
+    return asyncio.run(main())
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        users = [[f"00 00 {i >> 8:02X} {i & 0xFF:02X}", f"Tenant {i}", "Resident", "permitted"]
+                 for i in range(SLOTS)]
+        with open(os.path.join(directory, "users.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": 2, "seq": 0, "users": users}, f)
+        engine = ParkingEngine(os.path.join(directory, "users.json"), slot_count=SLOTS,
+                               auto_assign=True, default_users=())
+        engine.start()
+        server = StatusServer(engine, port=0)
+        server.start_thread()
+        uids = [user[0] for user in users]
+        print(f"{CLIENTS} clients in {PROCESSES} processes ({HAMMER} for hammer), "
+              f"{SCAN_RATE} scans/s, {DURATION:.0f} s per mode")
+        print(f"{'mode':>10} {'resp/s':>8} {'CPU %':>6} {'scan p50 us':>12} {'scan p99 us':>12}")
+        with multiprocessing.Pool(PROCESSES) as pool:
+            for mode in MODES:
+                count = HAMMER if mode == "hammer" else CLIENTS
+                start_at = time.time() + 1.0
+                pending = None
+                if mode != "idle":
+                    pending = pool.starmap_async(client_process, [(server.port, mode, count // PROCESSES, start_at)
+                                                                 for _ in range(PROCESSES)])
+                time.sleep(max(0.0, start_at - time.time()))
+                cpu = cpu_seconds()
+                latencies = []
+                n = 0
+                end = start_at + DURATION
+                while time.time() < end:
+                    start = time.perf_counter()
+                    engine.handle_scan(uids[n % len(uids)])
+                    latencies.append((time.perf_counter() - start) * 1e6)
+                    n += 1
+                    time.sleep(max(0.0, start_at + n / SCAN_RATE - time.time()))
+                cpu = cpu_seconds() - cpu
+                responses = sum(pending.get()) if pending is not None else 0
+                print(f"{mode:>10} {responses / DURATION:>8.0f} {cpu / DURATION * 100:>6.1f} "
+                      f"{percentile(latencies, 50):>12.1f} {percentile(latencies, 99):>12.1f}")
+        print(f"rebuilds: {server.rebuilds}, requests: {server.requests}, "
+              f"not modified: {server.not_modified}")
+        server.stop_thread()
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
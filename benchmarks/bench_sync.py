@@ -0,0 +1,135 @@
+# Card table sync between the host registry and a gate board, run against
+# BoardSimulator instead of an Arduino. Reports the bulk load size and
+# how long it takes on the wire, then applies random enrol/remove/flip
+# churn over a lossy link and checks that the board ends up with exactly
+# the host's table.
+# Run from the repository root: python benchmarks/bench_sync.py
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from board_sim import BoardSimulator
+from board_sync import BOARD_CAPACITY, SYNCED, AllowlistSync
+from registry import CardRegistry, DENIED, PERMITTED
+
+CHANGES = 5_000
+LOSS_RATES = (0.0, 0.001, 0.01)
+# 8N1 serial: ten bits on the wire per byte
+BAUDS = (9600, 115200)
+
+
+def random_uid(rng):
+    return " ".join(f"{rng.randrange(256):02X}" for _ in range(rng.choice((4, 4, 7))))
+
+
+def make_registry(rng, count):
+    registry = CardRegistry()
+    for i in range(count):
+        registry.add(random_uid(rng), f"Driver {i}", "User", DENIED if i % 5 == 0 else PERMITTED)
+    return registry
+
+
+def connect(registry, board):
+    sent = [0]
+
+    def send(command):
+        data = (command + "\n").encode()
+        sent[0] += len(data)
+        board.write(data)
+
+    sync = AllowlistSync(registry, send)
+    return sync, sent
+
+
+def pump(sync, board):
+    while board.in_waiting:
+        sync.handle_message(board.readline().decode().strip())
+
+
+def board_matches(sync, board):
+    expected = {key: entry[0] for key, entry in sync._table.items()}
+    return dict(zip(board.keys, board.permitted)) == expected
+
+
+def bench_load():
+    rng = random.Random(1)
+    registry = make_registry(rng, BOARD_CAPACITY)
+    board = BoardSimulator()
+    sync, sent = connect(registry, board)
+    sync.start()
+    pump(sync, board)
+    wire = ", ".join(f"{sent[0] * 10 / baud * 1000:.0f} ms at {baud}" for baud in BAUDS)
+    print(f"bulk load of {len(board.keys)} cards: {sent[0]} bytes ({wire}), "
+          f"state {sync.state}, match {board_matches(sync, board)}")
+
+
+def bench_churn(loss):
+    rng = random.Random(2)
+    registry = make_registry(rng, BOARD_CAPACITY // 2)
+    board = BoardSimulator(drop_rate=loss, seed=3)
+    sync, sent = connect(registry, board)
+    sync.start()
+    pump(sync, board)
+    start = time.perf_counter()
+    for i in range(CHANGES):
+        roll = rng.random()
+        records = list(registry)
+        if roll < 0.4 or not records:
+            registry.add(random_uid(rng), "New", "User", PERMITTED)
+        elif roll < 0.7:
+            registry.remove(rng.choice(records).uid)
+        else:
+            record = rng.choice(records)
+            registry.add(record.uid, record.name, record.role, DENIED if record.permitted else PERMITTED)
+        pump(sync, board)
+        if i % 100 == 0:
+            # Pretend the ACK timeout passed for anything still unanswered
+            sync.check(time.monotonic() + 60)
+            pump(sync, board)
+    for _ in range(10):
+        if sync.state == SYNCED and not sync._in_flight:
+            break
+        sync.check(time.monotonic() + 60)
+        pump(sync, board)
+    elapsed = time.perf_counter() - start
+    stats = sync.stats()
+    print(f"{loss * 100:>6.1f}% {CHANGES:>8} {stats['deltas']:>7} {stats['loads']:>6} "
+          f"{stats['resyncs']:>8} {sent[0] / CHANGES:>10.1f} {elapsed / CHANGES * 1e6:>9.1f} "
+          f"{str(board_matches(sync, board)):>6}")
+
+
+def bench_lookup():
+    rng = random.Random(4)
+    registry = make_registry(rng, BOARD_CAPACITY)
+    board = BoardSimulator()
+    sync, _ = connect(registry, board)
+    sync.start()
+    pump(sync, board)
+    uids = [record.uid for record in registry] + [random_uid(rng) for _ in range(BOARD_CAPACITY)]
+    count = 200_000
+    start = time.perf_counter()
+    for i in range(count):
+        board.decide(uids[i % len(uids)])
+    per = (time.perf_counter() - start) / count * 1e6
+    steps = math.ceil(math.log2(BOARD_CAPACITY + 1))
+    print(f"board lookup: {per:.2f} us in the simulator, at most {steps} key compares "
+          f"on the Arduino for {BOARD_CAPACITY} cards")
+
+
+def main():
+    bench_load()
+    print()
+    print(f"{'loss':>7} {'changes':>8} {'deltas':>7} {'loads':>6} {'resyncs':>8} "
+          f"{'bytes/chg':>10} {'us/chg':>9} {'match':>6}")
+    for loss in LOSS_RATES:
+        bench_churn(loss)
+    print()
+    bench_lookup()
+
+
+if __name__ == "__main__":
+    main()
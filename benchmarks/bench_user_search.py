@@ -0,0 +1,80 @@
+# User list search at up to a million cardholders. Builds a UserIndex over
+# a registry of synthetic cards, then times typing a few queries one
+# keystroke at a time (each keystroke is a full search, as in the GUI):
+# name prefixes, UIDs, roles, words inside names and queries that match
+# nothing, which have to look at every card. Also times the single-card
+# updates that follow an enrol or a removal.
+# Run from the repository root: python benchmarks/bench_user_search.py
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway import percentile
+from registry import PERMITTED, CardRegistry
+from user_index import UserIndex
+
+SIZES = (10_000, 100_000, 1_000_000)
+UPDATES = 1000
+FIRST = ("Anna", "Ben", "Carla", "Dev", "Eve", "Finn", "Gus", "Hana", "Ivan", "Jo", "Kofi",
+         "Lena", "Mateo", "Nora", "Omar", "Priya", "Quinn", "Rosa", "Sven", "Tara")
+LAST = ("Smith", "Doe", "Nguyen", "O'Connor", "Li", "Baker", "Stone", "Garcia", "Kowalski",
+        "Haddad", "Tanaka", "Okafor", "Jensen", "Moreau", "Silva", "Novak")
+ROLES = ("Staff", "Visitor", "Contractor", "Resident", "Security")
+QUERIES = ("priya k. ok", "omar", "89 d3", "89d39d", "contractor", "kowal", "nobody here", "zz:zz")
+
+
+def make_registry(size, rng):
+    registry = CardRegistry()
+    rows = []
+    for i in range(size):
+        uid = f"{rng.getrandbits(32):08X}"
+        uid = " ".join(uid[j:j + 2] for j in range(0, 8, 2))
+        name = f"{rng.choice(FIRST)} {chr(65 + rng.randrange(26))}. {rng.choice(LAST)}"
+        rows.append([uid, name, rng.choice(ROLES), PERMITTED])
+    registry.load_rows(rows)
+    return registry
+
+
+def keystrokes(index, query):
+    # Latency of every prefix of query, as typed
+    times = []
+    for end in range(1, len(query) + 1):
+        start = time.perf_counter()
+        results = index.search(query[:end])
+        times.append((time.perf_counter() - start) * 1000)
+    return times, len(results)
+
+
+def main():
+    rng = random.Random(1)
+    for size in SIZES:
+        registry = make_registry(size, rng)
+        index = UserIndex(registry)
+        start = time.perf_counter()
+        len(index)
+        build = time.perf_counter() - start
+        print(f"{size} cards, index built in {build * 1000:.0f} ms")
+        print(f"  {'query':<14} {'hits':>6} {'p50 ms':>8} {'max ms':>8}")
+        worst = 0.0
+        for query in QUERIES:
+            times, hits = keystrokes(index, query)
+            worst = max(worst, max(times))
+            print(f"  {query:<14} {hits:>6} {percentile(times, 50):>8.2f} {max(times):>8.2f}")
+        uids = [record.uid for record in registry]
+        start = time.perf_counter()
+        for i in range(UPDATES):
+            registry.add(rng.choice(uids), f"Renamed {i}", "Staff")
+        per = (time.perf_counter() - start) / UPDATES * 1e6
+        start = time.perf_counter()
+        index[len(index) // 2]
+        position = (time.perf_counter() - start) * 1e6
+        print(f"  slowest keystroke {worst:.1f} ms, update {per:.0f} us per card, "
+              f"row lookup {position:.0f} us")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import bisect
+import random
+
+from board_sync import BOARD_CAPACITY, entry_digest, uid_key
+
+# Host-side stand-in for RFID.ino's card table and sync commands. It keeps
+# the same sorted key array and checksum as the firmware and speaks the
+# same text lines, with the pyserial subset of the transports in
+# transport.py, so AllowlistSync, the GUI or the gateway can run against it
+# without a board. drop_rate loses that share of incoming command lines to
+# exercise the resync path.
+
+
+class BoardSimulator:
+    def __init__(self, capacity=BOARD_CAPACITY, drop_rate=0.0, seed=None):
+        self.capacity = capacity
+        self.drop_rate = drop_rate
+        self.is_open = True
+        self.keys = []
+        self.permitted = []
+        self.version = 0
+        self.checksum = 0
+        self.loading = False
+        self.commands = 0
+        self.dropped = 0
+        self._random = random.Random(seed)
+        self._input = bytearray()
+        self._output = bytearray()
+
+    # Card table
+
+    def find(self, key):
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
+        return -1
+
+    def put(self, key, permitted):
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            self.checksum -= entry_digest(key, self.permitted[index])
+            self.permitted[index] = permitted
+        elif len(self.keys) >= self.capacity:
+            return False
+        else:
+            self.keys.insert(index, key)
+            self.permitted.insert(index, permitted)
+        self.checksum = (self.checksum + entry_digest(key, permitted)) & 0xFFFFFFFF
+        return True
+
+    def remove(self, key):
+        index = self.find(key)
+        if index >= 0:
+            self.checksum = (self.checksum - entry_digest(key, self.permitted[index])) & 0xFFFFFFFF
+            del self.keys[index]
+            del self.permitted[index]
+
+    def decide(self, uid):
+        # The board's offline decision: True, False (denied) or None (unknown)
+        index = self.find(uid_key(uid))
+        return None if index < 0 else self.permitted[index]
+
+    # Commands
+
+    def _reply(self, line):
+        self._output += line.encode("utf-8") + b"\r\n"
+
+    def _ack(self):
+        self._reply(f"SYNC:ACK:{self.version}:{len(self.keys)}:{self.checksum:08X}")
+
+    def command(self, line):
+        self.commands += 1
+        parts = line.strip().split(":")
+        if parts[0] == "SYNC":
+            self._sync_command(parts)
+        elif parts[0] in ("ADD_PERMITTED", "ADD_DENIED") and len(parts) > 1:
+            # Acknowledged only; the table changes through SYNC:PUT
+            permitted = parts[0] == "ADD_PERMITTED"
+            self._reply(f"Received command to add {'permitted' if permitted else 'denied'} user")
+
+    def _sync_command(self, parts):
+        op = parts[1] if len(parts) > 1 else ""
+        if op == "VER?":
+            self._reply(f"SYNC:VER:{self.version}:{len(self.keys)}:{self.checksum:08X}:{self.capacity}")
+        elif op == "BEGIN":
+            self.keys, self.permitted, self.checksum = [], [], 0
+            self.loading = True
+        elif op == "ROW" and self.loading:
+            self.put(uid_key(parts[2]), parts[3] == "P")
+        elif op == "END":
+            self.loading = False
+            self.version = int(parts[2])
+            self._ack()
+        elif op in ("PUT", "DEL"):
+            version = int(parts[2])
+            if version != self.version + 1:
+                self._reply(f"SYNC:NAK:{version}:{self.version}:ORDER")
+                return
+            if op == "PUT" and not self.put(uid_key(parts[3]), parts[4] == "P"):
+                self._reply(f"SYNC:NAK:{version}:{self.version}:FULL")
+                return
+            if op == "DEL":
+                self.remove(uid_key(parts[3]))
+            self.version = version
+            self._ack()
+
+    def scan(self, uid):
+        # Prints what RFID.ino prints for a card read
+        self._reply(f"Card UID: {uid} ")
+        self._reply("Access Granted!" if self.decide(uid) else "Access Denied!")
+
+    # Transport
+
+    @property
+    def in_waiting(self):
+        return len(self._output)
+
+    def write(self, data):
+        self._input += data
+        while True:
+            end = self._input.find(b"\n")
+            if end < 0:
+                break
+            line = self._input[:end].decode("utf-8", errors="replace")
+            del self._input[:end + 1]
+            if self.drop_rate and self._random.random() < self.drop_rate:
+                self.dropped += 1
+                continue
+            self.command(line)
+        return len(data)
+
+    def read(self, size=1):
+        data = bytes(self._output[:size])
+        del self._output[:size]
+        return data
+
+    def readline(self):
+        end = self._output.find(b"\n")
+        if end < 0:
+            return b""
+        line = bytes(self._output[:end + 1])
+        del self._output[:end + 1]
+        return line
+
+    def close(self):
+        self.is_open = False
@@ -0,0 +1,302 @@
+import time
+
+# Keeps the card table on a gate board in step with the host registry, so
+# the board can decide on its own while the host is busy or gone. Commands
+# are text lines, sent as MSG_COMMAND frames on a binary link:
+#
+#   SYNC:VER?                        -> SYNC:VER:<v>:<count>:<sum>:<capacity>
+#   SYNC:BEGIN:<v>                   start a bulk load, empties the table
+#   SYNC:ROW:<uid hex>:<P|D>         one card of the bulk load
+#   SYNC:END:<v>                     -> SYNC:ACK:<v>:<count>:<sum>
+#   SYNC:PUT:<v>:<uid hex>:<P|D>     -> SYNC:ACK:<v>:<count>:<sum>
+#   SYNC:DEL:<v>:<uid hex>           -> SYNC:ACK:<v>:<count>:<sum>
+#
+# A PUT or DEL only applies when <v> is the board's version + 1, otherwise
+# the board answers SYNC:NAK:<v>:<board v>:<reason>. The host reloads the
+# whole table after a NAK or a checksum mismatch, and asks for the version
+# again when an ACK does not come. <sum> is a 32-bit sum of per-card
+# digests, so both sides can update it on every change in any order.
+#
+# The board keeps one 64-bit key per card in a sorted array (see uid_key):
+# 4- and 7-byte UIDs are kept whole, so only 10-byte UIDs, kept as a hash,
+# can share a key. A card whose key another card already has is left off
+# the board rather than replacing it, like cards that do not fit; the
+# board then refuses it. Permitted cards are loaded before denied ones.
+
+BOARD_CAPACITY = 100
+ACK_TIMEOUT = 2.0
+VERSION_RETRIES = 3
+
+# Sync states
+UNKNOWN = "unknown"
+LOADING = "loading"
+SYNCED = "synced"
+UNSUPPORTED = "unsupported"
+
+_FNV_OFFSET = 0x811C9DC5
+_FNV_PRIME = 0x01000193
+_FNV64_OFFSET = 0xCBF29CE484222325
+_FNV64_PRIME = 0x100000001B3
+_LOW_56 = (1 << 56) - 1
+
+
+def fnv1a(data):
+    value = _FNV_OFFSET
+    for byte in data:
+        value = ((value ^ byte) * _FNV_PRIME) & 0xFFFFFFFF
+    return value
+
+
+def fnv1a64(data):
+    value = _FNV64_OFFSET
+    for byte in data:
+        value = ((value ^ byte) * _FNV64_PRIME) & 0xFFFFFFFFFFFFFFFF
+    return value
+
+
+def uid_hex(uid):
+    # "89 D3 9D 94" -> "89D39D94"
+    return uid.replace(" ", "")
+
+
+def uid_key(uid):
+    # UID length in the top byte, then the UID, or 56 bits of its FNV-1a
+    # hash when it is longer than 7 bytes
+    raw = bytes.fromhex(uid_hex(uid))
+    if len(raw) <= 7:
+        value = int.from_bytes(raw, "big")
+    else:
+        value = fnv1a64(raw) & _LOW_56
+    return len(raw) << 56 | value
+
+
+def entry_digest(key, permitted):
+    return fnv1a(key.to_bytes(8, "big") + (b"P" if permitted else b"D"))
+
+
+def table_checksum(entries):
+    # entries is an iterable of (key, permitted) pairs
+    return sum(entry_digest(key, permitted) for key, permitted in entries) & 0xFFFFFFFF
+
+
+class AllowlistSync:
+    # One per board. send(command) writes a command line to the board and
+    # handle_message() takes every line the board sends back, returning
+    # True for the ones that belong to the sync. check() retries lost
+    # requests and should be called about once a second.
+    def __init__(self, registry, send, capacity=BOARD_CAPACITY, log=None):
+        self.registry = registry
+        self.send = send
+        self.capacity = capacity
+        self.log = log
+        self.state = UNKNOWN
+        self.version = 0
+        # What the board should hold: key -> (permitted, uid hex)
+        self._table = {}
+        self._checksum = 0
+        # Sent but not yet acknowledged: version -> (count, checksum, sent at)
+        self._in_flight = {}
+        self._load_version = 0
+        self._asked_at = None
+        self._asks = 0
+        self.loads = 0
+        self.deltas = 0
+        self.acks = 0
+        self.resyncs = 0
+        self.skipped = 0
+        self.collisions = 0
+        registry.listeners.append(self._on_change)
+
+    def close(self):
+        if self._on_change in self.registry.listeners:
+            self.registry.listeners.remove(self._on_change)
+
+    def _log(self, message):
+        if self.log is not None:
+            self.log(message)
+
+    # Host side table
+
+    def _rebuild(self):
+        table = {}
+        self.skipped = 0
+        self.collisions = 0
+        for record in sorted(self.registry, key=lambda r: not r.permitted):
+            key, uid = uid_key(record.uid), uid_hex(record.uid)
+            if key in table:
+                self._collision(uid, table[key][1])
+            elif len(table) >= self.capacity:
+                self.skipped += 1
+            else:
+                table[key] = (record.permitted, uid)
+        if self.skipped:
+            self._log(f"Board holds {self.capacity} cards, {self.skipped} left to the host")
+        self._table = table
+        self._checksum = table_checksum((key, entry[0]) for key, entry in table.items())
+
+    def _on_change(self, uid, record):
+        if uid is None:
+            self._rebuild()
+            if self.state in (LOADING, SYNCED):
+                self.load()
+            return
+        key = uid_key(uid)
+        old = self._table.get(key)
+        if old is not None and old[1] != uid_hex(uid):
+            # Another card has the key on the board; this one stays off it
+            if record is not None:
+                self._collision(uid_hex(uid), old[1])
+            return
+        if record is None:
+            if old is None:
+                return
+            del self._table[key]
+            self._checksum = (self._checksum - entry_digest(key, old[0])) & 0xFFFFFFFF
+            self._send_delta(f"DEL:{{v}}:{uid_hex(uid)}")
+            return
+        if old is not None and old[0] == record.permitted:
+            # Only the name or role changed, the board does not keep those
+            return
+        if old is None and len(self._table) >= self.capacity:
+            self.skipped += 1
+            return
+        if old is not None:
+            self._checksum -= entry_digest(key, old[0])
+        self._table[key] = (record.permitted, uid_hex(uid))
+        self._checksum = (self._checksum + entry_digest(key, record.permitted)) & 0xFFFFFFFF
+        self._send_delta(f"PUT:{{v}}:{uid_hex(uid)}:{'P' if record.permitted else 'D'}")
+
+    def _collision(self, uid, holder):
+        self.collisions += 1
+        self.skipped += 1
+        self._log(f"Card {uid} has the same board key as {holder}, left to the host")
+
+    def _send_delta(self, command):
+        # Changes made before the board answered SYNC:VER? only update the
+        # table here; the version check that follows reconciles them
+        if self.state not in (LOADING, SYNCED):
+            return
+        self.version += 1
+        self._in_flight[self.version] = (len(self._table), self._checksum, time.monotonic())
+        self.deltas += 1
+        self.send("SYNC:" + command.format(v=self.version))
+
+    # Board side
+
+    def start(self):
+        # Call once the link to the board is up, again after a reconnect
+        self.state = UNKNOWN
+        self._in_flight.clear()
+        self._asks = 0
+        self._rebuild()
+        self._ask_version()
+
+    def _ask_version(self):
+        self._asks += 1
+        self._asked_at = time.monotonic()
+        self.send("SYNC:VER?")
+
+    def load(self):
+        # Replaces the board's table with the host's in one bulk load
+        self.state = LOADING
+        self.loads += 1
+        self.version += 1
+        self._load_version = self.version
+        self._in_flight.clear()
+        self.send(f"SYNC:BEGIN:{self.version}")
+        for key in sorted(self._table):
+            permitted, uid = self._table[key]
+            self.send(f"SYNC:ROW:{uid}:{'P' if permitted else 'D'}")
+        self.send(f"SYNC:END:{self.version}")
+        self._in_flight[self.version] = (len(self._table), self._checksum, time.monotonic())
+
+    def _resync(self, reason):
+        self.resyncs += 1
+        self._log(f"Board card table out of sync ({reason}), reloading")
+        self.load()
+
+    def handle_message(self, text):
+        if not text.startswith("SYNC:"):
+            return False
+        parts = text.split(":")
+        try:
+            if parts[1] == "VER":
+                self._on_version(int(parts[2]), int(parts[3]), int(parts[4], 16), int(parts[5]))
+            elif parts[1] == "ACK":
+                self._on_ack(int(parts[2]), int(parts[3]), int(parts[4], 16))
+            elif parts[1] == "NAK":
+                self._on_nak(int(parts[2]), int(parts[3]), parts[4] if len(parts) > 4 else "")
+        except (IndexError, ValueError):
+            self._log(f"Bad sync reply from board: {text}")
+        return True
+
+    def _on_version(self, version, count, checksum, capacity):
+        self._asked_at = None
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self._rebuild()
+        self.version = max(self.version, version)
+        if count == len(self._table) and checksum == self._checksum:
+            # Already holds what we have, e.g. after a host restart
+            self.version = version
+            self.state = SYNCED
+            self._in_flight.clear()
+            self._log(f"Board card table in sync at version {version} ({count} cards)")
+        else:
+            self.load()
+
+    def _on_ack(self, version, count, checksum):
+        if version < self._load_version:
+            return
+        expected = self._in_flight.pop(version, None)
+        for stale in [v for v in self._in_flight if v < version]:
+            del self._in_flight[stale]
+        if expected is None:
+            return
+        self.acks += 1
+        if (count, checksum) != expected[:2]:
+            self._resync(f"version {version} checksum")
+        elif version == self._load_version and self.state == LOADING:
+            self.state = SYNCED
+            self._log(f"Loaded {count} cards to the board, version {version}")
+
+    def _on_nak(self, version, board_version, reason):
+        # Deltas sent before the current load are expected to be refused
+        if version < self._load_version:
+            return
+        self.version = max(self.version, board_version)
+        self._resync(reason or f"version {version} refused")
+
+    def check(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        if self.state == UNKNOWN and self._asked_at is not None:
+            if now - self._asked_at > ACK_TIMEOUT:
+                if self._asks >= VERSION_RETRIES:
+                    self.state = UNSUPPORTED
+                    self._asked_at = None
+                    self._log("Board does not answer sync requests, deciding on the host only")
+                else:
+                    self._ask_version()
+        elif self._in_flight:
+            oldest = min(sent for _, _, sent in self._in_flight.values())
+            if now - oldest > ACK_TIMEOUT:
+                self.state = UNKNOWN
+                self._in_flight.clear()
+                self._asks = 0
+                self._ask_version()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "version": self.version,
+            "cards": len(self._table),
+            "capacity": self.capacity,
+            "checksum": f"{self._checksum:08X}",
+            "loads": self.loads,
+            "deltas": self.deltas,
+            "acks": self.acks,
+            "resyncs": self.resyncs,
+            "skipped": self.skipped,
+            "collisions": self.collisions,
+        }
@@ -0,0 +1,205 @@
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from registry import DENIED, PERMITTED, CardRecord
+from uid_codec import LOW_BITS, LOW_MASK, encode_uid, unpack_uid
+
+# Cards in a sorted binary file that is memory-mapped read-only, so
+# opening it reads only the header, and several processes share one copy
+# through the page cache. Cards are sorted by packed UID (uid_codec.py),
+# kept as two columns of fixed-width integers that are bisected in place,
+# in C, through memoryviews of the map. A card costs 17 bytes plus its
+# "name\0role" text.
+#
+#   header   MAGIC, journal seq and card count (HEADER)
+#   high     count x uint64, packed UID >> LOW_BITS, ascending
+#   low      count x uint32, packed UID & LOW_MASK
+#   offsets  (count + 1) x uint32, card i's text is
+#            text[offsets[i]:offsets[i + 1]]
+#   status   count x uint8, index into STATUSES
+#   text     UTF-8
+#
+# Integers are little endian. A table is never changed in place:
+# write_card_table() writes a new one from an old table plus changes,
+# copying unchanged runs of cards as they are, and the store renames it
+# over the old file.
+
+MAGIC = b"PKCARDS1"
+HEADER = struct.Struct("<8sQQ8x")
+STATUSES = (PERMITTED, DENIED)
+# Cards copied per step when an unchanged run is rewritten
+COPY_CHUNK = 65536
+
+
+def _column(data, code):
+    # Zero-copy view of little-endian integers, a copy on big-endian hosts
+    if sys.byteorder == "little":
+        return data.cast(code)
+    column = array(code, data.tobytes())
+    column.byteswap()
+    return column
+
+
+class CardTable:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.seq, self.count = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a card table")
+        n = self.count
+        self._view = memoryview(self._map)
+        high = HEADER.size
+        low = high + 8 * n
+        offsets = low + 4 * n
+        status = offsets + 4 * (n + 1)
+        self._high = _column(self._view[high:low], "Q")
+        self._low = _column(self._view[low:offsets], "I")
+        self._offsets = _column(self._view[offsets:status], "I")
+        self._status = self._view[status:status + n]
+        self._text = status + n
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.record(i)
+
+    def close(self):
+        # The views have to go before the map can be closed
+        for view in (self._high, self._low, self._offsets, self._status, self._view):
+            if isinstance(view, memoryview):
+                view.release()
+        self._map.close()
+
+    def key(self, i):
+        return self._high[i] << LOW_BITS | self._low[i]
+
+    def bisect(self, key):
+        # Index of the first card whose packed UID is not below key
+        high = key >> LOW_BITS
+        low = key & LOW_MASK
+        i = bisect.bisect_left(self._high, high)
+        while i < self.count and self._high[i] == high and self._low[i] < low:
+            i += 1
+        return i
+
+    def find(self, key):
+        # Index of the card with packed UID key, -1 if there is none
+        i = self.bisect(key)
+        if i < self.count and self._high[i] == key >> LOW_BITS and self._low[i] == key & LOW_MASK:
+            return i
+        return -1
+
+    def get(self, uid):
+        # CardRecord for a canonical UID, None if the table does not have it
+        key = encode_uid(uid)
+        if key is None:
+            return None
+        i = self.find(key)
+        return self.record(i, uid) if i >= 0 else None
+
+    def record(self, i, uid=None):
+        start = self._text + self._offsets[i]
+        end = self._text + self._offsets[i + 1]
+        name, _, role = self._map[start:end].decode("utf-8").partition("\0")
+        return CardRecord(uid or unpack_uid(self.key(i)), name, role, STATUSES[self._status[i]])
+
+
+def _card_text(record):
+    return f"{record.name.replace(chr(0), '')}\0{record.role.replace(chr(0), '')}".encode("utf-8")
+
+
+def _plan(base, records, removed):
+    # Steps that build the new table: a (start, stop) tuple copies a run
+    # of base cards, a list of (key, status, text) writes those cards
+    edits = {}
+    for uid in removed:
+        key = encode_uid(uid)
+        if key is not None:
+            edits[key] = None
+    for record in records:
+        key = encode_uid(record.uid)
+        if key is None:
+            raise ValueError(f"Card UID cannot be stored: {record.uid!r}")
+        edits[key] = (key, STATUSES.index(record.status), _card_text(record))
+    steps = []
+    pos = 0
+    count = base.count if base is not None else 0
+    for key in sorted(edits):
+        if base is not None:
+            i = base.bisect(key)
+            steps.extend((a, min(a + COPY_CHUNK, i)) for a in range(pos, i, COPY_CHUNK))
+            pos = i + 1 if i < count and base.key(i) == key else i
+        if edits[key] is not None:
+            if not steps or not isinstance(steps[-1], list) or len(steps[-1]) >= COPY_CHUNK:
+                steps.append([])
+            steps[-1].append(edits[key])
+    steps.extend((a, min(a + COPY_CHUNK, count)) for a in range(pos, count, COPY_CHUNK))
+    return steps
+
+
+def _write_column(f, values, code):
+    if isinstance(values, memoryview):
+        # Already little endian
+        f.write(values)
+        return
+    column = array(code, values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    f.write(column.tobytes())
+
+
+def write_card_table(path, records, seq=0, base=None, removed=()):
+    # Writes the cards of base (a CardTable, may be None) with records
+    # added or replacing theirs and the UIDs in removed left out
+    steps = _plan(base, records, removed)
+    count = sum(len(step) if isinstance(step, list) else step[1] - step[0] for step in steps)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, seq, count))
+        for step in steps:
+            if isinstance(step, list):
+                _write_column(f, [card[0] >> LOW_BITS for card in step], "Q")
+            else:
+                _write_column(f, base._high[step[0]:step[1]], "Q")
+        for step in steps:
+            if isinstance(step, list):
+                _write_column(f, [card[0] & LOW_MASK for card in step], "I")
+            else:
+                _write_column(f, base._low[step[0]:step[1]], "I")
+        size = 0
+        for step in steps:
+            if isinstance(step, list):
+                offsets = []
+                for card in step:
+                    offsets.append(size)
+                    size += len(card[2])
+            else:
+                old = base._offsets[step[0]:step[1] + 1]
+                shift = size - old[0]
+                offsets = [o + shift for o in old[:-1]]
+                size += old[-1] - old[0]
+            if size >= 1 << 32:
+                raise ValueError("Card table text is over 4 GiB")
+            _write_column(f, offsets, "I")
+        _write_column(f, (size,), "I")
+        for step in steps:
+            if isinstance(step, list):
+                f.write(bytes([card[1] for card in step]))
+            else:
+                f.write(base._status[step[0]:step[1]])
+        for step in steps:
+            if isinstance(step, list):
+                f.write(b"".join([card[2] for card in step]))
+            else:
+                f.write(base._map[base._text + base._offsets[step[0]]:base._text + base._offsets[step[1]]])
+        f.flush()
+        os.fsync(f.fileno())
+    return count
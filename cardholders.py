@@ -0,0 +1,275 @@
+import csv
+import json
+import os
+import tempfile
+
+from registry import DENIED, PERMITTED, normalize_uid
+from uid_codec import encode_uid
+
+# Bulk import and export of cardholders as CSV or JSON lines, for
+# onboarding a tenant without typing every card into the GUI.
+#
+#   uid,name,role,status          {"uid": "89 D3 9D 94", "name": "...",
+#   89D39D94,Jane Doe,Staff,         "role": "...", "status": "denied"}
+#
+# Files are read one row at a time and written one row at a time. An
+# import is staged first: rows that pass the checks go to a temporary file
+# (StagedRows), which is then compared with the registry and committed
+# BATCH_ROWS at a time, so memory does not grow with the file; only the
+# packed UIDs seen, for spotting duplicates, do. UIDs are normalized like
+# everywhere else; status may be left out (the default status is used) or
+# given as permitted/denied, P/D, allow/deny.
+
+CSV = "csv"
+JSONL = "jsonl"
+FORMATS = {".csv": CSV, ".jsonl": JSONL, ".ndjson": JSONL, ".json": JSONL}
+FIELDS = ("uid", "name", "role", "status")
+
+# What to do with a card that is already enrolled with other details
+SKIP = "skip"
+REPLACE = "replace"
+CONFLICT_POLICIES = (SKIP, REPLACE)
+
+# Problems kept with their line number; past this they are only counted
+MAX_ISSUES = 100
+# Staged rows compared and committed together
+BATCH_ROWS = 5000
+
+_STATUS_NAMES = {
+    "permitted": PERMITTED, "p": PERMITTED, "allow": PERMITTED, "allowed": PERMITTED,
+    "denied": DENIED, "d": DENIED, "deny": DENIED,
+}
+
+
+def detect_format(path):
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unknown cardholder file type: {path} (use .csv or .jsonl)")
+    return fmt
+
+
+def read_rows(f, fmt):
+    # Yields (line number, dict or None, error) for every data row
+    if fmt == CSV:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None:
+            return
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        if "uid" not in reader.fieldnames:
+            raise ValueError("CSV header has no uid column")
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_no, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"not JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "not a JSON object"
+            continue
+        yield line_no, row, None
+
+
+def _text(row, field):
+    value = row.get(field)
+    return "" if value is None else str(value).strip()
+
+
+def normalize_row(row, default_status=PERMITTED):
+    # Returns ([uid, name, role, status], None) or (None, reason)
+    uid = normalize_uid(_text(row, "uid"))
+    if uid is None:
+        return None, f"invalid UID {_text(row, 'uid')!r}"
+    name = _text(row, "name")
+    if not name:
+        return None, f"no name for {uid}"
+    status = _text(row, "status").lower()
+    if status:
+        status = _STATUS_NAMES.get(status)
+        if status is None:
+            return None, f"unknown status {_text(row, 'status')!r} for {uid}"
+    else:
+        status = default_status
+    return [uid, name, _text(row, "role"), status], None
+
+
+class ImportReport:
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.added = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.conflicts = 0
+        self.issues = []
+        self.committed = False
+
+    def note(self, line_no, kind, message):
+        if len(self.issues) < MAX_ISSUES:
+            self.issues.append((line_no, kind, message))
+
+    @property
+    def changes(self):
+        return self.added + self.updated
+
+    def summary(self):
+        text = (f"Imported {os.path.basename(self.path)}: {self.rows} rows, {self.added} added, "
+                f"{self.updated} updated, {self.unchanged} unchanged, {self.invalid} invalid, "
+                f"{self.duplicates} duplicates, {self.conflicts} conflicts")
+        return text if self.committed or not self.changes else text + " (not committed)"
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "rows": self.rows,
+            "added": self.added,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "invalid": self.invalid,
+            "duplicates": self.duplicates,
+            "conflicts": self.conflicts,
+            "committed": self.committed,
+            "issues": [{"line": line_no, "kind": kind, "message": message}
+                       for line_no, kind, message in self.issues],
+        }
+
+
+class StagedRows:
+    # Checked [uid, name, role, status] rows with their line numbers,
+    # spilled to a temporary JSON-lines file BATCH_ROWS at a time
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(prefix="import-", suffix=".jsonl", dir=directory)
+        self._file = os.fdopen(fd, "w", encoding="utf-8")
+        self._buffer = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, line_no, row):
+        self._buffer.append(json.dumps([line_no] + row))
+        self.count += 1
+        if len(self._buffer) >= BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+        self._file.flush()
+
+    def batches(self, size=BATCH_ROWS):
+        # Yields lists of up to size (line number, row) pairs, in file order
+        self._flush()
+        with open(self.path, encoding="utf-8") as f:
+            batch = []
+            for line in f:
+                line_no, *row = json.loads(line)
+                batch.append((line_no, row))
+                if len(batch) >= size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def stage_import(path, default_status=PERMITTED):
+    # Reads and checks a file without looking at the registry, so it may
+    # run on any thread. Returns (StagedRows, report); the first row for a
+    # UID wins, later ones are reported as duplicates. The caller closes
+    # the StagedRows.
+    fmt = detect_format(path)
+    report = ImportReport(path)
+    staged = StagedRows()
+    seen = set()
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for line_no, raw, error in read_rows(f, fmt):
+                report.rows += 1
+                row = None
+                if error is None:
+                    row, error = normalize_row(raw, default_status)
+                if error is not None:
+                    report.invalid += 1
+                    report.note(line_no, "invalid", error)
+                    continue
+                key = encode_uid(row[0])
+                if key in seen:
+                    report.duplicates += 1
+                    report.note(line_no, "duplicate", f"{row[0]} appears earlier in the file")
+                    continue
+                seen.add(key)
+                staged.append(line_no, row)
+    except BaseException:
+        staged.close()
+        raise
+    return staged, report
+
+
+def compare_rows(batch, registry, on_conflict, report):
+    # The rows of a staged batch that change the registry, counted in
+    # report; call on the thread that owns the registry
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy: {on_conflict!r}")
+    rows = []
+    for line_no, row in batch:
+        uid = row[0]
+        current = registry.get(uid)
+        if current is None:
+            report.added += 1
+        elif [current.uid, current.name, current.role, current.status] == row:
+            report.unchanged += 1
+            continue
+        else:
+            report.conflicts += 1
+            report.note(line_no, "conflict",
+                        f"{uid} is {current.display()} ({current.status}), "
+                        f"file has {row[1]} ({row[3]})")
+            if on_conflict == SKIP:
+                continue
+            report.updated += 1
+        rows.append(row)
+    return rows
+
+
+def export_cardholders(registry, path, status=None):
+    # Writes every card (or those with status) and returns how many. The
+    # file is replaced whole, so a reader never sees half of it.
+    fmt = detect_format(path)
+    count = 0
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            if fmt == CSV:
+                writer = csv.writer(f)
+                writer.writerow(FIELDS)
+                for record in registry:
+                    if status is None or record.status == status:
+                        writer.writerow((record.uid, record.name, record.role, record.status))
+                        count += 1
+            else:
+                for record in registry:
+                    if status is None or record.status == status:
+                        f.write(json.dumps(record.to_dict()) + "\n")
+                        count += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Leave no half-written export behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
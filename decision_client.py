@@ -0,0 +1,163 @@
+import itertools
+import json
+import socket
+import threading
+
+from decision_service import DEFAULT_SOCKET, ServiceError
+
+# Client for the decision service (decision_service.py), for kiosks,
+# bridges and scripts on the same host. Needs nothing but the standard
+# library. Connections are pooled and reused, so a query costs one round
+# trip; a DecisionClient can be shared between threads, each request
+# borrowing a connection for as long as it takes.
+#
+#   client = DecisionClient("/tmp/parking-gate.sock")
+#   client.check("89 D3 9D 94")   -> {"allowed": True, "slot": "Slot 1", ...}
+#   client.check_many(uids)       -> one result per UID, in one request
+#   client.pipeline([("check", {"uid": a}), ("check", {"uid": b})])
+#   client.reserve("89 D3 9D 94", start, end)  -> {"slot": "Slot 2", ...} or None
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 5.0
+
+
+class _Connection:
+    def __init__(self, path, timeout):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(path)
+        except OSError:
+            self.sock.close()
+            raise
+        self.reader = self.sock.makefile("rb")
+        # Taken from the idle pool rather than freshly connected
+        self.pooled = False
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def receive(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("decision service closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class DecisionClient:
+    def __init__(self, path=DEFAULT_SOCKET, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        # At most pool_size connections open; more threads wait for one
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._ids = itertools.count(1)
+        self.connects = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("no free decision service connection")
+        with self._lock:
+            if self._idle:
+                connection = self._idle.pop()
+                connection.pooled = True
+                return connection
+        try:
+            return self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _connect(self):
+        connection = _Connection(self.path, self.timeout)
+        self.connects += 1
+        return connection
+
+    def _release(self, connection, healthy):
+        if healthy:
+            with self._lock:
+                self._idle.append(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def pipeline(self, requests):
+        # Sends (op, fields) requests in one write on one connection and
+        # returns their results in order. A failed request raises
+        # ServiceError after every response has been read.
+        ids = []
+        lines = []
+        for op, fields in requests:
+            request_id = next(self._ids)
+            ids.append(request_id)
+            lines.append(json.dumps({"id": request_id, "op": op, **fields}, separators=(",", ":")))
+        data = ("\n".join(lines) + "\n").encode()
+        connection = self._acquire()
+        healthy = False
+        try:
+            try:
+                connection.send(data)
+            except OSError:
+                if not connection.pooled:
+                    raise
+                # An idle connection the service dropped, e.g. on a daemon
+                # restart: nothing was sent, so reconnect once and resend
+                connection.close()
+                connection = self._connect()
+                connection.send(data)
+            responses = [connection.receive() for _ in ids]
+            healthy = True
+        finally:
+            self._release(connection, healthy)
+        results = []
+        for request_id, response in zip(ids, responses):
+            if response.get("id") != request_id:
+                raise ServiceError(f"response {response.get('id')} to request {request_id}")
+            if not response.get("ok"):
+                raise ServiceError(response.get("error"))
+            results.append(response["result"])
+        return results
+
+    def request(self, op, **fields):
+        return self.pipeline([(op, fields)])[0]
+
+    def check(self, uid):
+        return self.request("check", uid=uid)
+
+    def check_many(self, uids):
+        return self.request("check", uids=list(uids))
+
+    def scan(self, uid, gate=None):
+        return self.request("scan", uid=uid, gate=gate)
+
+    def reserve(self, uid, start, end, slot=None, zone=None):
+        return self.request("reserve", uid=uid, start=start, end=end, slot=slot, zone=zone)
+
+    def cancel(self, slot, start):
+        return self.request("cancel", slot=slot, start=start)
+
+    def available(self, start, end, zone=None):
+        return self.request("available", start=start, end=end, zone=zone)
+
+    def status(self):
+        return self.request("status")
+
+    def ping(self):
+        return self.request("ping")
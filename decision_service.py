@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import socket
+import stat
+import tempfile
+import time
+
+from events import CardScan
+from registry import normalize_uid
+
+# Access decisions for other processes on this host (ticket kiosks, the
+# barrier PLC bridge, reporting scripts) over a Unix-domain socket, served
+# from the daemon's event loop next to the gate readers.
+#
+# One JSON object per line each way. A request is {"id": ..., "op": ...}
+# plus the op's fields; its response is {"id": ..., "ok": true, "result":
+# ...} or {"id": ..., "ok": false, "error": "..."}. Requests on one
+# connection are answered in order, so a client may send many before
+# reading any (pipelining). Ops:
+#
+#   check   {"uid": "89 D3 9D 94"} or {"uids": [...]}: whether the card is
+#           allowed and which slot it holds; changes nothing
+#   scan    {"uid": ..., "gate": ...}: the same decision as a read at a
+#           gate, so the car enters or leaves
+#   reserve {"uid": ..., "start": ..., "end": ...}, optionally "slot" or
+#           "zone": books the slot, or the lowest free one, for [start, end)
+#           (seconds since the epoch); the result is null when none is free
+#   cancel  {"slot": ..., "start": ...}: cancels that booking
+#   available {"start": ..., "end": ...}, optionally "zone": the lowest slot
+#           free for the whole range, without booking it
+#   status  the engine status, as parking_daemon.py --status prints it
+#   ping
+#
+# Times must lie between the epoch and LATEST_TIME, and a range may span at
+# most MAX_RANGE: a longer one would hold the event loop scanning buckets.
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "parking-gate.sock")
+# Longest request line; a batch of a few thousand UIDs fits
+MAX_REQUEST = 1 << 20
+# Gate name of scans sent without one
+SERVICE_GATE = "ipc"
+# Start of the year 3000, well inside what datetime and array("q") take
+LATEST_TIME = 32_503_680_000
+MAX_RANGE = 366 * 24 * 3600
+
+
+class ServiceError(Exception):
+    pass
+
+
+def card_info(engine, uid):
+    record = engine.registry.lookup(uid)
+    key = record.uid if record is not None else normalize_uid(uid)
+    slot = engine.find_user_slot(key) if key is not None else None
+    return {
+        "uid": key or uid,
+        "status": record.status if record is not None else "unknown",
+        "allowed": record is not None and record.permitted,
+        "name": record.name if record is not None else None,
+        "role": record.role if record is not None else None,
+        "slot": slot.label if slot is not None else None,
+        "zone": slot.zone if slot is not None else None,
+    }
+
+
+def decision_info(decision):
+    if decision is None:
+        # A repeat read of the same card within the dedup window
+        return {"outcome": "duplicate"}
+    return {
+        "outcome": decision.outcome,
+        "uid": decision.uid,
+        "name": decision.user.name if decision.user is not None else None,
+        "role": decision.user.role if decision.user is not None else None,
+        "slot": decision.slot.label if decision.slot is not None else None,
+    }
+
+
+def booking_info(engine, booking):
+    if booking is None:
+        return None
+    return {"slot": engine.slots[booking.slot].label, "start": booking.start,
+            "end": booking.end, "uid": booking.uid}
+
+
+class DecisionService:
+    def __init__(self, engine, path=DEFAULT_SOCKET):
+        self.engine = engine
+        self.path = path
+        self.server = None
+        self.connections = 0
+        self.active = 0
+        self.requests = 0
+        self.errors = 0
+        self.ops = {}
+        self._handlers = {
+            "check": self._check,
+            "scan": self._scan,
+            "reserve": self._reserve,
+            "cancel": self._cancel,
+            "available": self._available,
+            "status": lambda request: self.engine.status(),
+            "ping": lambda request: "pong",
+        }
+
+    async def start(self):
+        self._remove_stale_socket()
+        self.server = await asyncio.start_unix_server(self._serve, self.path, limit=MAX_REQUEST)
+        self.engine.log.append(f"Decision service listening on {self.path}")
+
+    def _remove_stale_socket(self):
+        # A socket file left by a crashed daemon, unless one still answers
+        try:
+            mode = os.stat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise OSError(f"{self.path} exists and is not a socket")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)
+        else:
+            raise OSError(f"Another decision service is listening on {self.path}")
+        finally:
+            probe.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self.active += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than MAX_REQUEST; the stream cannot be resynced
+                    writer.write(self._error(None, "request too long"))
+                    break
+                if not line:
+                    break
+                writer.write(self.handle(line))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.active -= 1
+            writer.close()
+
+    def handle(self, line):
+        # One request line in, one response line out
+        self.requests += 1
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return self._error(None, "not JSON")
+        if not isinstance(request, dict):
+            return self._error(None, "request is not an object")
+        request_id = request.get("id")
+        op = request.get("op")
+        handler = self._handlers.get(op)
+        if handler is None:
+            return self._error(request_id, f"unknown op {op!r}")
+        self.ops[op] = self.ops.get(op, 0) + 1
+        try:
+            result = handler(request)
+        except ServiceError as e:
+            return self._error(request_id, str(e))
+        except Exception as e:
+            # A bug or a request we did not foresee; keep the connection
+            self.engine.log.append(f"Service {op} failed: {e!r}")
+            return self._error(request_id, f"{op} failed: {e}")
+        return (json.dumps({"id": request_id, "ok": True, "result": result},
+                           separators=(",", ":")) + "\n").encode()
+
+    def _error(self, request_id, message):
+        self.errors += 1
+        return (json.dumps({"id": request_id, "ok": False, "error": message},
+                           separators=(",", ":")) + "\n").encode()
+
+    def _check(self, request):
+        if "uids" in request:
+            uids = request["uids"]
+            if not isinstance(uids, list) or not all(isinstance(uid, str) for uid in uids):
+                raise ServiceError("uids must be a list of strings")
+            return [card_info(self.engine, uid) for uid in uids]
+        uid = request.get("uid")
+        if not isinstance(uid, str):
+            raise ServiceError("uid must be a string")
+        return card_info(self.engine, uid)
+
+    def _scan(self, request):
+        uid = request.get("uid")
+        key = normalize_uid(uid) if isinstance(uid, str) else None
+        if key is None:
+            raise ServiceError("uid must be a card UID")
+        gate = request.get("gate") or SERVICE_GATE
+        event = CardScan(key, f"Card UID: {key}", time.perf_counter(), gate)
+        return decision_info(self.engine.handle_event(event))
+
+    def _time(self, request, name):
+        value = request.get(name)
+        # NaN and infinity, which json accepts, fail the comparison too
+        if not (isinstance(value, (int, float)) and not isinstance(value, bool)
+                and 0 <= value <= LATEST_TIME):
+            raise ServiceError(f"{name} must be seconds since the epoch, before the year 3000")
+        return int(value)
+
+    def _range(self, request):
+        start, end = self._time(request, "start"), self._time(request, "end")
+        if end <= start:
+            raise ServiceError("end must be after start")
+        if end - start > MAX_RANGE:
+            raise ServiceError(f"a range may span at most {MAX_RANGE // 86400} days")
+        return start, end
+
+    def _slot_index(self, label):
+        for slot in self.engine.slots:
+            if slot.label == label:
+                return slot.index
+        raise ServiceError(f"no slot {label!r}")
+
+    def _reservations(self):
+        if self.engine.reservations is None:
+            raise ServiceError("reservations are not enabled")
+        return self.engine.reservations
+
+    def _reserve(self, request):
+        self._reservations()
+        start, end = self._range(request)
+        uid = request.get("uid")
+        if not isinstance(uid, str):
+            raise ServiceError("uid must be a string")
+        index = self._slot_index(request["slot"]) if request.get("slot") is not None else None
+        try:
+            booking = self.engine.reserve(uid, start, end, index, request.get("zone"))
+        except ValueError as e:
+            raise ServiceError(str(e)) from None
+        return booking_info(self.engine, booking)
+
+    def _cancel(self, request):
+        self._reservations()
+        start = self._time(request, "start")
+        booking = self.engine.cancel_reservation(self._slot_index(request.get("slot")), start)
+        return booking_info(self.engine, booking)
+
+    def _available(self, request):
+        reservations = self._reservations()
+        start, end = self._range(request)
+        zone = request.get("zone")
+        slots = self.engine.slots
+        index = reservations.find_free(start, end,
+                                       accept=lambda i: zone is None or slots[i].zone == zone)
+        return None if index is None else {"slot": slots[index].label, "zone": slots[index].zone}
+
+    def stats(self):
+        return {"connections": self.connections, "active": self.active,
+                "requests": self.requests, "errors": self.errors, "ops": dict(self.ops)}
@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+
+DEFAULT_WINDOW = 2.0
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class ScanDedup:
+    # Drops repeat reads of a card that is still on the reader. The MFRC522
+    # reports a card many times while it stays in the field, so a read is a
+    # duplicate when the same UID was seen at the same gate less than window
+    # seconds earlier. Every read restarts the window, so a card left on the
+    # reader stays suppressed until it has been away for a full window.
+    #
+    # Entries are kept in last-seen order: expired ones, and the oldest once
+    # there are more than max_entries, are evicted from the front.
+    def __init__(self, window=DEFAULT_WINDOW, max_entries=DEFAULT_MAX_ENTRIES, enabled=True):
+        self.window = window
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._seen = OrderedDict()
+        self.passed = 0
+        self.suppressed = 0
+        self.evicted = 0
+
+    def is_duplicate(self, uid, gate=None, now=None):
+        # now is a time.perf_counter() stamp, like CardScan.received
+        if not self.enabled or self.window <= 0:
+            self.passed += 1
+            return False
+        if now is None:
+            now = time.perf_counter()
+        seen = self._seen
+        key = (gate, uid)
+        last = seen.get(key)
+        seen[key] = now
+        seen.move_to_end(key)
+        self._evict(now)
+        if last is not None and 0 <= now - last < self.window:
+            self.suppressed += 1
+            return True
+        self.passed += 1
+        return False
+
+    def _evict(self, now):
+        seen = self._seen
+        cutoff = now - self.window
+        while seen:
+            key, stamp = next(iter(seen.items()))
+            if stamp >= cutoff and len(seen) <= self.max_entries:
+                break
+            seen.popitem(last=False)
+            self.evicted += 1
+
+    def clear(self):
+        self._seen.clear()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "window": self.window,
+            "entries": len(self._seen),
+            "passed": self.passed,
+            "suppressed": self.suppressed,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,511 @@
+import time
+from collections import namedtuple
+
+from access_log import AccessLogSink, EventLog
+from cardholders import SKIP, compare_rows, export_cardholders, stage_import
+from dedup import DEFAULT_WINDOW, ScanDedup
+from enrollment import DENY, HOLD, TEMP_PASS, EnrollmentQueue
+from events import CardScan
+from metrics import DECISION, END_TO_END, LOOKUP, PARSE, SLOT_SEARCH, Metrics
+from policy import DecisionCache, Policy, PolicyFile
+from protocol import parse_line
+from registry import CardRegistry, DENIED, PERMITTED, normalize_uid
+from reservation_store import ReservationStore
+from reservations import WALK_IN_HOLD, ReservationBook, to_seconds
+from session_store import SessionStore
+from slots import ASSIGN_POLICIES, NearestFree, SlotMap
+from user_store import UserStore
+
+# Core access-decision logic shared by the Tk GUI (RFID.py) and the headless
+# daemon (parking_daemon.py). Nothing in here may import tkinter or PIL.
+
+DEFAULT_USERS = (
+    {"uid": "89 D3 9D 94", "name": "Swaroop", "role": "Admin"},
+    {"uid": "13 D3 09 27", "name": "Tester", "role": "User"},
+)
+DEFAULT_SLOT_COUNT = 4
+
+# Outcomes of a card scan
+GRANTED = "granted"      # permitted and needs a slot
+ASSIGNED = "assigned"    # permitted and parked in an auto-assigned slot
+FREED = "freed"          # permitted and was parked, slot released
+REFUSED = "denied"       # on the denied list
+UNKNOWN = "unknown"      # not enrolled, queued for an operator
+HELD = "held"            # not enrolled, waiting at the gate for an operator
+LOT_FULL = "full"        # permitted but no free slot for auto-assign
+RESTRICTED = "restricted"  # permitted, but not at this time (policy.py)
+
+Decision = namedtuple("Decision", "outcome uid user slot gate", defaults=(None,))
+
+# The policy without a policy file
+_ALLOW_ALL = Policy()
+
+
+def _clock(seconds):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(seconds))
+
+
+class ParkingEngine:
+    def __init__(self, users_path="users.json", slot_count=DEFAULT_SLOT_COUNT,
+                 default_users=DEFAULT_USERS, auto_assign=False, log_path=None,
+                 layout=None, assign_policy=None, dedup_window=DEFAULT_WINDOW,
+                 unknown_default=DENY, analytics_path=None, sessions_path=None,
+                 metrics=None, policy_path=None, reservations_path=None):
+        self.registry = CardRegistry()
+        # Stage timings and counters, off until someone looks at them
+        self.metrics = metrics or Metrics()
+        self.store = UserStore(self.registry, users_path)
+        # layout is a list of {"zone", "level", "count"} specs, see slots.py
+        self.slots = SlotMap(layout if layout is not None else slot_count)
+        # Parked cars survive a restart when sessions_path is set
+        self.sessions = SessionStore(self.slots, sessions_path) if sessions_path else None
+        # Restored sessions whose card was removed or denied since
+        self.stale_sessions = []
+        # Full history goes to log_path when set, the ring keeps recent lines
+        self.log = EventLog(sink=AccessLogSink(log_path) if log_path else None)
+        self.default_users = list(default_users)
+        # Headless gates have nobody to pick a slot, so they auto-assign
+        self.auto_assign = auto_assign
+        if isinstance(assign_policy, str):
+            assign_policy = ASSIGN_POLICIES[assign_policy]()
+        self.assign_policy = assign_policy or NearestFree()
+        # Repeat reads of a card held on the reader; a window of 0 disables
+        self.dedup = ScanDedup(dedup_window or DEFAULT_WINDOW, enabled=bool(dedup_window))
+        # Unknown cards wait here for an operator instead of blocking the gate
+        self.enrollments = EnrollmentQueue(unknown_default)
+        # Entry/exit history for occupancy analytics, needs numpy
+        self.analytics = None
+        if analytics_path:
+            from analytics import OccupancyAnalytics
+            self.analytics = OccupancyAnalytics(analytics_path, slot_count=len(self.slots))
+        # Role hours, stays and reserved zones; without a file anyone
+        # permitted may enter at any time and park anywhere
+        self.policies = PolicyFile(policy_path, log=self.log.append) if policy_path else None
+        # Slots booked ahead; a booked driver's tap-in parks them in it
+        self.reservations = None
+        self.reservation_store = None
+        if reservations_path:
+            self.reservations = ReservationBook(len(self.slots))
+            self.reservation_store = ReservationStore(self.reservations, self.slots, reservations_path)
+        # Card and rule per UID on the scan path, dropped on any change
+        self.decisions = DecisionCache()
+        self.registry.listeners.append(self.decisions.clear)
+        if self.policies is not None:
+            self.policies.listeners.append(self.decisions.clear)
+
+    @property
+    def policy(self):
+        return self.policies.policy if self.policies is not None else _ALLOW_ALL
+
+    def start(self):
+        if self.policies is not None:
+            self.policies.reload()
+        self.store.load()
+        for entry in self.store.migrated_dropped:
+            # Legacy entries saved without a UID cannot be matched to a card
+            self.log.append(f"Dropped user entry without UID: {entry}")
+        restored = self.restore_sessions() if self.sessions is not None else []
+        if self.reservation_store is not None:
+            self.reservation_store.load()
+            for label, start, end, uid in self.reservation_store.dropped:
+                self.log.append(f"Dropped booking of {label} for {uid}, the slot no longer exists "
+                                f"or the booking overlaps another")
+        if self.analytics is not None:
+            # Sessions of cars that are no longer parked were cut short
+            closed = self.analytics.clear_open(keep={slot.index: slot.uid for slot in restored})
+            if closed:
+                self.log.append(f"Closed {closed} parking sessions left open by the last run")
+            for slot in restored:
+                if slot.index not in self.analytics.open:
+                    # Entry lost with a crash before the history was flushed
+                    self.analytics.record_entry(slot.index, slot.uid, slot.role,
+                                                now=slot.since.timestamp() if slot.since else None)
+        self.add_default_users()
+
+    def restore_sessions(self):
+        restored = self.sessions.load()
+        for label, uid, name in self.sessions.dropped:
+            self.log.append(f"Could not restore {label} for {name} ({uid}), the slot no longer exists")
+        for slot in restored:
+            user = self.registry.lookup(slot.uid)
+            if user is None:
+                self.stale_sessions.append(slot.index)
+                self.log.append(f"{slot.label} restored for {slot.name} ({slot.uid}), "
+                                f"but the card is no longer enrolled")
+            elif not user.permitted:
+                self.stale_sessions.append(slot.index)
+                self.log.append(f"{slot.label} restored for {user.name}, but the card is now denied")
+            elif (user.name, user.role) != (slot.name, slot.role):
+                self.slots.relabel(slot.index, user)
+        if restored:
+            self.log.append(f"Restored {len(restored)} parked cars from the last run")
+        return restored
+
+    def close(self):
+        self.store.close()
+        if self.reservation_store is not None:
+            self.reservation_store.close()
+        if self.sessions is not None:
+            self.sessions.close()
+        self.log.close()
+        if self.analytics is not None:
+            self.analytics.close()
+
+    # Serial input
+
+    def handle_line(self, line, gate=None):
+        metrics = self.metrics
+        timed = metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        event = parse_line(line, gate=gate)
+        if timed:
+            metrics.observe(PARSE, start)
+        if isinstance(event, CardScan):
+            return self.handle_event(event)
+        return None
+
+    def is_duplicate(self, event):
+        if self.dedup.is_duplicate(event.uid, event.gate, event.received):
+            self.metrics.count("duplicates")
+            return True
+        return False
+
+    def handle_event(self, event):
+        # Duplicate reads are dropped before logging or deciding: None
+        if isinstance(event, CardScan) and not self.is_duplicate(event):
+            self.log.append(event.raw if event.gate is None else f"[{event.gate}] {event.raw}")
+            decision = self.handle_scan(event.uid, event.gate)
+            if self.metrics.enabled:
+                self.metrics.observe(END_TO_END, event.received)
+            return decision
+        return None
+
+    def handle_scan(self, uid, gate=None):
+        # Stages are timed only while metrics are enabled, otherwise each
+        # costs one attribute check
+        metrics = self.metrics
+        if not metrics.enabled:
+            return self._decide(uid, gate)
+        start = time.perf_counter()
+        decision = self._decide(uid, gate)
+        metrics.observe(DECISION, start)
+        metrics.count(decision.outcome)
+        return decision
+
+    def _decide(self, uid, gate):
+        # timed is read once, so a toggle mid-scan cannot leave start unset
+        metrics = self.metrics
+        timed = metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        if self.policies is not None:
+            self.policies.maybe_reload()
+        cached = self.decisions.get(uid)
+        if cached is None:
+            user = self.registry.lookup(uid)
+            if user is not None:
+                cached = (user, self.policy.rule(user.role))
+                self.decisions.put(uid, cached)
+        if timed:
+            metrics.observe(LOOKUP, start)
+        if cached is None:
+            return self._handle_unknown(normalize_uid(uid) or uid, gate)
+        user, rule = cached
+        if not user.permitted:
+            self.log.append(f"Access denied: {user.name}")
+            # Let a car out that came in before the card was denied
+            slot = self.slots.find_user(user.uid)
+            if slot is not None:
+                self.free_slot(slot.index)
+                self.log.append(f"Slot freed for {user.name}")
+            return Decision(REFUSED, user.uid, user, slot, gate)
+        if not rule.allows() and self.slots.find_user(user.uid) is None:
+            self.log.append(f"Access restricted: {user.name} ({user.role}) may not enter now")
+            return Decision(RESTRICTED, user.uid, user, None, gate)
+
+        self.log.append(f"Welcome, {user.name} ({user.role})")
+        return self._admit(user, gate, rule)
+
+    def _handle_unknown(self, uid, gate):
+        entry = self.enrollments.add(uid, gate)
+        if entry.scans == 1:
+            self.log.append(f"Unknown card {uid} queued for enrollment ({entry.decision})")
+        if entry.decision == TEMP_PASS:
+            return self._admit(entry.temp_user, gate, self.policy.rule(entry.temp_user.role))
+        if entry.decision == HOLD:
+            return Decision(HELD, uid, None, None, gate)
+        return Decision(UNKNOWN, uid, None, None, gate)
+
+    def _admit(self, user, gate, rule=None):
+        # Parks or releases a permitted driver
+        metrics = self.metrics
+        timed = metrics.enabled
+        if timed:
+            start = time.perf_counter()
+        rule = rule or self.policy.rule(user.role)
+        slot = self.slots.find_user(user.uid)
+        if slot is not None:
+            if timed:
+                metrics.observe(SLOT_SEARCH, start)
+            over = rule.overstayed(slot.since)
+            if over:
+                metrics.count("overstays")
+                self.log.append(f"{user.name} stayed {over // 60} min over the "
+                                f"{rule.max_stay // 60} min allowed for {user.role}")
+            self.free_slot(slot.index)
+            self.log.append(f"Slot freed for {user.name}")
+            return Decision(FREED, user.uid, user, slot, gate)
+        booked = self._booked_slot(user, rule)
+        if booked is not None:
+            if timed:
+                metrics.observe(SLOT_SEARCH, start)
+            self.log.append(f"{booked.label} is booked for {user.name}")
+            self.occupy_slot(booked.index, user)
+            return Decision(ASSIGNED, user.uid, user, booked, gate)
+        if not self.auto_assign:
+            if timed:
+                metrics.observe(SLOT_SEARCH, start)
+            return Decision(GRANTED, user.uid, user, None, gate)
+        slot = self.assign_policy.choose(self.slots, user, gate)
+        if slot is not None and (slot.zone in rule.excluded or self._held(slot.index)):
+            # Reserved for other roles or booked by another driver
+            slot = self._first_allowed(rule)
+        if timed:
+            metrics.observe(SLOT_SEARCH, start)
+        if slot is None:
+            self.log.append(f"No free slot for {user.name}")
+            return Decision(LOT_FULL, user.uid, user, None, gate)
+        self.occupy_slot(slot.index, user)
+        return Decision(ASSIGNED, user.uid, user, slot, gate)
+
+    # Slots
+
+    def find_user_slot(self, uid):
+        return self.slots.find_user(uid)
+
+    def free_slots(self, zone=None, limit=None):
+        return self.slots.free_slots(zone, limit)
+
+    def slot_allowed(self, index, user):
+        # Whether the policy lets user park in the slot and nobody else has
+        # it booked, for manual picks
+        return self.policy.zone_allowed(self.slots[index].zone, user.role) and not self._held(index)
+
+    def _held(self, index, now=None):
+        # Booked from now or within WALK_IN_HOLD
+        if self.reservations is None:
+            return False
+        now = to_seconds(now if now is not None else time.time())
+        return not self.reservations.is_free(index, now, now + WALK_IN_HOLD)
+
+    def _first_allowed(self, rule):
+        if self.reservations is None:
+            return self.slots.first_free(exclude=rule.excluded)
+        now = int(time.time())
+        slots = self.slots
+        index = self.reservations.find_free(
+            now, now + WALK_IN_HOLD,
+            accept=lambda i: slots[i].free and slots[i].zone not in rule.excluded)
+        return None if index is None else slots[index]
+
+    def _booked_slot(self, user, rule):
+        # The free slot user has booked for about now, if the policy still
+        # lets them park there
+        if self.reservations is None:
+            return None
+        booking = self.reservations.current(user.uid, time.time())
+        if booking is None:
+            return None
+        slot = self.slots[booking.slot]
+        if slot.zone in rule.excluded:
+            self.log.append(f"{slot.label} is booked for {user.name} but zone {slot.zone} "
+                            f"is not open to {user.role}")
+            return None
+        if not slot.free:
+            self.log.append(f"{slot.label} is booked for {user.name} but not free")
+            return None
+        return slot
+
+    # Reservations
+
+    def reserve(self, uid, start, end, index=None, zone=None):
+        # Books slot index, or the lowest slot (in zone) free for the whole
+        # range; returns the Booking or None if there is no such slot.
+        # Denied cards and zones the card's role may not use are refused.
+        if self.reservations is None:
+            raise ValueError("reservations are not enabled")
+        start, end = to_seconds(start), to_seconds(end)
+        record = self.registry.lookup(uid)
+        uid = record.uid if record is not None else normalize_uid(uid)
+        if uid is None:
+            raise ValueError("not a card UID")
+        if record is not None and not record.permitted:
+            raise ValueError(f"{uid} is denied")
+        rule = self.policy.rule(record.role if record is not None else None)
+        slots = self.slots
+        if index is not None:
+            if slots[index].zone in rule.excluded:
+                raise ValueError(f"{slots[index].label} is in zone {slots[index].zone}, "
+                                 f"which is reserved for other roles")
+        else:
+            index = self.reservations.find_free(
+                start, end, accept=lambda i: slots[i].zone not in rule.excluded and
+                (zone is None or slots[i].zone == zone))
+            if index is None:
+                return None
+        booking = self.reservations.book(index, start, end, uid)
+        if booking is not None:
+            self.log.append(f"{self.slots[index].label} booked for {uid} "
+                            f"from {_clock(start)} to {_clock(end)}")
+        return booking
+
+    def cancel_reservation(self, index, start):
+        booking = self.reservations.cancel(index, start) if self.reservations is not None else None
+        if booking is not None:
+            self.log.append(f"Booking of {self.slots[index].label} for {booking.uid} "
+                            f"from {_clock(booking.start)} cancelled")
+        return booking
+
+    def overstays(self, now=None):
+        # (slot, minutes over) for parked cars past their role's max stay
+        policy = self.policy
+        result = []
+        for slot in self.slots:
+            if slot.uid is not None and slot.since is not None:
+                over = policy.rule(slot.role).overstayed(slot.since, now)
+                if over:
+                    result.append((slot, over // 60))
+        return result
+
+    def occupy_slot(self, index, user):
+        slot = self.slots.occupy(index, user)
+        if slot is not None:
+            self.log.append(f"{slot.label} assigned to {user.name}")
+            if self.analytics is not None:
+                self.analytics.record_entry(index, user.uid, user.role)
+        return slot
+
+    def free_slot(self, index):
+        if self.analytics is not None and self.slots[index].uid is not None:
+            self.analytics.record_exit(index)
+        if index in self.stale_sessions:
+            self.stale_sessions.remove(index)
+        return self.slots.release(index)
+
+    def mark_denied(self):
+        return self.slots.flag_denied()
+
+    # Users
+
+    def enroll(self, uid, name, role="", status=PERMITTED):
+        record = self.registry.add(uid, name, role, status)
+        self.store.put(record)
+        return record
+
+    def resolve_pending(self, uids, status, name="", role=""):
+        # Enrols queued cards in one journal batch. A permitted card that is
+        # held at a gate is let in at once; its decisions are returned.
+        decisions = []
+        with self.store.batch():
+            for uid in uids:
+                entry = self.enrollments.pop(uid)
+                if entry is None:
+                    continue
+                record = self.enroll(uid, name or f"Card {uid}", role, status)
+                self.log.append(f"Enrolled pending card as {status}: {record.display()}")
+                slot = self.slots.find_user(uid)
+                if slot is not None and status == PERMITTED:
+                    # Was parked on a temporary pass
+                    self.slots.relabel(slot.index, record)
+                elif entry.decision == HOLD and status == PERMITTED:
+                    self.log.append(f"Welcome, {record.name} ({record.role})")
+                    decisions.append(self._admit(record, entry.gate))
+        return decisions
+
+    def approve_pending(self, uids, name="", role=""):
+        return self.resolve_pending(uids, PERMITTED, name, role)
+
+    def deny_pending(self, uids, name="", role=""):
+        return self.resolve_pending(uids, DENIED, name, role)
+
+    def dismiss_pending(self, uids):
+        for uid in uids:
+            self.enrollments.pop(uid)
+
+    def clear_users(self, status):
+        self.registry.clear(status)
+        self.store.clear(status)
+
+    def import_cardholders(self, path, on_conflict=SKIP, default_status=PERMITTED, dry_run=False):
+        # Streams a CSV/JSONL file of cardholders in and commits the changes
+        # batch by batch; returns the ImportReport
+        staged, report = stage_import(path, default_status)
+        try:
+            for _ in self.apply_import(staged, report, on_conflict, dry_run):
+                pass
+        finally:
+            staged.close()
+        return report
+
+    def apply_import(self, staged, report, on_conflict=SKIP, dry_run=False):
+        # The commit half of import_cardholders(), for a caller that staged
+        # the file on another thread. A generator: compares each batch of
+        # staged rows with the registry and merges it, then yields, so a
+        # GUI can run its loop between batches. The registry is only
+        # touched here. Each batch is journaled in one write before it
+        # yields, so rows the GUI already shows survive a crash mid-import.
+        for batch in staged.batches():
+            rows = compare_rows(batch, self.registry, on_conflict, report)
+            if rows and not dry_run:
+                self.registry.merge_rows(rows)
+                uids = {row[0] for row in rows}
+                with self.store.batch():
+                    for uid in uids:
+                        self.store.put(self.registry.get(uid))
+                for slot in self.slots:
+                    if slot.uid in uids:
+                        self.slots.relabel(slot.index, self.registry.lookup(slot.uid))
+                for uid in [entry.uid for entry in self.enrollments if entry.uid in uids]:
+                    self.enrollments.pop(uid)
+            yield report
+        # Conflicts were noted after the file's other problems
+        report.issues.sort()
+        if not dry_run:
+            report.committed = True
+            self.log.append(report.summary())
+
+    def export_cardholders(self, path, status=None):
+        count = export_cardholders(self.registry, path, status)
+        self.log.append(f"Exported {count} cardholders to {path}")
+        return count
+
+    def add_default_users(self):
+        added = []
+        with self.store.batch():
+            for user in self.default_users:
+                if user["uid"] not in self.registry:
+                    added.append(self.enroll(user["uid"], user["name"], user["role"], PERMITTED))
+        for record in added:
+            self.log.append(f"Added default user: {record.display()}")
+        return added
+
+    def status(self):
+        return {
+            "users": {"permitted": len(self.registry.permitted()),
+                      "denied": len(self.registry.denied())},
+            "dedup": self.dedup.stats(),
+            "policy": self.policies.stats() if self.policies is not None else None,
+            "decision_cache": self.decisions.stats(),
+            "reservations": self.reservations.stats() if self.reservations is not None else None,
+            "overstays": [{"slot": slot.label, "uid": slot.uid, "minutes_over": minutes}
+                          for slot, minutes in self.overstays()],
+            "pending": [entry.uid for entry in self.enrollments],
+            "analytics": self.analytics.summary() if self.analytics is not None else None,
+            "stale_sessions": [self.slots[index].label for index in self.stale_sessions],
+            "free": {zone: self.slots.free_count(zone) for zone in self.slots.zones},
+            "slots": [{"slot": s.label, "zone": s.zone, "state": s.state, "uid": s.uid,
+                       "since": s.since.strftime("%H:%M:%S") if s.since else None}
+                      for s in self.slots],
+        }
+
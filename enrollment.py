@@ -0,0 +1,91 @@
+import time
+from collections import OrderedDict
+
+from registry import CardRecord, PERMITTED
+
+# What the gate does with an unknown card while it waits in the queue
+DENY = "deny"            # refuse it, like any unknown card
+HOLD = "hold"            # keep the driver waiting until an operator decides
+TEMP_PASS = "temp"       # let them in on a temporary pass right away
+DEFAULT_DECISIONS = (DENY, HOLD, TEMP_PASS)
+
+DEFAULT_MAXSIZE = 256
+TEMP_NAME = "Visitor"
+TEMP_ROLE = "Temporary pass"
+
+
+class PendingCard:
+    __slots__ = ("uid", "gate", "first_seen", "last_seen", "scans", "decision", "temp_user")
+
+    def __init__(self, uid, gate, decision, now):
+        self.uid = uid
+        self.gate = gate
+        self.first_seen = now
+        self.last_seen = now
+        self.scans = 1
+        self.decision = decision
+        self.temp_user = CardRecord(uid, TEMP_NAME, TEMP_ROLE, PERMITTED) if decision == TEMP_PASS else None
+
+    def display(self):
+        waited = time.strftime("%H:%M:%S", time.localtime(self.first_seen))
+        gate = f" at {self.gate}" if self.gate else ""
+        return f"{self.uid}{gate} since {waited} x{self.scans} [{self.decision}]"
+
+
+class EnrollmentQueue:
+    # Unknown cards waiting for an operator, oldest first. A card scanned
+    # again while pending is counted rather than queued twice, and once
+    # maxsize cards are waiting the oldest is dropped. Listeners are called
+    # with no arguments whenever the queue changes.
+    def __init__(self, default=DENY, maxsize=DEFAULT_MAXSIZE):
+        if default not in DEFAULT_DECISIONS:
+            raise ValueError(f"Unknown default decision: {default!r}")
+        self.default = default
+        self.maxsize = maxsize
+        self._pending = OrderedDict()
+        self.listeners = []
+        self.queued = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, uid):
+        return uid in self._pending
+
+    def __iter__(self):
+        return iter(list(self._pending.values()))
+
+    def get(self, uid):
+        return self._pending.get(uid)
+
+    def add(self, uid, gate=None):
+        entry = self._pending.get(uid)
+        now = time.time()
+        if entry is not None:
+            entry.scans += 1
+            entry.last_seen = now
+            entry.gate = gate
+        else:
+            entry = PendingCard(uid, gate, self.default, now)
+            self._pending[uid] = entry
+            self.queued += 1
+            while len(self._pending) > self.maxsize:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+        self._changed()
+        return entry
+
+    def pop(self, uid):
+        entry = self._pending.pop(uid, None)
+        if entry is not None:
+            self._changed()
+        return entry
+
+    def clear(self):
+        self._pending.clear()
+        self._changed()
+
+    def _changed(self):
+        for listener in self.listeners:
+            listener()
@@ -0,0 +1,81 @@
+import queue
+import time
+from collections import namedtuple
+
+# Events produced by serial readers and consumed by the engine or main loop.
+# received is a time.perf_counter() stamp taken when the line was read and
+# gate identifies the reader when several boards are connected.
+CardScan = namedtuple("CardScan", "uid raw received gate", defaults=(None,))
+DeviceMessage = namedtuple("DeviceMessage", "text received gate", defaults=(None,))
+ReaderError = namedtuple("ReaderError", "message received gate", defaults=(None,))
+# A serial link went up or down; state is one of serial_link's states
+LinkStatus = namedtuple("LinkStatus", "state port message received gate", defaults=(None,))
+# Serial devices were plugged in or removed, ports is the full new list
+PortsChanged = namedtuple("PortsChanged", "ports added removed received")
+
+DEFAULT_MAXSIZE = 1024
+DEFAULT_BATCH = 64
+
+
+class EventQueue:
+    # Bounded hand-off between reader threads and the UI loop. put() never
+    # blocks the reader: when the queue is full the event is dropped and
+    # counted instead.
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self._queue = queue.Queue(maxsize)
+        self.maxsize = maxsize
+        self.enqueued = 0
+        self.dropped = 0
+        self.drained = 0
+        self.drains = 0
+        self.last_drain_ms = 0.0
+        self.max_drain_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def drain(self, handler, max_batch=DEFAULT_BATCH):
+        # Hands up to max_batch queued events to handler and returns how many
+        # were processed. Runs on the consumer thread only.
+        start = time.perf_counter()
+        count = 0
+        while count < max_batch:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            received = getattr(event, "received", None)
+            if received is not None:
+                self.max_wait_ms = max(self.max_wait_ms, (start - received) * 1000)
+            handler(event)
+            count += 1
+        if count:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.drains += 1
+            self.drained += count
+            self.last_drain_ms = elapsed
+            self.max_drain_ms = max(self.max_drain_ms, elapsed)
+        return count
+
+    def stats(self):
+        return {
+            "depth": self.depth(),
+            "maxsize": self.maxsize,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "drained": self.drained,
+            "drains": self.drains,
+            "last_drain_ms": round(self.last_drain_ms, 3),
+            "max_drain_ms": round(self.max_drain_ms, 3),
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
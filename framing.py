@@ -0,0 +1,187 @@
+import binascii
+import struct
+
+from events import CardScan, DeviceMessage
+from protocol import parse_line
+
+# Optional binary link between the host and RFID.ino. Frames are
+#
+#     0xA5 | type | length | payload (length bytes) | CRC-16 (big endian)
+#
+# with the CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) taken over type,
+# length and payload. Card frames carry a one-byte UID length followed by
+# the 4, 7 or 10 UID bytes.
+#
+# Both sides start in the text protocol at 9600 baud. The host asks for
+# binary with the text line "PROTO?BIN:<baud>"; a board that supports it
+# answers "PROTO:BIN:<baud>", both switch baud rate, and the host sends a
+# PING frame. If no PONG comes back in time both sides fall back to text at
+# the original rate.
+
+SOF = 0xA5
+MSG_CARD = 0x01
+MSG_GRANTED = 0x02
+MSG_DENIED = 0x03
+MSG_TEXT = 0x04
+MSG_PING = 0x10
+MSG_PONG = 0x11
+MSG_COMMAND = 0x20
+
+UID_LENGTHS = (4, 7, 10)
+MAX_PAYLOAD = 255
+# Receive buffer of RFID.ino (MAX_FRAME_PAYLOAD there); keep the two equal
+BOARD_MAX_PAYLOAD = 64
+FAST_BAUD = 115200
+PROBE = "PROTO?BIN:{baud}"
+ACCEPT = "PROTO:BIN:{baud}"
+
+# Longest valid payload per message type. Anything else is treated as line
+# noise, so a stray start byte cannot stall the decoder waiting for a long
+# bogus frame, and is refused by encode_frame(): the board drops a command
+# longer than its buffer without a word.
+MAX_LENGTHS = {
+    MSG_CARD: 1 + max(UID_LENGTHS),
+    MSG_GRANTED: 1 + max(UID_LENGTHS),
+    MSG_DENIED: 1 + max(UID_LENGTHS),
+    MSG_TEXT: MAX_PAYLOAD,
+    MSG_PING: 0,
+    MSG_PONG: 0,
+    MSG_COMMAND: BOARD_MAX_PAYLOAD,
+}
+
+_HEADER = struct.Struct(">BBB")
+_CRC = struct.Struct(">H")
+
+
+def crc16(data):
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(msg_type, payload=b""):
+    if len(payload) > MAX_LENGTHS.get(msg_type, MAX_PAYLOAD):
+        raise ValueError("frame payload too long")
+    body = bytes((msg_type, len(payload))) + bytes(payload)
+    return bytes((SOF,)) + body + _CRC.pack(crc16(body))
+
+
+def encode_uid(uid):
+    # "89 D3 9D 94" -> b"\x04\x89\xd3\x9d\x94"
+    raw = bytes.fromhex(uid.replace(" ", ""))
+    if len(raw) not in UID_LENGTHS:
+        raise ValueError(f"UID must be 4, 7 or 10 bytes, got {len(raw)}")
+    return bytes((len(raw),)) + raw
+
+
+def format_uid(payload):
+    # Inverse of encode_uid, returns None for a malformed UID payload
+    if not payload or payload[0] not in UID_LENGTHS or len(payload) < payload[0] + 1:
+        return None
+    return " ".join(f"{b:02X}" for b in payload[1:payload[0] + 1])
+
+
+class FrameDecoder:
+    # Incremental decoder. feed() takes whatever bytes arrived and returns
+    # the complete frames as (type, payload) pairs. Headers and CRCs are
+    # checked in place through a memoryview of the receive buffer, so the
+    # stream itself is never copied; only returned payloads are. Garbage or
+    # corrupted frames are skipped by resyncing on the next start byte.
+    def __init__(self):
+        self._buffer = bytearray()
+        self.frames = 0
+        self.crc_errors = 0
+        self.resyncs = 0
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        pos = 0
+        size = len(buffer)
+        view = memoryview(buffer)
+        try:
+            while pos < size:
+                if buffer[pos] != SOF:
+                    next_sof = buffer.find(SOF, pos + 1)
+                    self.resyncs += 1
+                    pos = size if next_sof < 0 else next_sof
+                    continue
+                if size - pos < 3:
+                    break
+                _, msg_type, length = _HEADER.unpack_from(buffer, pos)
+                if length > MAX_LENGTHS.get(msg_type, -1):
+                    self.resyncs += 1
+                    pos += 1
+                    continue
+                end = pos + 3 + length + 2
+                if end > size:
+                    break
+                (expected,) = _CRC.unpack_from(buffer, end - 2)
+                if crc16(view[pos + 1:end - 2]) != expected:
+                    # Drop only the start byte, a real frame may begin inside
+                    self.crc_errors += 1
+                    pos += 1
+                    continue
+                frames.append((msg_type, bytes(view[pos + 3:end - 2])))
+                self.frames += 1
+                pos = end
+        finally:
+            view.release()
+        if pos:
+            del buffer[:pos]
+        return frames
+
+
+class TextCodec:
+    # Newline-delimited text protocol, as printed by RFID.ino today
+    binary = False
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data, received=None, gate=None):
+        buffer = self._buffer
+        buffer += data
+        events = []
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            event = parse_line(buffer[start:end].decode("utf-8", errors="replace"), received, gate)
+            start = end + 1
+            if event is not None:
+                events.append(event)
+        del buffer[:start]
+        return events
+
+    def encode_command(self, command):
+        return (command.rstrip("\n") + "\n").encode("utf-8")
+
+
+class FrameCodec:
+    # Binary framed protocol. Turns frames into the same events as TextCodec
+    binary = True
+
+    def __init__(self):
+        self.decoder = FrameDecoder()
+        self.pongs = 0
+
+    def feed(self, data, received=None, gate=None):
+        events = []
+        for msg_type, payload in self.decoder.feed(data):
+            if msg_type == MSG_CARD:
+                uid = format_uid(payload)
+                if uid is not None:
+                    events.append(CardScan(uid, f"Card UID: {uid}", received, gate))
+            elif msg_type == MSG_GRANTED:
+                events.append(DeviceMessage("Access Granted!", received, gate))
+            elif msg_type == MSG_DENIED:
+                events.append(DeviceMessage("Access Denied!", received, gate))
+            elif msg_type == MSG_TEXT:
+                events.append(DeviceMessage(payload.decode("utf-8", errors="replace"), received, gate))
+            elif msg_type == MSG_PONG:
+                self.pongs += 1
+        return events
+
+    def encode_command(self, command):
+        return encode_frame(MSG_COMMAND, command.rstrip("\n").encode("utf-8"))
@@ -0,0 +1,399 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+from board_sync import AllowlistSync
+from events import CardScan, DeviceMessage
+from framing import ACCEPT, FAST_BAUD, MSG_PING, PROBE, FrameCodec, TextCodec, encode_frame
+from metrics import DECODE, READ, Metrics
+from port_monitor import Backoff, is_board_spec, resolve_port
+from transport import open_transport
+
+# asyncio front end for several gate boards on different serial ports. Every
+# port is read without blocking on the event loop thread and all card reads
+# feed one shared ParkingEngine, tagged with the gate they came from. A
+# port may be a board spec (usb:VID:PID[:SERIAL] or sn:SERIAL, see
+# port_monitor.py), looked up again on every reconnect.
+
+DEFAULT_BAUD = 9600
+# Only used where the event loop cannot watch a serial fd (e.g. Windows)
+POLL_INTERVAL = 0.01
+LATENCY_SAMPLES = 4096
+# Binary protocol negotiation: when to probe if the board says nothing
+# after opening (Arduinos reset on open), and how long to wait for PONG
+PROBE_DELAY = 2.5
+HANDSHAKE_TIMEOUT = 2.0
+# How often a board's card table sync retries lost requests
+SYNC_INTERVAL = 1.0
+
+
+def open_serial(port, baud):
+    # timeout=0 makes every read return immediately with what is buffered
+    return open_transport(port, baud, timeout=0)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class GateStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.bytes = 0
+        self.lines = 0
+        self.scans = 0
+        self.errors = 0
+        self.duplicates = 0
+        self.connects = 0
+        self.outages = 0
+        self.downtime = 0.0
+        self.down_since = None
+        self.link = "text"
+        self.crc_errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "bytes": self.bytes,
+            "lines": self.lines,
+            "scans": self.scans,
+            "errors": self.errors,
+            "duplicates": self.duplicates,
+            "connects": self.connects,
+            "reconnects": max(self.connects - 1, 0),
+            "outages": self.outages,
+            "downtime_s": round(self.current_downtime(), 1),
+            "link": self.link,
+            "crc_errors": self.crc_errors,
+            "scans_per_sec": round(self.scans / elapsed, 2),
+            "decision_p50_ms": round(percentile(self.latencies, 50) * 1000, 3),
+            "decision_p99_ms": round(percentile(self.latencies, 99) * 1000, 3),
+        }
+
+    def went_down(self):
+        if self.down_since is None:
+            self.outages += 1
+            self.down_since = time.monotonic()
+
+    def came_up(self):
+        self.connects += 1
+        if self.down_since is not None:
+            self.downtime += time.monotonic() - self.down_since
+            self.down_since = None
+
+    def current_downtime(self):
+        if self.down_since is None:
+            return self.downtime
+        return self.downtime + time.monotonic() - self.down_since
+
+
+class GateReader:
+    # protocol is "text", or "binary" to negotiate the framed protocol at
+    # fast_baud, staying on text if the board does not answer
+    def __init__(self, gate_id, port, baud=DEFAULT_BAUD, opener=open_serial,
+                 protocol="text", fast_baud=FAST_BAUD):
+        self.gate_id = gate_id
+        self.port = port
+        self.baud = baud
+        self.opener = opener
+        self.protocol = protocol
+        self.fast_baud = fast_baud
+        self.stats = GateStats()
+        self.backoff = Backoff()
+        self.device = None
+        self.conn = None
+        self.running = False
+        self.codec = TextCodec()
+        self.metrics = Metrics()
+        # Optional AllowlistSync, started once the link is settled
+        self.sync = None
+        self._probe_sent = False
+        self._ready = False
+        self._timers = []
+        self._sync_timer = None
+        # The transport's tap(), for data read straight from its fd
+        self._tap = None
+
+    async def run(self, on_event, on_error=None, on_connect=None):
+        # Reads until stop(), reopening the port after errors with
+        # exponential backoff
+        self.running = True
+        while self.running:
+            try:
+                self.device = await self._resolve()
+                self.conn = self.opener(self.device, self.baud)
+                self._tap = getattr(self.conn, "tap", None)
+                outage = self.stats.down_since
+                self.stats.came_up()
+                self.backoff.reset()
+                if on_connect is not None:
+                    on_connect(self.gate_id, self.device,
+                               None if outage is None else time.monotonic() - outage)
+                self.codec = TextCodec()
+                self.stats.link = "text"
+                self._probe_sent = False
+                self._ready = False
+                if self.protocol != "text":
+                    self._later(PROBE_DELAY, self._send_probe)
+                else:
+                    self._later(PROBE_DELAY, self._link_ready)
+                await self._read_until_closed(on_event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats.errors += 1
+                self.metrics.count("serial_errors")
+                if self.stats.connects:
+                    self.stats.went_down()
+                if on_error is not None:
+                    on_error(self.gate_id, e)
+            finally:
+                self._close()
+            if self.running:
+                await asyncio.sleep(self.backoff.next())
+
+    async def _resolve(self):
+        # Listing ports can take a while, keep it off the event loop
+        if not is_board_spec(self.port):
+            return self.port
+        loop = asyncio.get_running_loop()
+        device = await loop.run_in_executor(None, resolve_port, self.port)
+        if device is None:
+            raise OSError(f"{self.port} is not plugged in")
+        return device
+
+    async def _read_until_closed(self, on_event):
+        loop = asyncio.get_running_loop()
+        try:
+            fd = self.conn.fileno()
+            closed = loop.create_future()
+            loop.add_reader(fd, self._on_readable, fd, on_event, closed)
+        except (AttributeError, NotImplementedError, OSError):
+            await self._poll(on_event)
+            return
+        try:
+            await closed
+        finally:
+            loop.remove_reader(fd)
+
+    def _on_readable(self, fd, on_event, closed):
+        start = self.metrics.start()
+        try:
+            data = os.read(fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            if not closed.done():
+                closed.set_exception(e)
+            return
+        if not data:
+            if not closed.done():
+                closed.set_exception(EOFError(f"{self.port} closed"))
+            return
+        self.metrics.observe(READ, start)
+        if self._tap is not None:
+            self._tap(data)
+        self._feed(data, on_event)
+
+    async def _poll(self, on_event):
+        while self.running:
+            waiting = self.conn.in_waiting
+            if waiting:
+                start = self.metrics.start()
+                data = self.conn.read(waiting)
+                self.metrics.observe(READ, start)
+                self._feed(data, on_event)
+            else:
+                await asyncio.sleep(POLL_INTERVAL)
+
+    def _feed(self, data, on_event):
+        received = time.perf_counter()
+        self.stats.bytes += len(data)
+        codec = self.codec
+        metrics = self.metrics
+        # Decoding and parsing happen together in the codec
+        events = codec.feed(data, received, self.gate_id)
+        if metrics.enabled:
+            metrics.observe(DECODE, received)
+            metrics.count("lines", len(events))
+        for event in events:
+            self.stats.lines += 1
+            if isinstance(event, DeviceMessage):
+                if self.sync is not None and self.sync.handle_message(event.text):
+                    continue
+                if self.protocol == "text":
+                    self._link_ready()
+                elif not codec.binary:
+                    if event.text == ACCEPT.format(baud=self.fast_baud):
+                        self._switch_to_binary()
+                        continue
+                    if not self._probe_sent:
+                        # The board is up and talking, no need to wait longer
+                        self._send_probe()
+            on_event(event)
+        if codec.binary:
+            metrics.count("crc_errors", codec.decoder.crc_errors - self.stats.crc_errors)
+            self.stats.crc_errors = codec.decoder.crc_errors
+            if codec.pongs and self.stats.link != "binary":
+                self.stats.link = "binary"
+                self._cancel_timers()
+                self._link_ready()
+
+    # Protocol negotiation
+
+    def _later(self, delay, callback):
+        self._timers.append(asyncio.get_running_loop().call_later(delay, callback))
+
+    def _cancel_timers(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+
+    def _send_probe(self):
+        if self.conn is None or self._probe_sent:
+            return
+        self._probe_sent = True
+        self.conn.write((PROBE.format(baud=self.fast_baud) + "\n").encode())
+        # Older firmware ignores the probe: carry on in text
+        self._later(HANDSHAKE_TIMEOUT, self._link_ready)
+
+    def _set_baud(self, baud):
+        if hasattr(self.conn, "baudrate"):
+            self.conn.baudrate = baud
+
+    def _record_text(self, enabled):
+        # A RecordingTransport captures text lines only
+        if hasattr(self.conn, "recording"):
+            self.conn.recording = enabled
+
+    def _switch_to_binary(self):
+        self._cancel_timers()
+        self._record_text(False)
+        self._set_baud(self.fast_baud)
+        self.codec = FrameCodec()
+        self.stats.link = "negotiating"
+        self.conn.write(encode_frame(MSG_PING))
+        self._later(HANDSHAKE_TIMEOUT, self._fall_back_to_text)
+
+    def _fall_back_to_text(self):
+        if self.conn is None or self.stats.link == "binary":
+            return
+        self._set_baud(self.baud)
+        self._record_text(True)
+        self.codec = TextCodec()
+        self.stats.link = "text"
+        self._link_ready()
+
+    def _link_ready(self):
+        if self._ready or self.conn is None:
+            return
+        self._ready = True
+        if self.sync is not None:
+            self.sync.start()
+            self._sync_tick()
+
+    def _sync_tick(self):
+        self.sync.check()
+        self._sync_timer = asyncio.get_running_loop().call_later(SYNC_INTERVAL, self._sync_tick)
+
+    def _close(self):
+        self._cancel_timers()
+        if self._sync_timer is not None:
+            self._sync_timer.cancel()
+            self._sync_timer = None
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    def write_command(self, command):
+        # Sends an ADD_PERMITTED/ADD_DENIED style command in the link's
+        # format; returns False if it was not sent, as when it is too long
+        # for the board's frame buffer
+        if self.conn is None:
+            return False
+        try:
+            data = self.codec.encode_command(command)
+        except ValueError:
+            return False
+        self.conn.write(data)
+        return True
+
+    def stop(self):
+        # The port is closed by run() once its task is cancelled
+        self.running = False
+
+
+class Gateway:
+    def __init__(self, engine, gates, baud=DEFAULT_BAUD, opener=open_serial, protocol="text",
+                 fast_baud=FAST_BAUD, sync=False):
+        # gates is an iterable of (gate_id, port) pairs. With sync every
+        # board gets a copy of the card table and can decide offline.
+        self.engine = engine
+        self.readers = {gate_id: GateReader(gate_id, port, baud, opener, protocol, fast_baud)
+                        for gate_id, port in gates}
+        for reader in self.readers.values():
+            reader.metrics = engine.metrics
+        if sync:
+            for gate_id, reader in self.readers.items():
+                reader.sync = AllowlistSync(engine.registry, reader.write_command,
+                                            log=self._gate_logger(gate_id))
+        self.decision_listeners = []
+        self._tasks = []
+
+    async def run(self):
+        self._tasks = [asyncio.create_task(reader.run(self._on_event, self._on_error, self._on_connect))
+                       for reader in self.readers.values()]
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self):
+        for reader in self.readers.values():
+            reader.stop()
+            if reader.sync is not None:
+                reader.sync.close()
+        for task in self._tasks:
+            task.cancel()
+
+    def _gate_logger(self, gate_id):
+        return lambda message: self.engine.log.append(f"[{gate_id}] {message}")
+
+    def _on_event(self, event):
+        if not isinstance(event, CardScan):
+            return
+        decision = self.engine.handle_event(event)
+        stats = self.readers[event.gate].stats
+        if decision is None:
+            stats.duplicates += 1
+            return
+        stats.scans += 1
+        stats.latencies.append(time.perf_counter() - event.received)
+        for listener in self.decision_listeners:
+            listener(decision, event)
+
+    def _on_error(self, gate_id, error):
+        self.engine.log.append(f"[{gate_id}] Serial error: {error}")
+
+    def _on_connect(self, gate_id, device, outage):
+        if outage is None:
+            self.engine.log.append(f"[{gate_id}] Connected on {device}")
+        else:
+            self.engine.log.append(f"[{gate_id}] Reconnected on {device} after {outage:.1f} s")
+
+    def stats(self):
+        stats = {}
+        for gate_id, reader in self.readers.items():
+            stats[gate_id] = reader.stats.snapshot()
+            if reader.sync is not None:
+                stats[gate_id]["sync"] = reader.sync.stats()
+        return stats
@@ -0,0 +1,67 @@
+import glob
+import os
+import tkinter as tk
+
+# GUI images resized once and kept on disk. A cached copy is named after
+# the source's modification time and size, so editing an image replaces
+# its copy and nothing has to be compared at startup. Cached copies are
+# PNGs that Tk reads by itself: Pillow is only imported to fill the cache,
+# and without Pillow the source is shrunk with PhotoImage.subsample().
+
+CACHE_DIR = os.path.join("cache", "images")
+
+
+def cache_path(path, size, stat, cache_dir=CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-{size[0]}x{size[1]}-{stat.st_mtime_ns:x}-{stat.st_size:x}.png")
+
+
+def load_image(path, size, cache_dir=CACHE_DIR):
+    # PhotoImage of path at size, None when it is missing or unreadable
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    cached = cache_path(path, size, stat, cache_dir)
+    if not os.path.exists(cached):
+        try:
+            _resize(path, size, cached)
+        except ImportError:
+            return _subsampled(path, size)
+        except Exception:
+            return None
+    try:
+        return tk.PhotoImage(file=cached)
+    except tk.TclError:
+        return None
+
+
+def _resize(path, size, cached):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        # Image.Resampling arrived in Pillow 9.1; older ones have the
+        # filters on Image itself
+        resized = image.resize(size, getattr(Image, "Resampling", Image).LANCZOS)
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp_path = f"{cached}.tmp"
+    resized.save(tmp_path, "PNG")
+    os.replace(tmp_path, cached)
+    # Copies of older versions of the same image at the same size
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for old in glob.glob(os.path.join(glob.escape(os.path.dirname(cached)),
+                                      f"{glob.escape(stem)}-{size[0]}x{size[1]}-*.png")):
+        if old != cached:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def _subsampled(path, size):
+    try:
+        photo = tk.PhotoImage(file=path)
+    except tk.TclError:
+        return None
+    factor = max(1, -(-photo.width() // size[0]), -(-photo.height() // size[1]))
+    return photo.subsample(factor) if factor > 1 else photo
@@ -0,0 +1,131 @@
+import json
+import os
+from contextlib import contextmanager
+
+
+def write_snapshot(path, data):
+    # Write to a temp file and rename over the target so a crash leaves
+    # either the old or the new snapshot, never a half-written one.
+    tmp_path = f"{path}.tmp"
+    # json.dumps rather than json.dump: only the one-shot encoder is in C
+    text = json.dumps(data, separators=(",", ":"))
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class Journal:
+    # Append-only JSON-lines log. Each record is flushed and fsynced on its
+    # own unless appends are grouped with batch(), which writes them with a
+    # single fsync when the outermost batch exits.
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0
+        self.count = 0
+        # Lines that did not parse in the last replay
+        self.skipped = 0
+        self._pending = []
+        self._batch_depth = 0
+        self._file = None
+
+    def replay(self, after_seq=0):
+        # Yields records newer than after_seq. A line that does not parse
+        # is skipped, so one bad record cannot hide the ones after it. A
+        # torn last line from a crash mid-write (no newline) is cut off the
+        # file, so the next append starts on a line of its own.
+        self.seq = after_seq
+        self.count = 0
+        self.skipped = 0
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        end = 0
+        torn = False
+        with f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    torn = True
+                    break
+                end += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    self.skipped += 1
+                    continue
+                self.count += 1
+                seq = record.get("seq", 0)
+                if seq <= after_seq:
+                    continue
+                self.seq = seq
+                yield record
+        if torn:
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+                os.fsync(f.fileno())
+
+    def append(self, record):
+        self.seq += 1
+        record["seq"] = self.seq
+        self._pending.append(json.dumps(record, separators=(",", ":")))
+        if not self._batch_depth:
+            self.flush()
+        return self.seq
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._file.tell() and not self._ends_with_newline():
+                # Appended to without a replay after a torn write
+                self._file.write("\n")
+        self._file.write("\n".join(self._pending) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.count += len(self._pending)
+        self._pending = []
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    @property
+    def in_batch(self):
+        return self._batch_depth > 0
+
+    @contextmanager
+    def batch(self):
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush()
+
+    def truncate(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.path, "w", encoding="utf-8") as f:
+            os.fsync(f.fileno())
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
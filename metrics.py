@@ -0,0 +1,265 @@
+import io
+import time
+import tracemalloc
+
+# Hot-path instrumentation for the scan-to-gate path. Stages are timed into
+# HDR-style latency histograms and events are counted, all in plain Python
+# objects so the GUI, the gateway and the daemon can share one Metrics.
+# When disabled, start() returns 0 and observe() returns at once; the
+# hottest stages check metrics.enabled inline instead, which costs one
+# attribute lookup.
+
+# Latency stages, in the order a card read passes through them
+READ = "serial_read"        # readline / os.read on the port
+DECODE = "decode"           # bytes -> text, or frame decoding
+PARSE = "parse"             # text -> CardScan / DeviceMessage
+QUEUE_WAIT = "queue_wait"   # reader thread -> Tk main loop
+LOOKUP = "lookup"           # registry lookup of the UID
+SLOT_SEARCH = "slot_search" # finding the driver's slot or a free one
+DECISION = "decision"       # whole engine decision for one scan
+END_TO_END = "end_to_end"   # line received -> decision made
+TK_DRAIN = "tk_drain"       # one batch of queued events on the Tk loop
+TK_LOG = "tk_log"           # inserting queued log lines
+TK_CANVAS = "tk_canvas"     # restyling dirty slot cells
+STAGES = (READ, DECODE, PARSE, QUEUE_WAIT, LOOKUP, SLOT_SEARCH, DECISION, END_TO_END,
+          TK_DRAIN, TK_LOG, TK_CANVAS)
+
+# Histogram resolution: 2**SUB_BITS linear sub-buckets per power of two,
+# about 3% relative error, in microseconds up to about 2**MAX_SHIFT s
+SUB_BITS = 5
+MAX_SHIFT = 31
+PERCENTILES = (50, 90, 99, 99.9)
+PROFILE_LINES = 25
+
+
+class LatencyHistogram:
+    # Log-linear buckets of microseconds, like HdrHistogram: values below
+    # 2**SUB_BITS get one bucket each, then every power of two is split
+    # into 2**(SUB_BITS - 1) equal buckets. Recording is a few integer
+    # operations and percentiles walk at most a few hundred buckets.
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    _HALF = 1 << (SUB_BITS - 1)
+    _LINEAR = 1 << SUB_BITS
+    _SIZE = (MAX_SHIFT + 2) * (1 << (SUB_BITS - 1))
+
+    def __init__(self):
+        self.counts = [0] * self._SIZE
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = int(seconds * 1e6)
+        if us < self._LINEAR:
+            index = us if us > 0 else 0
+        else:
+            shift = us.bit_length() - SUB_BITS
+            index = shift * self._HALF + (us >> shift)
+            if index >= self._SIZE:
+                index = self._SIZE - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if seconds < self.min:
+            self.min = seconds
+
+    @classmethod
+    def bucket_bounds(cls, index):
+        # (low, high) microseconds covered by a bucket
+        if index < 2 * cls._HALF:
+            return index, index + 1
+        shift = index // cls._HALF - 1
+        low = (index - shift * cls._HALF) << shift
+        return low, low + (1 << shift)
+
+    def percentile(self, pct):
+        # Seconds, the midpoint of the bucket holding the pct-th value
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(pct / 100.0 * self.count)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                low, high = self.bucket_bounds(index)
+                return max(self.min, min((low + high) / 2.0 / 1e6, self.max))
+        return self.max
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def snapshot(self):
+        result = {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 4) if self.count else 0.0,
+            "min_ms": round(self.min * 1000, 4) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 4),
+        }
+        for pct in PERCENTILES:
+            result[f"p{pct:g}_ms"] = round(self.percentile(pct) * 1000, 4)
+        return result
+
+
+class Metrics:
+    # Shared by everything on the scan path. Each histogram should only be
+    # written from one thread: the GUI reader thread owns the read, decode
+    # and parse stages, the Tk or asyncio loop the rest.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = {}
+        self.profiler = Profiler()
+
+    def start(self):
+        # Time stamp for observe(), 0 when disabled
+        return time.perf_counter() if self.enabled else 0
+
+    def observe(self, stage, start):
+        if not start:
+            return
+        self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram()
+        histogram.record(seconds)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = {}
+
+    def error_rate(self, errors, total):
+        done = self.counters.get(total, 0)
+        return self.counters.get(errors, 0) / done if done else 0.0
+
+    def snapshot(self):
+        # Copies first: the reader thread may add a stage meanwhile
+        histograms = dict(self.histograms)
+        counters = dict(self.counters)
+        ordered = [s for s in STAGES if s in histograms]
+        ordered += sorted(s for s in histograms if s not in STAGES)
+        return {
+            "enabled": self.enabled,
+            "uptime_s": round(time.time() - self.started, 1),
+            "stages": {stage: histograms[stage].snapshot() for stage in ordered},
+            "counters": dict(sorted(counters.items())),
+            "error_rates": {
+                "serial": round(self.error_rate("serial_errors", "lines"), 6),
+                "crc": round(self.error_rate("crc_errors", "lines"), 6),
+                "dropped": round(self.error_rate("queue_dropped", "lines"), 6),
+            },
+            "profiling": self.profiler.state(),
+        }
+
+    def prometheus(self, prefix="rfid_parking"):
+        # Prometheus text exposition format, histograms as summaries
+        lines = []
+        name = f"{prefix}_stage_seconds"
+        lines.append(f"# HELP {name} Latency of each stage of the scan path.")
+        lines.append(f"# TYPE {name} summary")
+        for stage, histogram in dict(self.histograms).items():
+            for pct in PERCENTILES:
+                lines.append(f'{name}{{stage="{stage}",quantile="{pct / 100:g}"}} '
+                             f'{histogram.percentile(pct):.9f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        for counter, value in sorted(dict(self.counters).items()):
+            metric = f"{prefix}_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        # Fixed-width table for the GUI panel and the console
+        lines = [f"{'stage':<12} {'count':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}  (ms)"]
+        for stage, stats in self.snapshot()["stages"].items():
+            lines.append(f"{stage:<12} {stats['count']:>8} {stats['p50_ms']:>8.3f} {stats['p90_ms']:>8.3f} "
+                         f"{stats['p99_ms']:>8.3f} {stats['max_ms']:>8.3f}")
+        counters = dict(self.counters)
+        if counters:
+            lines.append("  ".join(f"{name} {value}" for name, value in sorted(counters.items())))
+        return "\n".join(lines)
+
+
+class Profiler:
+    # cProfile and tracemalloc that can be switched on and off while the
+    # system runs. cProfile only sees the thread that started it, which is
+    # the Tk or asyncio loop where decisions are made.
+    def __init__(self):
+        self._profile = None
+        self._started_tracemalloc = False
+
+    @property
+    def profiling(self):
+        return self._profile is not None
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def state(self):
+        return {"cprofile": self.profiling, "tracemalloc": self.tracing}
+
+    def start_profile(self):
+        if self._profile is None:
+            # Imported here, pstats alone costs ~10 ms at startup
+            import cProfile
+
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop_profile(self, lines=PROFILE_LINES):
+        # Returns the top functions by cumulative time as text
+        if self._profile is None:
+            return ""
+        import pstats
+
+        self._profile.disable()
+        out = io.StringIO()
+        pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(lines)
+        self._profile = None
+        return out.getvalue()
+
+    def start_tracemalloc(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop_tracemalloc(self, lines=PROFILE_LINES):
+        # Returns the top allocation sites as text
+        if not tracemalloc.is_tracing():
+            return ""
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        report = [f"traced memory: {current / 1024:.1f} KiB now, {peak / 1024:.1f} KiB peak"]
+        for stat in snapshot.statistics("lineno")[:lines]:
+            report.append(str(stat))
+        return "\n".join(report)
+
+    def toggle(self):
+        # Both on, or both off; returns the reports when switching off
+        if self.profiling or self.tracing:
+            return self.stop_profile() + "\n" + self.stop_tracemalloc()
+        self.start_profile()
+        self.start_tracemalloc()
+        return ""
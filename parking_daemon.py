@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+
+from cardholders import CONFLICT_POLICIES, SKIP
+from decision_service import DecisionService
+from dedup import DEFAULT_WINDOW
+from engine import ParkingEngine
+from enrollment import DEFAULT_DECISIONS, DENY
+from framing import FAST_BAUD
+from gateway import Gateway
+from metrics import Metrics
+from port_monitor import list_ports
+from slots import ASSIGN_POLICIES, load_layout
+from status_api import StatusServer
+from transport import RecordingTransport, ReplayTransport, open_transport
+
+# Headless gate controller: runs the access-decision engine without tkinter
+# or Pillow. Reads board output from one or more serial ports, or lines from
+# stdin with --stdin (handy for piping a captured session through the engine).
+#
+# With --metrics FILE the scan path is timed per stage and the figures are
+# written to FILE every --metrics-interval seconds, on SIGUSR1 and at exit:
+# Prometheus text when FILE ends in .prom, JSON otherwise. SIGUSR2 turns
+# cProfile and tracemalloc on, and off again with a report on stderr.
+#
+# The --policy file (policy.py) is read again within a second of being
+# changed, or on the next scan after SIGHUP, without stopping the gates.
+#
+# With --socket PATH other processes on the host can ask for decisions
+# through decision_client.py (see decision_service.py), with or without
+# gates of this daemon's own. --http PORT serves occupancy for lobby
+# displays and monitoring on localhost (see status_api.py).
+
+DEFAULT_METRICS_INTERVAL = 10.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless RFID parking gate controller")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--port", help="serial port of the gate board, e.g. /dev/ttyACM0 or COM3")
+    source.add_argument("--gate", action="append", metavar="NAME=PORT",
+                        help="add a named gate board, may be repeated; PORT may be a board id "
+                             "usb:VID:PID[:SERIAL] or sn:SERIAL so replugging keeps the gate")
+    source.add_argument("--stdin", action="store_true", help="read board lines from standard input")
+    source.add_argument("--replay", metavar="FILE", help="replay a captured session instead of a board")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--protocol", choices=("text", "binary"), default="text",
+                        help="binary negotiates framed messages at --fast-baud, falling back to text")
+    parser.add_argument("--fast-baud", type=int, default=FAST_BAUD)
+    parser.add_argument("--sync", action="store_true",
+                        help="keep a copy of the card table on each board so it can decide offline")
+    parser.add_argument("--users", default="users.json",
+                        help="user store snapshot path; a .cards file keeps the cards in a "
+                             "memory-mapped table, for millions of cards")
+    parser.add_argument("--sessions", default="sessions.json",
+                        help="parked-car snapshot path, so a restart keeps slot state")
+    parser.add_argument("--policy", default="policy.json",
+                        help="access policy JSON with role hours, stays and reserved zones "
+                             "(see policy.py); reloaded when it changes or on SIGHUP")
+    parser.add_argument("--reservations", default="reservations.json",
+                        help="slot bookings snapshot path; a booked driver's tap-in parks them "
+                             "in their slot")
+    parser.add_argument("--slots", type=int, default=4, help="number of parking slots")
+    parser.add_argument("--layout", help="lot layout JSON with zones and slot counts, overrides --slots")
+    parser.add_argument("--assign", choices=sorted(ASSIGN_POLICIES), default="nearest",
+                        help="slot auto-assign policy")
+    parser.add_argument("--log-file", help="keep the full access log here, rotated and gzipped")
+    parser.add_argument("--analytics", metavar="DIR",
+                        help="keep entry/exit history for occupancy analytics here (needs numpy)")
+    parser.add_argument("--record", metavar="FILE", help="capture the board output of every gate to FILE")
+    parser.add_argument("--rate", type=float, help="replay rate in lines per second, "
+                                                   "default is the recorded timing")
+    parser.add_argument("--dedup-window", type=float, default=DEFAULT_WINDOW, metavar="SECONDS",
+                        help="ignore repeat reads of the same card at a gate within this window, "
+                             "0 disables")
+    parser.add_argument("--unknown", choices=DEFAULT_DECISIONS, default=DENY,
+                        help="what the gate does with unknown cards until they are enrolled: "
+                             "deny, hold the driver, or let them in on a temporary pass")
+    parser.add_argument("--manual-slots", action="store_true",
+                        help="do not auto-assign a slot on a granted scan")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="time each stage of the scan path and write the figures to FILE "
+                             "(Prometheus text for .prom, JSON otherwise)")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_METRICS_INTERVAL,
+                        metavar="SECONDS", help="how often --metrics FILE is rewritten")
+    parser.add_argument("--status", action="store_true", help="print engine status as JSON and exit")
+    parser.add_argument("--import", dest="import_path", metavar="FILE",
+                        help="add the cardholders in a .csv or .jsonl file and exit")
+    parser.add_argument("--on-conflict", choices=CONFLICT_POLICIES, default=SKIP,
+                        help="for --import: keep or replace cards enrolled with other details")
+    parser.add_argument("--export", dest="export_path", metavar="FILE",
+                        help="write all cardholders to a .csv or .jsonl file and exit")
+    parser.add_argument("--list-ports", action="store_true",
+                        help="print the serial ports with their board ids and exit")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="answer access queries from other processes on this Unix socket")
+    parser.add_argument("--http", type=int, metavar="PORT",
+                        help="serve occupancy, slot states and recent events as JSON on "
+                             "localhost:PORT")
+    args = parser.parse_args(argv)
+    if not (args.port or args.gate or args.stdin or args.replay or args.status or args.list_ports
+            or args.import_path or args.export_path or args.socket or args.http is not None):
+        parser.error("one of --port, --gate, --stdin, --replay, --socket, --http, --status, --import, "
+                     "--export or --list-ports is required")
+    if (args.socket or args.http is not None) and (args.stdin or args.replay):
+        parser.error("--socket and --http cannot be combined with --stdin or --replay")
+    args.gates = []
+    if args.port:
+        args.gates.append(("gate1", args.port))
+    for spec in args.gate or []:
+        name, sep, port = spec.partition("=")
+        if not sep or not name or not port:
+            parser.error(f"--gate expects NAME=PORT, got {spec!r}")
+        args.gates.append((name, port))
+    return args
+
+
+class MetricsWriter:
+    def __init__(self, metrics, path, interval=DEFAULT_METRICS_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.next_write = time.monotonic() + interval
+
+    def write(self):
+        if self.path.endswith(".prom"):
+            text = self.metrics.prometheus()
+        else:
+            text = json.dumps(self.metrics.snapshot(), indent=2) + "\n"
+        # Replace the file whole so a scraper never sees half of it
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+        self.next_write = time.monotonic() + self.interval
+
+    def maybe_write(self):
+        if time.monotonic() >= self.next_write:
+            self.write()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.write()
+
+
+def toggle_profiling(metrics):
+    report = metrics.profiler.toggle()
+    if report:
+        print(report, file=sys.stderr)
+    else:
+        print("Profiling started (cProfile and tracemalloc), send SIGUSR2 again for the report",
+              file=sys.stderr)
+
+
+def run(engine, lines, writer=None):
+    # Unknown cards are logged and queued by the engine
+    for line in lines:
+        engine.handle_line(line)
+        if writer is not None:
+            writer.maybe_write()
+
+
+def replay_lines(path, rate=None):
+    transport = ReplayTransport.from_file(path, rate=rate)
+    while not transport.finished:
+        line = transport.readline()
+        if line:
+            yield line.decode("utf-8", errors="replace")
+
+
+def run_gates(engine, gates, baud, record=None, protocol="text", fast_baud=FAST_BAUD,
+              sync=False, writer=None, socket_path=None, http_port=None):
+    def opener(port, baud):
+        transport = open_transport(port, baud, timeout=0)
+        return RecordingTransport(transport, record) if record else transport
+
+    gateway = Gateway(engine, gates, baud, opener, protocol, fast_baud, sync)
+    service = DecisionService(engine, socket_path) if socket_path else None
+    status = StatusServer(engine, http_port) if http_port is not None else None
+
+    async def main():
+        task = asyncio.create_task(writer.run()) if writer is not None else None
+        try:
+            if service is not None:
+                await service.start()
+            if status is not None:
+                engine.log.append(f"Status API on {await status.start()}")
+            if gates:
+                await gateway.run()
+            else:
+                # Only serving queries or status
+                await asyncio.Event().wait()
+        finally:
+            if task is not None:
+                task.cancel()
+            if status is not None:
+                await status.close()
+                engine.log.append(f"Status API: {status.requests} requests, "
+                                  f"{status.not_modified} not modified")
+            if service is not None:
+                await service.close()
+                engine.log.append(f"Decision service: {service.requests} requests "
+                                  f"on {service.connections} connections, {service.errors} errors")
+
+    try:
+        asyncio.run(main())
+    finally:
+        for gate_id, stats in gateway.stats().items():
+            engine.log.append(f"[{gate_id}] {stats['connects']} connects, {stats['reconnects']} reconnects, "
+                              f"{stats['downtime_s']} s down")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list_ports:
+        for port in list_ports():
+            print(f"{port.board_id:<32} {port.display()}")
+        return 0
+    metrics = Metrics(enabled=bool(args.metrics))
+    engine = ParkingEngine(args.users, slot_count=args.slots, auto_assign=not args.manual_slots,
+                           log_path=args.log_file,
+                           layout=load_layout(args.layout) if args.layout else None,
+                           assign_policy=args.assign, dedup_window=args.dedup_window,
+                           unknown_default=args.unknown, analytics_path=args.analytics,
+                           sessions_path=args.sessions, metrics=metrics, policy_path=args.policy,
+                           reservations_path=args.reservations)
+    if args.status or args.import_path or args.export_path:
+        # Keep stdout for the JSON or nothing, so it can be piped
+        engine.log.listeners.append(lambda line: print(line, file=sys.stderr))
+    else:
+        engine.log.listeners.append(print)
+    engine.start()
+    if args.import_path or args.export_path:
+        try:
+            if args.import_path:
+                report = engine.import_cardholders(args.import_path, args.on_conflict)
+                for line_no, kind, message in report.issues:
+                    print(f"{args.import_path}:{line_no}: {kind}: {message}", file=sys.stderr)
+            if args.export_path:
+                engine.export_cardholders(args.export_path)
+        except (OSError, ValueError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+        finally:
+            engine.close()
+        return 0
+    if args.status:
+        print(json.dumps(engine.status(), indent=2))
+        engine.close()
+        return 0
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    writer = MetricsWriter(metrics, args.metrics, args.metrics_interval) if args.metrics else None
+    # Not available on Windows
+    if writer is not None and hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *_: writer.write())
+    if hasattr(signal, "SIGUSR2"):
+        signal.signal(signal.SIGUSR2, lambda *_: toggle_profiling(metrics))
+    if hasattr(signal, "SIGHUP"):
+        # Reread the policy before the next scan
+        signal.signal(signal.SIGHUP, lambda *_: engine.policies.invalidate())
+    try:
+        if args.stdin:
+            run(engine, sys.stdin, writer)
+        elif args.replay:
+            run(engine, replay_lines(args.replay, args.rate), writer)
+        else:
+            run_gates(engine, args.gates, args.baud, args.record, args.protocol, args.fast_baud,
+                      args.sync, writer, args.socket, args.http)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if writer is not None:
+            writer.write()
+        engine.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+# Access policies by role, read from a JSON file and compiled when it is
+# loaded into one RoleRule per role, so a scan costs a dict lookup and an
+# index into a table rather than an evaluation of the file:
+#
+#   {
+#     "roles": {
+#       "Staff":   {"hours": [{"days": "mon-fri", "from": "06:00", "to": "20:00"}]},
+#       "Visitor": {"max_stay": "2h"},
+#       "*":       {}
+#     },
+#     "zones": {"B": ["Admin"]}
+#   }
+#
+# hours lists the windows in which a role may enter: days is "daily", a
+# day ("sat"), a range ("mon-fri", may wrap) or a comma-separated list of
+# those, and a window whose "to" is not after its "from" runs past
+# midnight. A role without hours may enter at any time. max_stay ("2h",
+# "90m", "1h30m" or minutes) is reported when the car leaves, never
+# enforced at the exit. zones maps a zone to the only roles that may be
+# given a slot in it. Role names match case-insensitively; "*" is the rule
+# for every role not listed, and allows everything unless given.
+#
+# A card never enters outside its hours, but leaving is always allowed.
+
+DEFAULT_POLICY = "policy.json"
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+ANY_ROLE = "*"
+# How often a scan looks at the policy file's modification time
+CHECK_INTERVAL = 1.0
+# Entries kept by a DecisionCache before it starts over
+DEFAULT_CACHE_SIZE = 65536
+
+_DURATION = re.compile(r"(?:(\d+)h)?\s*(?:(\d+)m)?$")
+
+
+class RoleRule:
+    __slots__ = ("role", "week", "max_stay", "excluded")
+
+    def __init__(self, role, week=None, max_stay=None, excluded=frozenset()):
+        self.role = role
+        # WEEK_MINUTES bytes, 1 where entry is allowed, Monday 00:00 first;
+        # None allows every minute
+        self.week = week
+        # Seconds, or None
+        self.max_stay = max_stay
+        # Zones this role may not be given a slot in
+        self.excluded = excluded
+
+    def allows(self, when=None):
+        if self.week is None:
+            return True
+        when = when or datetime.now()
+        return self.week[when.weekday() * DAY_MINUTES + when.hour * 60 + when.minute] == 1
+
+    def overstayed(self, since, now=None):
+        # Seconds over max_stay for a car parked since since, 0 if within
+        if self.max_stay is None or since is None:
+            return 0
+        stay = ((now or datetime.now()) - since).total_seconds()
+        return max(0, int(stay - self.max_stay))
+
+    def describe(self):
+        parts = []
+        if self.week is not None:
+            parts.append(f"{sum(self.week) / 60:.0f} h a week")
+        if self.max_stay is not None:
+            parts.append(f"max stay {self.max_stay // 60} min")
+        if self.excluded:
+            parts.append("not in zone " + ", ".join(sorted(self.excluded)))
+        return "; ".join(parts) or "any time"
+
+
+ALLOW_ALL = RoleRule(ANY_ROLE)
+
+
+class Policy:
+    def __init__(self, rules=None, default=ALLOW_ALL, reserved=None):
+        # Lowercased role -> RoleRule
+        self.rules = dict(rules or {})
+        self.default = default
+        # Zone -> roles (lowercased) that may use it
+        self.reserved = dict(reserved or {})
+        # Role exactly as written on the card -> RoleRule
+        self._by_role = {}
+
+    def rule(self, role):
+        rule = self._by_role.get(role)
+        if rule is None:
+            rule = self.rules.get((role or "").lower(), self.default)
+            self._by_role[role] = rule
+        return rule
+
+    def zone_allowed(self, zone, role):
+        return zone not in self.rule(role).excluded
+
+    def describe(self):
+        described = {rule.role: rule.describe() for rule in self.rules.values()}
+        described[ANY_ROLE] = self.default.describe()
+        return described
+
+
+def _minute(text):
+    hours, _, minutes = str(text).partition(":")
+    minutes = int(minutes or 0)
+    minute = int(hours) * 60 + minutes
+    if not 0 <= minutes < 60 or not 0 <= minute <= DAY_MINUTES:
+        raise ValueError(f"time of day out of range: {text!r}")
+    return minute
+
+
+def _days(spec):
+    if isinstance(spec, list):
+        spec = ",".join(spec)
+    days = set()
+    for part in str(spec).lower().split(","):
+        part = part.strip()
+        if part in ("daily", "all", "*"):
+            return range(7)
+        first, _, last = part.partition("-")
+        if first not in DAYS or (last and last not in DAYS):
+            raise ValueError(f"unknown day {part!r}")
+        start = DAYS.index(first)
+        stop = DAYS.index(last) if last else start
+        days.update((start + i) % 7 for i in range((stop - start) % 7 + 1))
+    return sorted(days)
+
+
+def _duration(value):
+    if isinstance(value, (int, float)):
+        return int(value * 60)
+    text = str(value).strip().lower()
+    if text.isdigit():
+        # Minutes, like a number
+        return int(text) * 60
+    match = _DURATION.match(text)
+    if match is None or not any(match.groups()):
+        raise ValueError(f"bad duration {value!r}, expected e.g. 2h, 90m or 1h30m")
+    hours, minutes = match.groups()
+    return int(hours or 0) * 3600 + int(minutes or 0) * 60
+
+
+def _compile_hours(windows):
+    week = bytearray(WEEK_MINUTES)
+    for window in windows:
+        start = _minute(window["from"])
+        end = _minute(window["to"])
+        for day in _days(window.get("days", "daily")):
+            base = day * DAY_MINUTES
+            if end > start:
+                week[base + start:base + end] = b"\x01" * (end - start)
+            else:
+                # Past midnight into the next day
+                week[base + start:base + DAY_MINUTES] = b"\x01" * (DAY_MINUTES - start)
+                base = (day + 1) % 7 * DAY_MINUTES
+                week[base:base + end] = b"\x01" * end
+    return bytes(week)
+
+
+def _compile_rule(role, spec, excluded):
+    if not isinstance(spec, dict):
+        raise ValueError(f"rule for {role!r} is not an object")
+    hours = spec.get("hours")
+    week = _compile_hours(hours) if hours is not None else None
+    max_stay = _duration(spec["max_stay"]) if spec.get("max_stay") is not None else None
+    return RoleRule(role, week, max_stay, excluded)
+
+
+def compile_policy(spec):
+    try:
+        roles = dict(spec.get("roles", {}))
+        zones = spec.get("zones", {})
+        for zone, allowed in zones.items():
+            # A bare string would be read as one role per character
+            if not isinstance(allowed, list):
+                raise ValueError(f"zone {zone!r} must map to a list of roles")
+        reserved = {zone: frozenset(role.lower() for role in allowed)
+                    for zone, allowed in zones.items()}
+
+        def excluded(role):
+            key = role.lower()
+            return frozenset(zone for zone, allowed in reserved.items()
+                             if key not in allowed and ANY_ROLE not in allowed)
+
+        default_spec = roles.pop(ANY_ROLE, {})
+        default = _compile_rule(ANY_ROLE, default_spec, excluded(ANY_ROLE))
+        # A role named only under zones gets the default hours and stay
+        named = {role.lower(): role for allowed in zones.values() for role in allowed}
+        named.pop(ANY_ROLE, None)
+        named.update((role.lower(), role) for role in roles)
+        rules = {}
+        for key, role in named.items():
+            rules[key] = _compile_rule(role, roles.get(role, default_spec), excluded(role))
+    except (AttributeError, KeyError, TypeError) as e:
+        raise ValueError(f"malformed policy: {e!r}") from None
+    return Policy(rules, default, reserved)
+
+
+def load_policy(path):
+    with open(path, encoding="utf-8") as f:
+        return compile_policy(json.load(f))
+
+
+class PolicyFile:
+    # The policy in path, compiled again when the file changes. maybe_reload()
+    # is cheap enough to call on every scan: it looks at the file at most
+    # every check_interval seconds. The new policy replaces the old one in
+    # a single assignment, so a scan sees one or the other, and a file that
+    # does not load leaves the last good policy in place. No file allows
+    # everything. Listeners are called with the new Policy.
+    def __init__(self, path=DEFAULT_POLICY, log=None, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.log = log or (lambda message: None)
+        self.check_interval = check_interval
+        self.policy = Policy()
+        self.loaded = 0
+        self.error = None
+        self.listeners = []
+        self._stamp = None
+        self._next_check = 0.0
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        return self.reload()
+
+    def invalidate(self):
+        # Look at the file on the next scan, e.g. after SIGHUP
+        self._next_check = 0.0
+        self._stamp = False
+
+    def reload(self):
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        if stamp is None:
+            policy = Policy()
+        else:
+            try:
+                policy = load_policy(self.path)
+            except (OSError, ValueError) as e:
+                self.error = str(e)
+                self.log(f"Policy {self.path} not loaded, keeping the previous one: {e}")
+                return False
+        self.policy = policy
+        self.loaded += 1
+        self.error = None
+        if stamp is not None:
+            self.log(f"Loaded access policy {self.path}: {len(policy.rules)} roles, "
+                     f"{len(policy.reserved)} reserved zones")
+        for listener in self.listeners:
+            listener(policy)
+        return True
+
+    def stats(self):
+        return {"path": self.path, "loaded": self.loaded, "error": self.error,
+                "roles": self.policy.describe()}
+
+
+class DecisionCache:
+    # UID as read -> (card, rule) for the scan path, so a repeat scan skips
+    # UID normalisation and both lookups. Cleared whenever the registry or
+    # the policy changes; it starts over rather than evicting once maxsize
+    # cards are in it.
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.clears = 0
+
+    def get(self, uid):
+        entry = self._entries.get(uid)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, uid, entry):
+        if len(self._entries) >= self.maxsize:
+            self._entries.clear()
+        self._entries[uid] = entry
+
+    def clear(self, *_):
+        if self._entries:
+            self._entries.clear()
+            self.clears += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits,
+                "misses": self.misses, "clears": self.clears}
@@ -0,0 +1,163 @@
+import random
+import threading
+from collections import namedtuple
+
+# Serial port discovery off the UI thread. Boards are identified by USB
+# VID/PID and serial number where the OS reports them, so a gate can be
+# found again after a replug gives it a different COM / tty name.
+#
+# Port specs accepted wherever a port name is:
+#   usb:2341:0043            first port with that VID:PID (hex)
+#   usb:2341:0043:75833353   ... and that serial number
+#   sn:75833353              any port with that serial number
+#   COM3, /dev/ttyACM0, replay:...   used as they are
+
+POLL_INTERVAL = 1.0
+BACKOFF_INITIAL = 0.5
+BACKOFF_MAX = 30.0
+USB_PREFIX = "usb:"
+SERIAL_PREFIX = "sn:"
+
+
+class PortInfo(namedtuple("PortInfo", "device description vid pid serial_number")):
+    __slots__ = ()
+
+    @property
+    def board_id(self):
+        # Stable name for the board behind the port, the device otherwise
+        if self.vid is None or self.pid is None:
+            return self.device
+        board = f"{USB_PREFIX}{self.vid:04X}:{self.pid:04X}"
+        return f"{board}:{self.serial_number}" if self.serial_number else board
+
+    def display(self):
+        return f"{self.device} - {self.description}"
+
+
+def list_ports():
+    # pyserial is only imported when ports are actually listed
+    import serial.tools.list_ports
+
+    return [PortInfo(p.device, p.description or "", p.vid, p.pid, p.serial_number)
+            for p in serial.tools.list_ports.comports()]
+
+
+def is_board_spec(spec):
+    return spec.startswith(USB_PREFIX) or spec.startswith(SERIAL_PREFIX)
+
+
+def match_port(spec, ports):
+    # The PortInfo that spec refers to, or None
+    if spec.startswith(SERIAL_PREFIX):
+        serial_number = spec[len(SERIAL_PREFIX):]
+        return next((p for p in ports if p.serial_number == serial_number), None)
+    if spec.startswith(USB_PREFIX):
+        parts = spec[len(USB_PREFIX):].split(":", 2)
+        try:
+            vid, pid = int(parts[0], 16), int(parts[1], 16)
+        except (IndexError, ValueError):
+            return None
+        serial_number = parts[2] if len(parts) > 2 else None
+        for port in ports:
+            if port.vid == vid and port.pid == pid and (
+                    serial_number is None or port.serial_number == serial_number):
+                return port
+        return None
+    return next((p for p in ports if p.device == spec), None)
+
+
+def resolve_port(spec, ports=None):
+    # Device name to open for spec, None when its board is not plugged in
+    if not is_board_spec(spec):
+        return spec
+    port = match_port(spec, list_ports() if ports is None else ports)
+    return None if port is None else port.device
+
+
+class Backoff:
+    # Exponential reconnect delays: initial, 2x, 4x ... up to maximum, each
+    # stretched by up to jitter so several gates do not retry in lockstep
+    def __init__(self, initial=BACKOFF_INITIAL, maximum=BACKOFF_MAX, factor=2.0, jitter=0.1,
+                 rng=None):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0
+        self._random = rng or random.Random()
+
+    def next(self):
+        delay = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        return delay * (1 + self.jitter * self._random.random())
+
+    def reset(self):
+        self.attempts = 0
+
+
+class PortMonitor:
+    # Polls the port list on a daemon thread and calls listeners with
+    # (ports, added, removed) whenever a device appears or disappears.
+    # Listeners run on the monitor thread: a Tk client should hand the
+    # change to its main loop (the GUI queues it as a PortsChanged event).
+    # scan() may also be called from other threads (a Refresh button); the
+    # scans are serialized so ports, counters and events stay consistent.
+    def __init__(self, interval=POLL_INTERVAL, lister=list_ports):
+        self.interval = interval
+        self.lister = lister
+        self.ports = []
+        self.listeners = []
+        self.scans = 0
+        self.errors = 0
+        self._scan_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            # A fresh event, so a thread still winding down from stop() exits
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,),
+                                            name="port-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        # Returns at once, the thread exits at its next wake-up
+        self._stop.set()
+        self._thread = None
+
+    def _run(self, stop):
+        while not stop.is_set():
+            self.scan()
+            stop.wait(self.interval)
+
+    def scan(self):
+        with self._scan_lock:
+            return self._scan()
+
+    def _scan(self):
+        try:
+            ports = sorted(self.lister(), key=lambda p: p.device)
+        except Exception:
+            self.errors += 1
+            return self.ports
+        self.scans += 1
+        old = {(p.device, p.board_id) for p in self.ports}
+        new = {(p.device, p.board_id) for p in ports}
+        if old != new or self.scans == 1:
+            added = [p for p in ports if (p.device, p.board_id) not in old]
+            removed = [p for p in self.ports if (p.device, p.board_id) not in new]
+            self.ports = ports
+            for listener in self.listeners:
+                listener(ports, added, removed)
+        return ports
+
+    def find(self, spec):
+        return match_port(spec, self.ports)
+
+    def resolve(self, spec):
+        # Like resolve_port() but from the last scan, no enumeration
+        if not is_board_spec(spec):
+            return spec
+        port = self.find(spec)
+        return None if port is None else port.device
@@ -0,0 +1,28 @@
+import time
+
+from events import CardScan, DeviceMessage
+from registry import normalize_uid
+
+# Prefixes printed by RFID.ino ("Card UID: ") and RFIDinput.ino ("UID tag: ")
+UID_PREFIXES = ("Card UID:", "UID tag:")
+
+
+def parse_uid_line(line):
+    # Returns the normalized UID if line is a card read, otherwise None
+    for prefix in UID_PREFIXES:
+        if line.startswith(prefix):
+            return normalize_uid(line[len(prefix):])
+    return None
+
+
+def parse_line(line, received=None, gate=None):
+    # Turns one line from the board into a typed event, or None if blank
+    line = line.strip()
+    if not line:
+        return None
+    if received is None:
+        received = time.perf_counter()
+    uid = parse_uid_line(line)
+    if uid is not None:
+        return CardScan(uid, line, received, gate)
+    return DeviceMessage(line, received, gate)
@@ -0,0 +1,257 @@
+import re
+
+PERMITTED = "permitted"
+DENIED = "denied"
+# Longest card UID (ISO 14443 triple size)
+MAX_UID_BYTES = 10
+
+_HEX_DIGITS = set("0123456789ABCDEF")
+_SEPARATORS = re.compile(r"[\s:\-]+")
+# Already canonical, and compact hex; most UIDs are one or the other
+_CANONICAL = re.compile(r"[0-9A-F]{2}(?: [0-9A-F]{2})*")
+_COMPACT = re.compile(r"(?:[0-9A-F]{2})+")
+# Matches the Listbox display format "UID - Name (Role)" and "Name (Role)"
+_DISPLAY_ENTRY = re.compile(r"^(?:(?P<uid>[0-9A-Fa-f ]+?)\s+-\s+)?(?P<name>.*?)\s*(?:\((?P<role>[^()]*)\))?\s*$")
+
+
+def normalize_uid(uid):
+    # Canonical form is upper case hex bytes separated by single spaces,
+    # e.g. "89 D3 9D 94". Accepts the RFID.ino format (trailing space),
+    # the RFIDinput.ino format (leading spaces) and compact "89D39D94".
+    if uid is None:
+        return None
+    text = uid.strip().upper()
+    if _CANONICAL.fullmatch(text):
+        return text if len(text) < 3 * MAX_UID_BYTES else None
+    if _COMPACT.fullmatch(text):
+        if len(text) > 2 * MAX_UID_BYTES:
+            return None
+        return " ".join([text[i:i + 2] for i in range(0, len(text), 2)])
+    parts = _SEPARATORS.split(text) if text else []
+    if len(parts) == 1 and len(parts[0]) > 2:
+        compact = parts[0]
+        if len(compact) % 2:
+            return None
+        parts = [compact[i:i + 2] for i in range(0, len(compact), 2)]
+    out = []
+    for part in parts:
+        if not part or len(part) > 2 or not set(part) <= _HEX_DIGITS:
+            return None
+        out.append(part.zfill(2))
+    if not out or len(out) > MAX_UID_BYTES:
+        return None
+    return " ".join(out)
+
+
+def parse_display_entry(text):
+    # Returns (uid, name, role) from a Listbox/users.json entry. uid is None
+    # for the legacy "Name (Role)" entries that were saved without a UID.
+    match = _DISPLAY_ENTRY.match(text or "")
+    if not match:
+        return None, (text or "").strip(), ""
+    uid = normalize_uid(match.group("uid")) if match.group("uid") else None
+    return uid, match.group("name").strip(), (match.group("role") or "").strip()
+
+
+class CardRecord:
+    __slots__ = ("uid", "name", "role", "status")
+
+    def __init__(self, uid, name, role="", status=PERMITTED):
+        self.uid = uid
+        self.name = name
+        self.role = role
+        self.status = status
+
+    @property
+    def permitted(self):
+        return self.status == PERMITTED
+
+    def display(self):
+        if self.role:
+            return f"{self.uid} - {self.name} ({self.role})"
+        return f"{self.uid} - {self.name}"
+
+    def to_dict(self):
+        return {"uid": self.uid, "name": self.name, "role": self.role, "status": self.status}
+
+    def __getitem__(self, key):
+        # Lets older code keep using user['name'] / user['role']
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"CardRecord({self.uid!r}, {self.name!r}, {self.role!r}, {self.status!r})"
+
+
+class CardRegistry:
+    # Cards by canonical UID. With a CardTable attached (see card_table.py)
+    # most cards stay in the memory-mapped table and the dict only holds
+    # cards changed since it was written and cards read from it.
+    def __init__(self, records=()):
+        self._cards = {}
+        self.table = None
+        # Table cards removed since, and dict cards that are not in the table
+        self._removed = set()
+        self._new = set()
+        # Bumped on every change so views and caches can tell they are stale
+        self.version = 0
+        # Listeners get (uid, record) for every added or changed card and
+        # (uid, None) for a removed one; (None, None) after a bulk load
+        self.listeners = []
+        for record in records:
+            self.add(record.uid, record.name, record.role, record.status)
+
+    def __len__(self):
+        if self.table is None:
+            return len(self._cards)
+        return len(self.table) - len(self._removed) + len(self._new)
+
+    def __contains__(self, uid):
+        return self.lookup(uid) is not None
+
+    def __iter__(self):
+        if self.table is None:
+            return iter(self._cards.values())
+        return self._iter_table()
+
+    def _iter_table(self):
+        cards = self._cards
+        removed = self._removed
+        for record in self.table:
+            if record.uid not in removed:
+                yield cards.get(record.uid, record)
+        for uid in list(self._new):
+            yield cards[uid]
+
+    def attach(self, table):
+        # Makes table the cards of this registry, as a bulk load would
+        self.table = table
+        self._cards = {}
+        self._removed.clear()
+        self._new.clear()
+        self.version += 1
+        self._changed(None, None)
+
+    def compacted(self, table):
+        # table was written from this registry and holds the same cards
+        self.table = table
+        self._cards = {}
+        self._removed.clear()
+        self._new.clear()
+
+    def changes(self):
+        # (cards to write, UIDs to drop) that turn the table into this registry
+        return list(self._cards.values()), set(self._removed)
+
+    def _from_table(self, uid):
+        if self.table is None or uid in self._removed:
+            return None
+        record = self.table.get(uid)
+        if record is not None:
+            self._cards[uid] = record
+        return record
+
+    def _inserted(self, uid):
+        # A card not in the dict before was added
+        if self.table is not None:
+            if uid in self._removed:
+                self._removed.discard(uid)
+            else:
+                self._new.add(uid)
+
+    def lookup(self, uid):
+        # Exact hit first so already-normalized UIDs skip the normalization
+        record = self._cards.get(uid)
+        if record is None and uid is not None:
+            key = normalize_uid(uid)
+            record = self._cards.get(key)
+            if record is None and self.table is not None and key is not None:
+                record = self._from_table(key)
+        return record
+
+    def get(self, uid):
+        # For UIDs already in canonical form, skips normalization
+        record = self._cards.get(uid)
+        if record is None and self.table is not None:
+            record = self._from_table(uid)
+        return record
+
+    def add(self, uid, name, role="", status=PERMITTED):
+        key = normalize_uid(uid)
+        if key is None:
+            raise ValueError(f"Invalid card UID: {uid!r}")
+        record = self.get(key)
+        if record is None:
+            record = CardRecord(key, name, role, status)
+            self._cards[key] = record
+            self._inserted(key)
+        else:
+            record.name = name
+            record.role = role
+            record.status = status
+        self.version += 1
+        self._changed(key, record)
+        return record
+
+    def load_rows(self, rows):
+        # Bulk load of [uid, name, role, status] rows that are already in
+        # canonical form, e.g. from a snapshot written by this registry
+        cards = self._cards
+        for uid, name, role, status in rows:
+            cards[uid] = CardRecord(uid, name, role, status)
+        self.version += 1
+        self._changed(None, None)
+
+    def merge_rows(self, rows):
+        # Adds or updates canonical [uid, name, role, status] rows with one
+        # change notification for all of them, like a bulk load
+        cards = self._cards
+        for uid, name, role, status in rows:
+            record = self.get(uid)
+            if record is None:
+                cards[uid] = CardRecord(uid, name, role, status)
+                self._inserted(uid)
+            else:
+                record.name = name
+                record.role = role
+                record.status = status
+        self.version += 1
+        self._changed(None, None)
+
+    def remove(self, uid):
+        key = normalize_uid(uid)
+        record = self.get(key) if key is not None else None
+        if record is not None:
+            del self._cards[key]
+            if self.table is not None:
+                if key in self._new:
+                    self._new.discard(key)
+                else:
+                    self._removed.add(key)
+            self.version += 1
+            self._changed(record.uid, None)
+        return record
+
+    def clear(self, status=None):
+        removed = [r for r in self if status is None or r.status == status]
+        for record in removed:
+            self._cards.pop(record.uid, None)
+            if self.table is not None:
+                if record.uid in self._new:
+                    self._new.discard(record.uid)
+                else:
+                    self._removed.add(record.uid)
+        if removed:
+            self.version += 1
+            for record in removed:
+                self._changed(record.uid, None)
+        return removed
+
+    def _changed(self, uid, record):
+        for listener in self.listeners:
+            listener(uid, record)
+
+    def permitted(self):
+        return [r for r in self if r.status == PERMITTED]
+
+    def denied(self):
+        return [r for r in self if r.status == DENIED]
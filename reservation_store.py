@@ -0,0 +1,85 @@
+import os
+import time
+
+from journal import Journal, read_snapshot, write_snapshot
+
+RESERVATION_VERSION = 1
+COMPACT_EVERY = 1000
+# Bookings that ended longer ago than this are dropped when compacting
+KEEP_PAST = 24 * 3600
+
+
+class ReservationStore:
+    # Durable backing for a ReservationBook, like SessionStore for the slot
+    # map: a snapshot (reservations.json) plus a journal of book and cancel
+    # records since. Slots are saved by label, so a booking follows its slot
+    # when the layout changes and is dropped when the slot is gone.
+    def __init__(self, book, slots, path="reservations.json", compact_every=COMPACT_EVERY):
+        self.book = book
+        self.slots = slots
+        self.path = path
+        self.journal = Journal(f"{os.path.splitext(path)[0]}.journal")
+        self.compact_every = compact_every
+        self._loading = False
+        # (label, start, end, uid) that could not be loaded
+        self.dropped = []
+        book.listeners.append(self._on_change)
+
+    def load(self):
+        data = read_snapshot(self.path)
+        bookings = {}
+        seq = 0
+        if data is not None and data.get("version") == RESERVATION_VERSION:
+            seq = data.get("seq", 0)
+            for label, start, end, uid in data["bookings"]:
+                bookings[(label, start)] = (end, uid)
+        for record in self.journal.replay(after_seq=seq):
+            key = (record["label"], record["start"])
+            if record["op"] == "book":
+                bookings[key] = (record["end"], record["uid"])
+            elif record["op"] == "cancel":
+                bookings.pop(key, None)
+        by_label = {slot.label: slot.index for slot in self.slots}
+        past = time.time() - KEEP_PAST
+        rows = []
+        for (label, start), (end, uid) in bookings.items():
+            index = by_label.get(label)
+            if index is None:
+                self.dropped.append((label, start, end, uid))
+            elif end >= past:
+                rows.append((index, start, end, uid))
+        self._loading = True
+        try:
+            rejected = self.book.load(rows)
+        finally:
+            self._loading = False
+        self.dropped.extend((self.slots[row[0]].label,) + tuple(row[1:]) for row in rejected)
+        if len(rows) != len(bookings) or self.journal.count >= self.compact_every:
+            self.compact()
+        return len(self.book)
+
+    def _on_change(self, op, booking):
+        if self._loading or op is None:
+            return
+        record = {"op": op, "label": self.slots[booking.slot].label, "start": booking.start}
+        if op == "book":
+            record.update(end=booking.end, uid=booking.uid)
+        self.journal.append(record)
+        if not self.journal.in_batch and self.journal.count >= self.compact_every:
+            self.compact()
+
+    def batch(self):
+        return self.journal.batch()
+
+    def compact(self):
+        self.journal.flush()
+        self.book.prune(time.time() - KEEP_PAST)
+        rows = [[self.slots[b.slot].label, b.start, b.end, b.uid] for b in self.book]
+        write_snapshot(self.path, {"version": RESERVATION_VERSION, "seq": self.journal.seq,
+                                   "bookings": rows})
+        self.journal.truncate()
+
+    def close(self):
+        if self._on_change in self.book.listeners:
+            self.book.listeners.remove(self._on_change)
+        self.journal.close()
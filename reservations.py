@@ -0,0 +1,214 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime
+
+# Slots booked ahead for a time range. Times are whole seconds since the
+# epoch and a booking covers [start, end).
+#
+# Each slot keeps its bookings as sorted columns of starts and ends, which
+# never overlap, so "is this slot free from t1 to t2" is one bisect. To
+# find any slot free for a window without asking every slot, time is cut
+# into BUCKET-second buckets and each bucket keeps a bitset (an int) of the
+# slots that have a booking touching it. A slot set in a bucket that lies
+# wholly inside the window is taken; a slot set only in the partly covered
+# buckets at either end is checked with a bisect, and any other slot is
+# free. The lowest free slot comes first, as with SlotMap.first_free().
+
+# An hour: most bookings touch two or three buckets
+BUCKET = 3600
+# A driver may tap in this long before their booking starts
+EARLY_ARRIVAL = 15 * 60
+# Walk-ins are not given a slot booked to start within this long
+WALK_IN_HOLD = 60 * 60
+
+Booking = namedtuple("Booking", "slot start end uid")
+
+
+def to_seconds(when):
+    # datetime or a number of seconds since the epoch
+    if isinstance(when, datetime):
+        return int(when.timestamp())
+    return int(when)
+
+
+class ReservationBook:
+    def __init__(self, slot_count, bucket=BUCKET):
+        self.slot_count = slot_count
+        self.bucket = bucket
+        self._starts = [array("q") for _ in range(slot_count)]
+        self._ends = [array("q") for _ in range(slot_count)]
+        self._uids = [[] for _ in range(slot_count)]
+        # Bucket number -> bitset of slots with a booking in that bucket
+        self._busy = {}
+        # Card UID -> slot indexes it has bookings in, one per booking
+        self._by_uid = {}
+        self._count = 0
+        # Listeners get ("book" or "cancel", Booking) for every change
+        # and (None, None) after load()
+        self.listeners = []
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for slot in range(self.slot_count):
+            yield from self.bookings(slot)
+
+    def bookings(self, slot, start=None, end=None):
+        # Bookings of slot, those overlapping [start, end) when given
+        starts, ends, uids = self._starts[slot], self._ends[slot], self._uids[slot]
+        i = 0 if start is None else bisect_right(ends, start)
+        stop = len(starts) if end is None else bisect_left(starts, end)
+        for k in range(i, stop):
+            yield Booking(slot, starts[k], ends[k], uids[k])
+
+    def is_free(self, slot, start, end):
+        starts = self._starts[slot]
+        i = bisect_right(starts, start)
+        if i and self._ends[slot][i - 1] > start:
+            return False
+        return i == len(starts) or starts[i] >= end
+
+    def book(self, slot, start, end, uid):
+        # Returns the Booking, or None if the slot is taken for part of it
+        start, end = to_seconds(start), to_seconds(end)
+        if end <= start:
+            raise ValueError("a booking has to end after it starts")
+        if not self.is_free(slot, start, end):
+            return None
+        i = bisect_right(self._starts[slot], start)
+        self._starts[slot].insert(i, start)
+        self._ends[slot].insert(i, end)
+        self._uids[slot].insert(i, uid)
+        bit = 1 << slot
+        busy = self._busy
+        for b in range(start // self.bucket, (end - 1) // self.bucket + 1):
+            busy[b] = busy.get(b, 0) | bit
+        self._by_uid.setdefault(uid, []).append(slot)
+        self._count += 1
+        booking = Booking(slot, start, end, uid)
+        self._changed("book", booking)
+        return booking
+
+    def cancel(self, slot, start):
+        # Removes the booking of slot starting at start; returns it or None
+        start = to_seconds(start)
+        starts = self._starts[slot]
+        i = bisect_left(starts, start)
+        if i == len(starts) or starts[i] != start:
+            return None
+        end = self._ends[slot][i]
+        uid = self._uids[slot][i]
+        del starts[i], self._ends[slot][i], self._uids[slot][i]
+        bit = 1 << slot
+        size = self.bucket
+        for b in range(start // size, (end - 1) // size + 1):
+            # Another booking of the slot may share the bucket
+            if self.is_free(slot, b * size, (b + 1) * size):
+                mask = self._busy[b] & ~bit
+                if mask:
+                    self._busy[b] = mask
+                else:
+                    del self._busy[b]
+        slots = self._by_uid[uid]
+        slots.remove(slot)
+        if not slots:
+            del self._by_uid[uid]
+        self._count -= 1
+        booking = Booking(slot, start, end, uid)
+        self._changed("cancel", booking)
+        return booking
+
+    def find_free(self, start, end, accept=None):
+        # Lowest slot with no booking in [start, end) for which accept(slot)
+        # is true, None if there is none
+        start, end = to_seconds(start), to_seconds(end)
+        size = self.bucket
+        first, last = start // size, (end - 1) // size
+        taken = 0
+        partial = 0
+        busy = self._busy
+        for b in range(first, last + 1):
+            mask = busy.get(b)
+            if mask:
+                if b * size >= start and (b + 1) * size <= end:
+                    taken |= mask
+                else:
+                    partial |= mask
+        candidates = ((1 << self.slot_count) - 1) & ~taken
+        partial &= candidates
+        while candidates:
+            low = candidates & -candidates
+            slot = low.bit_length() - 1
+            candidates ^= low
+            if partial & low and not self.is_free(slot, start, end):
+                continue
+            if accept is None or accept(slot):
+                return slot
+        return None
+
+    def current(self, uid, now=None, early=EARLY_ARRIVAL):
+        # The booking of uid that covers now, or starts within early of it
+        slots = self._by_uid.get(uid)
+        if not slots:
+            return None
+        now = to_seconds(now if now is not None else datetime.now())
+        for slot in set(slots):
+            for booking in self.bookings(slot, now, now + early + 1):
+                if booking.uid == uid:
+                    return booking
+        return None
+
+    def of_card(self, uid):
+        return sorted((b for slot in set(self._by_uid.get(uid, ())) for b in self.bookings(slot)
+                       if b.uid == uid), key=lambda b: b.start)
+
+    def load(self, rows):
+        # Replaces every booking with rows of (slot, start, end, uid) in one
+        # go, faster than book() per row. Rows that overlap an earlier one
+        # of their slot are returned rather than loaded.
+        rows = sorted(rows, key=lambda row: (row[0], row[1]))
+        starts = [array("q") for _ in range(self.slot_count)]
+        ends = [array("q") for _ in range(self.slot_count)]
+        uids = [[] for _ in range(self.slot_count)]
+        by_uid = {}
+        bits = {}
+        size = self.bucket
+        nbytes = (self.slot_count + 7) // 8
+        rejected = []
+        for slot, start, end, uid in rows:
+            if end <= start or (ends[slot] and ends[slot][-1] > start):
+                rejected.append((slot, start, end, uid))
+                continue
+            starts[slot].append(start)
+            ends[slot].append(end)
+            uids[slot].append(uid)
+            by_uid.setdefault(uid, []).append(slot)
+            for b in range(start // size, (end - 1) // size + 1):
+                bitset = bits.get(b)
+                if bitset is None:
+                    bitset = bits[b] = bytearray(nbytes)
+                bitset[slot >> 3] |= 1 << (slot & 7)
+        self._starts, self._ends, self._uids = starts, ends, uids
+        self._by_uid = by_uid
+        self._busy = {b: int.from_bytes(bitset, "little") for b, bitset in bits.items()}
+        self._count = len(rows) - len(rejected)
+        self._changed(None, None)
+        return rejected
+
+    def prune(self, before):
+        # Drops bookings that ended before before; returns how many
+        before = to_seconds(before)
+        rows = [(b.slot, b.start, b.end, b.uid) for b in self if b.end >= before]
+        dropped = self._count - len(rows)
+        if dropped:
+            self.load(rows)
+        return dropped
+
+    def _changed(self, op, booking):
+        for listener in self.listeners:
+            listener(op, booking)
+
+    def stats(self):
+        return {"bookings": self._count, "cards": len(self._by_uid), "buckets": len(self._busy)}
@@ -0,0 +1,184 @@
+import threading
+import time
+
+from events import LinkStatus
+from metrics import DECODE, PARSE, READ, Metrics
+from port_monitor import Backoff, resolve_port
+from protocol import parse_line
+from transport import open_transport
+
+# A board connection for the Tk GUI, owned by one daemon thread. The thread
+# opens the port, turns lines into events for the main loop, and when the
+# board goes away (USB blip, unplug, reset) closes the port and reopens it
+# with exponential backoff. The target may be a board spec such as
+# usb:2341:0043:<serial> (see port_monitor.py), so a board that comes back
+# under a different device name is still found. Nothing here blocks the
+# caller: start() and stop() return at once and state changes arrive as
+# LinkStatus events.
+
+# Short read timeout so stop() is noticed quickly
+READ_TIMEOUT = 0.5
+
+# Link states
+CONNECTING = "connecting"
+CONNECTED = "connected"
+DOWN = "down"
+CLOSED = "closed"
+
+
+class SerialLink:
+    def __init__(self, target, put, baud=9600, record=None, metrics=None,
+                 opener=open_transport, resolve=resolve_port, backoff=None):
+        self.target = target
+        self.put = put
+        self.baud = baud
+        self.record = record
+        self.metrics = metrics or Metrics()
+        self.opener = opener
+        self.resolve = resolve
+        self.backoff = backoff or Backoff()
+        self.state = CONNECTING
+        self.port = None
+        self.conn = None
+        self.connects = 0
+        self.reconnects = 0
+        self.outages = 0
+        self.downtime = 0.0
+        self.last_error = None
+        self._down_since = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def connected(self):
+        return self.state == CONNECTED
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"serial-{self.target}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # The thread closes the port after its current read
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        # Retry now instead of at the end of the backoff delay, e.g. when
+        # the port monitor sees the board plugged back in
+        self._wake.set()
+
+    def write(self, data):
+        conn = self.conn
+        if conn is None or not self.connected:
+            return False
+        try:
+            conn.write(data)
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+        return True
+
+    def _status(self, state, message=""):
+        self.state = state
+        self.put(LinkStatus(state, self.port, message, time.perf_counter()))
+
+    def _wait(self, delay):
+        self._wake.wait(delay)
+        self._wake.clear()
+
+    def _run(self):
+        stop = self._stop
+        while not stop.is_set():
+            try:
+                device = self.resolve(self.target)
+                if device is None:
+                    raise OSError(f"{self.target} is not plugged in")
+                self.conn = self.opener(device, self.baud, timeout=READ_TIMEOUT, record=self.record)
+            except Exception as e:
+                self._went_down(e)
+                self._wait(self.backoff.next())
+                continue
+            self.port = device
+            self._came_up()
+            try:
+                self._read()
+            except Exception as e:
+                self._went_down(e)
+            finally:
+                self._close()
+            if not stop.is_set():
+                self._wait(self.backoff.next())
+        self._close()
+        self._status(CLOSED)
+
+    def _came_up(self):
+        if self.connects:
+            self.reconnects += 1
+        self.connects += 1
+        message = ""
+        if self._down_since is not None:
+            outage = time.monotonic() - self._down_since
+            self.downtime += outage
+            self._down_since = None
+            message = f"back after {outage:.1f} s"
+        self.backoff.reset()
+        self._status(CONNECTED, message)
+
+    def _went_down(self, error):
+        self.last_error = str(error)
+        self.metrics.count("serial_errors")
+        if self.state == CONNECTED:
+            self.outages += 1
+            self._down_since = time.monotonic()
+        if not self._stop.is_set():
+            self._status(DOWN, self.last_error)
+
+    def _read(self):
+        # Same stages as the gateway: read, decode, parse
+        metrics = self.metrics
+        conn = self.conn
+        stop = self._stop
+        while not stop.is_set():
+            start = metrics.start()
+            # readline mostly waits for the board; only a line that was
+            # already buffered says what the read itself costs
+            buffered = start and conn.in_waiting
+            raw = conn.readline()
+            if not raw:
+                continue
+            if buffered:
+                metrics.observe(READ, start)
+            start = metrics.start()
+            line = raw.decode("utf-8", errors="replace")
+            metrics.observe(DECODE, start)
+            start = metrics.start()
+            event = parse_line(line)
+            metrics.observe(PARSE, start)
+            if event is not None:
+                metrics.count("lines")
+                if not self.put(event):
+                    metrics.count("queue_dropped")
+
+    def _close(self):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        downtime = self.downtime
+        if self._down_since is not None:
+            downtime += time.monotonic() - self._down_since
+        return {
+            "state": self.state,
+            "target": self.target,
+            "port": self.port,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "outages": self.outages,
+            "downtime_s": round(downtime, 1),
+            "last_error": self.last_error,
+        }
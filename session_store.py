@@ -0,0 +1,108 @@
+import os
+from datetime import datetime
+
+from journal import Journal, read_snapshot, write_snapshot
+from registry import CardRecord
+
+SESSION_VERSION = 1
+# Journal records kept before they are folded into a new snapshot, which
+# bounds how much has to be replayed on startup
+COMPACT_EVERY = 500
+
+
+class SessionStore:
+    # Durable backing for a SlotMap: which card is parked in which slot.
+    # Like UserStore it keeps a compact snapshot (sessions.json) plus an
+    # append-only journal of park and free records since that snapshot.
+    # Changes are picked up from the slot map's listeners, so every way of
+    # parking or freeing a car is recorded.
+    def __init__(self, slots, path="sessions.json", compact_every=COMPACT_EVERY):
+        self.slots = slots
+        self.path = path
+        self.journal = Journal(f"{os.path.splitext(path)[0]}.journal")
+        self.compact_every = compact_every
+        # What has been written: slot index -> (uid, name, role)
+        self._sessions = {}
+        self._loading = False
+        self.dropped = []
+        slots.listeners.append(self._on_slot)
+
+    def load(self):
+        # Parks the cars of the last run again and returns their slots
+        data = read_snapshot(self.path)
+        sessions = {}
+        seq = 0
+        if data is not None and data.get("version") == SESSION_VERSION:
+            seq = data.get("seq", 0)
+            for index, label, uid, name, role, since in data["slots"]:
+                sessions[index] = (label, uid, name, role, since)
+        for record in self.journal.replay(after_seq=seq):
+            if record["op"] == "park":
+                sessions[record["slot"]] = (record["label"], record["uid"], record["name"],
+                                            record["role"], record["since"])
+            elif record["op"] == "free":
+                sessions.pop(record["slot"], None)
+
+        by_label = None
+        restored = []
+        self._loading = True
+        try:
+            for index, (label, uid, name, role, since) in sorted(sessions.items()):
+                if index >= len(self.slots) or self.slots[index].label != label:
+                    # The layout changed since, find the slot by its label
+                    if by_label is None:
+                        by_label = {slot.label: slot.index for slot in self.slots}
+                    index = by_label.get(label)
+                    if index is None:
+                        self.dropped.append((label, uid, name))
+                        continue
+                user = CardRecord(uid, name, role)
+                when = datetime.fromtimestamp(since) if since else None
+                slot = self.slots.occupy(index, user, since=when)
+                if slot is None:
+                    self.dropped.append((label, uid, name))
+                    continue
+                self._sessions[index] = (uid, name, role)
+                restored.append(slot)
+        finally:
+            self._loading = False
+        if len(self._sessions) != len(sessions) or self.journal.count >= self.compact_every:
+            self.compact()
+        return restored
+
+    def _on_slot(self, index):
+        if self._loading:
+            return
+        slot = self.slots[index]
+        current = (slot.uid, slot.name, slot.role) if slot.uid is not None else None
+        if current == self._sessions.get(index):
+            return
+        if current is None:
+            del self._sessions[index]
+            self.journal.append({"op": "free", "slot": index})
+        else:
+            self._sessions[index] = current
+            self.journal.append({"op": "park", "slot": index, "label": slot.label,
+                                 "uid": slot.uid, "name": slot.name, "role": slot.role,
+                                 "since": slot.since.timestamp() if slot.since else None})
+        if not self.journal.in_batch and self.journal.count >= self.compact_every:
+            self.compact()
+
+    def batch(self):
+        # Groups several slot changes into one write and fsync
+        return self.journal.batch()
+
+    def compact(self):
+        self.journal.flush()
+        rows = []
+        for index in sorted(self._sessions):
+            slot = self.slots[index]
+            rows.append([index, slot.label, slot.uid, slot.name, slot.role,
+                         slot.since.timestamp() if slot.since else None])
+        write_snapshot(self.path, {"version": SESSION_VERSION, "seq": self.journal.seq, "slots": rows})
+        self.journal.truncate()
+
+    def close(self):
+        if self._on_slot in self.slots.listeners:
+            self.slots.listeners.remove(self._on_slot)
+        self.journal.close()
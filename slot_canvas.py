@@ -0,0 +1,196 @@
+import tkinter as tk
+
+from metrics import TK_CANVAS
+from slots import OCCUPIED, SLOT_DENIED
+
+# Size of one slot cell at zoom 1.0, in pixels
+CELL_WIDTH = 150
+CELL_HEIGHT = 56
+CELL_GAP = 6
+MIN_ZOOM = 0.25
+MAX_ZOOM = 2.0
+# Below this zoom cells are drawn without text
+TEXT_ZOOM = 0.6
+FLUSH_MS = 50
+
+
+class SlotCanvas(tk.Canvas):
+    # Lot map drawn on one Canvas. Only cells inside the scrolled viewport
+    # have canvas items; they are created as they scroll into view, dropped
+    # as they leave, and restyled only when their slot changed.
+    def __init__(self, master, slots, colors, on_select=None, metrics=None, **kwargs):
+        kwargs.setdefault("highlightthickness", 0)
+        super().__init__(master, **kwargs)
+        self.slot_map = slots
+        self.colors = colors
+        self.on_select = on_select
+        self.metrics = metrics
+        self.zoom = 1.0
+        self.columns = 1
+        self.highlight_free = False
+        # Which free slots to highlight, all of them when None
+        self.selectable = None
+        self._items = {}
+        self._dirty = set()
+        self._flush_scheduled = False
+        self._visible = range(0)
+        slots.listeners.append(self.mark_dirty)
+        self.bind("<Configure>", self._on_configure)
+        self.bind("<Button-1>", self._on_click)
+        self.bind("<MouseWheel>", self._on_wheel)
+        self.bind("<Control-MouseWheel>", self._on_zoom_wheel)
+        # X11 reports the wheel as buttons 4 and 5
+        self.bind("<Button-4>", lambda e: self._scroll(-1))
+        self.bind("<Button-5>", lambda e: self._scroll(1))
+
+    # Geometry
+
+    def _cell_size(self):
+        return ((CELL_WIDTH + CELL_GAP) * self.zoom, (CELL_HEIGHT + CELL_GAP) * self.zoom)
+
+    def _layout(self):
+        width = max(self.winfo_width(), 1)
+        cell_w, cell_h = self._cell_size()
+        self.columns = max(1, int(width // cell_w))
+        rows = (len(self.slot_map) + self.columns - 1) // self.columns
+        self.configure(scrollregion=(0, 0, self.columns * cell_w, rows * cell_h))
+
+    def visible_range(self):
+        cell_w, cell_h = self._cell_size()
+        top = self.canvasy(0)
+        bottom = top + self.winfo_height()
+        first_row = max(0, int(top // cell_h))
+        last_row = int(bottom // cell_h) + 1
+        start = first_row * self.columns
+        stop = min(len(self.slot_map), (last_row + 1) * self.columns)
+        return range(start, max(start, stop))
+
+    def _cell_box(self, index):
+        cell_w, cell_h = self._cell_size()
+        row, col = divmod(index, self.columns)
+        x0 = col * cell_w + CELL_GAP * self.zoom / 2
+        y0 = row * cell_h + CELL_GAP * self.zoom / 2
+        return x0, y0, x0 + CELL_WIDTH * self.zoom, y0 + CELL_HEIGHT * self.zoom
+
+    def index_at(self, x, y):
+        cell_w, cell_h = self._cell_size()
+        col = int(self.canvasx(x) // cell_w)
+        row = int(self.canvasy(y) // cell_h)
+        if col >= self.columns:
+            return None
+        index = row * self.columns + col
+        return index if 0 <= index < len(self.slot_map) else None
+
+    # Drawing
+
+    def redraw(self):
+        # Full relayout, used after resize and zoom
+        self.delete("all")
+        self._items.clear()
+        self._layout()
+        self._visible = range(0)
+        self.refresh_viewport()
+
+    def refresh_viewport(self):
+        visible = self.visible_range()
+        old = self._visible
+        for index in range(old.start, old.stop):
+            if index not in visible and index in self._items:
+                for item in self._items.pop(index):
+                    self.delete(item)
+        for index in visible:
+            if index not in self._items:
+                self._draw_cell(index)
+        self._visible = visible
+
+    def _style(self, slot):
+        if slot.state == OCCUPIED:
+            return self.colors["occupied"], self.colors["occupied_text"]
+        if slot.state == SLOT_DENIED:
+            return self.colors["denied"], self.colors["text"]
+        if self.highlight_free and (self.selectable is None or self.selectable(slot.index)):
+            return self.colors["highlight"], self.colors["occupied_text"]
+        return self.colors["available"], self.colors["text"]
+
+    def _cell_text(self, slot):
+        if slot.state == OCCUPIED:
+            return f"{slot.label}\n{slot.name}"
+        return f"{slot.label}\n{slot.state}"
+
+    def _draw_cell(self, index):
+        slot = self.slot_map[index]
+        fill, text_color = self._style(slot)
+        x0, y0, x1, y1 = self._cell_box(index)
+        rect = self.create_rectangle(x0, y0, x1, y1, fill=fill, outline=self.colors["outline"])
+        items = [rect]
+        if self.zoom >= TEXT_ZOOM:
+            items.append(self.create_text((x0 + x1) / 2, (y0 + y1) / 2, text=self._cell_text(slot),
+                                          fill=text_color, justify="center",
+                                          font=("Segoe UI", max(6, int(9 * self.zoom)))))
+        self._items[index] = items
+
+    def _restyle_cell(self, index):
+        items = self._items.get(index)
+        if items is None:
+            return
+        slot = self.slot_map[index]
+        fill, text_color = self._style(slot)
+        self.itemconfigure(items[0], fill=fill)
+        if len(items) > 1:
+            self.itemconfigure(items[1], text=self._cell_text(slot), fill=text_color)
+
+    def mark_dirty(self, index):
+        self._dirty.add(index)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.after(FLUSH_MS, self.flush)
+
+    def flush(self):
+        # Restyle only changed slots that are on screen; the rest are drawn
+        # with their current state when they scroll into view
+        self._flush_scheduled = False
+        start = self.metrics.start() if self.metrics is not None else 0
+        dirty, self._dirty = self._dirty, set()
+        for index in dirty:
+            self._restyle_cell(index)
+        if start:
+            self.metrics.observe(TK_CANVAS, start)
+
+    def set_highlight_free(self, enabled, selectable=None):
+        if self.highlight_free != enabled or self.selectable is not selectable:
+            self.highlight_free = enabled
+            self.selectable = selectable
+            for index in self._items:
+                self._restyle_cell(index)
+
+    # Navigation
+
+    def set_zoom(self, zoom):
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, zoom))
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self.redraw()
+
+    def yview(self, *args):
+        result = super().yview(*args)
+        if args:
+            self.refresh_viewport()
+        return result
+
+    def _scroll(self, units):
+        self.yview_scroll(units, "units")
+        self.refresh_viewport()
+
+    def _on_wheel(self, event):
+        self._scroll(-1 * (event.delta // 120))
+
+    def _on_zoom_wheel(self, event):
+        self.set_zoom(self.zoom * (1.25 if event.delta > 0 else 0.8))
+
+    def _on_configure(self, event):
+        self.redraw()
+
+    def _on_click(self, event):
+        index = self.index_at(event.x, event.y)
+        if index is not None and self.on_select is not None:
+            self.on_select(index)
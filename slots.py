@@ -0,0 +1,221 @@
+import heapq
+import json
+from datetime import datetime
+
+AVAILABLE = "Available"
+OCCUPIED = "Occupied"
+SLOT_DENIED = "Denied"
+
+# Per-slot state codes kept in a bytearray, one byte per slot
+_FREE, _TAKEN, _FLAGGED = 0, 1, 2
+_STATE_NAMES = {_FREE: AVAILABLE, _TAKEN: OCCUPIED, _FLAGGED: SLOT_DENIED}
+
+DEFAULT_ZONE = "A"
+
+
+class Slot:
+    __slots__ = ("index", "zone", "level", "number", "state", "uid", "name", "role", "since")
+
+    def __init__(self, index, zone=DEFAULT_ZONE, level=0, number=None):
+        self.index = index
+        self.zone = zone
+        self.level = level
+        self.number = index + 1 if number is None else number
+        self.state = AVAILABLE
+        self.uid = None
+        self.name = None
+        self.role = None
+        self.since = None
+
+    @property
+    def free(self):
+        # Slots marked Denied can still be handed out
+        return self.state != OCCUPIED
+
+    @property
+    def label(self):
+        if self.zone == DEFAULT_ZONE and self.level == 0:
+            return f"Slot {self.number}"
+        return f"{self.zone}{self.level}-{self.number}"
+
+    def occupant(self):
+        if self.uid is None:
+            return ""
+        return f"{self.uid} - {self.name} ({self.role})"
+
+
+def load_layout(path):
+    # Layout file: {"zones": [{"zone": "A", "level": 0, "count": 120}, ...]}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["zones"]
+
+
+class SlotMap:
+    # Occupancy for a lot of any size. Each zone keeps a min-heap of free
+    # slot indexes with lazy deletion, so the lowest free slot (nearest the
+    # entrance) is found in O(log n). A UID -> slot index finds a driver's
+    # slot in O(1).
+    def __init__(self, layout=4):
+        if isinstance(layout, int):
+            layout = [{"zone": DEFAULT_ZONE, "level": 0, "count": layout}]
+        self.slots = []
+        for spec in layout:
+            zone = spec.get("zone", DEFAULT_ZONE)
+            level = spec.get("level", 0)
+            for number in range(1, spec["count"] + 1):
+                self.slots.append(Slot(len(self.slots), zone, level, number))
+        count = len(self.slots)
+        self._state = bytearray(count)
+        # Whether the slot currently has an entry in its zone heap
+        self._queued = bytearray(b"\x01" * count)
+        self._by_uid = {}
+        self._heaps = {}
+        self.free_counts = {}
+        for slot in self.slots:
+            self._heaps.setdefault(slot.zone, []).append(slot.index)
+            self.free_counts[slot.zone] = self.free_counts.get(slot.zone, 0) + 1
+        # Listeners get the index of every slot whose state changed
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __getitem__(self, index):
+        return self.slots[index]
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    @property
+    def zones(self):
+        return list(self._heaps)
+
+    def free_count(self, zone=None):
+        if zone is None:
+            return sum(self.free_counts.values())
+        return self.free_counts.get(zone, 0)
+
+    def find_user(self, uid):
+        index = self._by_uid.get(uid)
+        return None if index is None else self.slots[index]
+
+    def first_free(self, zone=None, exclude=()):
+        # Lowest free slot in zone, or in any zone not in exclude
+        if zone is not None:
+            index = self._peek(zone)
+            return None if index is None else self.slots[index]
+        best = None
+        for name in self._heaps:
+            if name in exclude:
+                continue
+            index = self._peek(name)
+            if index is not None and (best is None or index < best):
+                best = index
+        return None if best is None else self.slots[best]
+
+    def _peek(self, zone):
+        heap = self._heaps.get(zone)
+        if not heap:
+            return None
+        state = self._state
+        while heap and state[heap[0]] == _TAKEN:
+            self._queued[heapq.heappop(heap)] = 0
+        return heap[0] if heap else None
+
+    def free_slots(self, zone=None, limit=None):
+        # Free slots in index order, optionally capped at limit
+        result = []
+        for slot in self.slots:
+            if self._state[slot.index] != _TAKEN and (zone is None or slot.zone == zone):
+                result.append(slot)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def occupy(self, index, user, since=None):
+        slot = self.slots[index]
+        if self._state[index] == _TAKEN:
+            return None
+        self._state[index] = _TAKEN
+        self.free_counts[slot.zone] -= 1
+        slot.state = OCCUPIED
+        slot.uid = user.uid
+        slot.name = user.name
+        slot.role = user.role
+        slot.since = since or datetime.now()
+        self._by_uid[user.uid] = index
+        self._changed(index)
+        return slot
+
+    def release(self, index):
+        slot = self.slots[index]
+        if self._state[index] == _TAKEN:
+            self.free_counts[slot.zone] += 1
+            self._by_uid.pop(slot.uid, None)
+        self._state[index] = _FREE
+        self._requeue(slot)
+        slot.state = AVAILABLE
+        slot.uid = slot.name = slot.role = None
+        slot.since = None
+        self._changed(index)
+        return slot
+
+    def relabel(self, index, user):
+        # New name or role for the driver already parked in the slot
+        slot = self.slots[index]
+        slot.name = user.name
+        slot.role = user.role
+        self._changed(index)
+        return slot
+
+    def flag_denied(self):
+        # Flags the first free slot as Denied, as the GUI did on a refusal
+        slot = self.first_free()
+        if slot is None:
+            return None
+        self._state[slot.index] = _FLAGGED
+        slot.state = SLOT_DENIED
+        slot.since = datetime.now()
+        self._changed(slot.index)
+        return slot
+
+    def _requeue(self, slot):
+        if not self._queued[slot.index]:
+            self._queued[slot.index] = 1
+            heapq.heappush(self._heaps[slot.zone], slot.index)
+
+    def _changed(self, index):
+        for listener in self.listeners:
+            listener(index)
+
+    def state_name(self, index):
+        return _STATE_NAMES[self._state[index]]
+
+
+class NearestFree:
+    # Lowest-numbered free slot anywhere in the lot
+    def choose(self, slots, user, gate=None):
+        return slots.first_free()
+
+
+class ZonePreference:
+    # Prefers a zone picked by the gate the car came through, then by the
+    # driver's role, and falls back to the nearest free slot anywhere
+    def __init__(self, role_zones=None, gate_zones=None, strict=False):
+        self.role_zones = {k.lower(): v for k, v in (role_zones or {}).items()}
+        self.gate_zones = dict(gate_zones or {})
+        self.strict = strict
+
+    def choose(self, slots, user, gate=None):
+        zone = self.gate_zones.get(gate) or self.role_zones.get((user.role or "").lower())
+        if zone is not None:
+            slot = slots.first_free(zone)
+            if slot is not None or self.strict:
+                return slot
+        return slots.first_free()
+
+
+ASSIGN_POLICIES = {
+    "nearest": NearestFree,
+    "zone": ZonePreference,
+}
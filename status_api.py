@@ -0,0 +1,352 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+from urllib.parse import parse_qs
+
+# Read-only HTTP status for lobby displays and monitoring, on localhost
+# only. Needs nothing but the standard library.
+#
+#   GET /occupancy   free and total slots, per zone and overall
+#   GET /slots       every slot's state and who is parked in it
+#   GET /events      the last EVENT_TAIL access log lines
+#   GET /stream      server-sent events: each document above as it changes,
+#                    ?docs=occupancy,events for fewer
+#
+# The documents are JSON built ahead of time, together with their headers,
+# and rebuilt only after the slots or the log change, at most every
+# REBUILD_DELAY seconds, so a request costs a dict lookup and a write.
+# Every response carries an ETag; a request with If-None-Match gets 304
+# when nothing changed, and with ?wait=SECONDS as well it is held until the
+# document changes or the time is up (long polling). Connections are kept
+# alive.
+#
+# Engine listeners only mark documents stale and wake the server's loop,
+# so the thread that changes the slots (the Tk thread in the GUI) never
+# builds JSON or talks to a client. The other way round, the server only
+# reads the engine: it never logs, and its listeners are added and removed
+# by the caller's thread. Documents are read from the loop's thread; a slot
+# caught mid-change is put right by the rebuild its change schedules.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+EVENT_TAIL = 100
+REBUILD_DELAY = 0.05
+# Longest long poll, and the idle time between SSE keepalive comments
+MAX_WAIT = 60.0
+KEEPALIVE = 15.0
+MAX_HEADER = 16 * 1024
+# How long stop_thread() waits for the server's thread by default
+STOP_TIMEOUT = 0.5
+DOCUMENTS = ("occupancy", "slots", "events")
+
+
+class Snapshot:
+    __slots__ = ("version", "etag", "head", "body", "not_modified", "event")
+
+    def __init__(self, name, version, boot, data):
+        self.version = version
+        self.etag = f'"{boot}-{name}-{version}"'
+        self.body = json.dumps(data, separators=(",", ":")).encode()
+        self.head = _head("200 OK", len(self.body), self.etag)
+        self.not_modified = _head("304 Not Modified", None, self.etag)
+        self.event = b"id: %s\nevent: %s\ndata: %s\n\n" % (self.etag.encode(), name.encode(), self.body)
+
+
+def _head(status, length, etag=None, content_type="application/json"):
+    lines = [f"HTTP/1.1 {status}", "Cache-Control: no-cache", "Access-Control-Allow-Origin: *"]
+    if length is not None:
+        lines += [f"Content-Type: {content_type}", f"Content-Length: {length}"]
+    if etag is not None:
+        lines.append(f"ETag: {etag}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+def _error(status, message):
+    body = (json.dumps({"error": message}) + "\n").encode()
+    return _head(status, len(body)) + body
+
+
+def _matches(if_none_match, etag):
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
+
+
+class StatusServer:
+    def __init__(self, engine, port=DEFAULT_PORT, host=DEFAULT_HOST):
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.server = None
+        self.loop = None
+        # Tells this run's ETags from the last one's
+        self.boot = f"{int(time.time()):x}"
+        self.docs = {}
+        self._versions = dict.fromkeys(DOCUMENTS, 0)
+        self._builders = {"occupancy": self._occupancy, "slots": self._slots, "events": self._events}
+        self._stale = set()
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self._change = None
+        self._writers = set()
+        self._closing = False
+        self._thread = None
+        self._totals = {}
+        for slot in engine.slots:
+            self._totals[slot.zone] = self._totals.get(slot.zone, 0) + 1
+        self.requests = 0
+        self.not_modified = 0
+        self.rebuilds = 0
+
+    # Documents
+
+    def _occupancy(self):
+        slots = self.engine.slots
+        zones = {zone: {"free": slots.free_count(zone), "total": total}
+                 for zone, total in self._totals.items()}
+        free = sum(zone["free"] for zone in zones.values())
+        return {"free": free, "occupied": len(slots) - free, "total": len(slots), "zones": zones,
+                "updated": datetime.now().isoformat(timespec="seconds")}
+
+    def _slots(self):
+        return {"slots": [{"slot": s.label, "zone": s.zone, "state": s.state, "uid": s.uid,
+                           "name": s.name, "since": s.since.isoformat(timespec="seconds") if s.since else None}
+                          for s in self.engine.slots]}
+
+    def _events(self):
+        return {"events": self.engine.log.tail(EVENT_TAIL)}
+
+    def _on_slot(self, index):
+        self.mark("occupancy", "slots")
+
+    def _on_log(self, line):
+        self.mark("events")
+
+    def mark(self, *names):
+        # Safe from any thread; the loop is woken once per rebuild
+        with self._lock:
+            self._stale.update(names)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        try:
+            self.loop.call_soon_threadsafe(self.loop.call_later, REBUILD_DELAY, self._rebuild)
+        except RuntimeError:
+            # The loop has been closed
+            pass
+
+    def _rebuild(self):
+        with self._lock:
+            stale, self._stale = self._stale, set()
+            self._scheduled = False
+        for name in stale:
+            self._versions[name] += 1
+            self.docs[name] = Snapshot(name, self._versions[name], self.boot, self._builders[name]())
+        self.rebuilds += 1
+        # Wakes long polls and streams
+        change, self._change = self._change, self.loop.create_future()
+        change.set_result(None)
+
+    # Serving
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    async def start(self, attach=True):
+        # Binds and builds the documents; returns url. attach=False leaves
+        # adding the engine listeners to the caller (see start_thread()).
+        self.loop = asyncio.get_running_loop()
+        # Done at the next rebuild; one future shared by every waiting client
+        self._change = self.loop.create_future()
+        self.server = await asyncio.start_server(self._serve, self.host, self.port, limit=MAX_HEADER)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if attach:
+            self.attach()
+        self._stale.update(DOCUMENTS)
+        self._rebuild()
+        return self.url
+
+    def attach(self):
+        # On the thread that changes the engine
+        self.engine.slots.listeners.append(self._on_slot)
+        self.engine.log.listeners.append(self._on_log)
+
+    def detach(self):
+        for listeners, listener in ((self.engine.slots.listeners, self._on_slot),
+                                    (self.engine.log.listeners, self._on_log)):
+            if listener in listeners:
+                listeners.remove(listener)
+
+    async def close(self, detach=True):
+        if self.server is None:
+            return
+        self._closing = True
+        if detach:
+            self.detach()
+        if not self._change.done():
+            self._change.set_result(None)
+        self.server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self.server.wait_closed()
+        self.server = None
+
+    async def _serve(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while not self._closing:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(_error("431 Request Header Fields Too Large", "headers too long"))
+                    break
+                keep_alive = await self._handle(head, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            # Cancelled with the loop at exit, nothing waits on this task
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle(self, head, writer):
+        # Writes one response; returns whether the connection stays open
+        self.requests += 1
+        request_line, *lines = head.decode("latin-1").split("\r\n")
+        parts = request_line.split(" ")
+        if len(parts) != 3:
+            writer.write(_error("400 Bad Request", "bad request line"))
+            return False
+        method, target, version = parts
+        headers = {}
+        for line in lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        path, _, query = target.partition("?")
+        params = parse_qs(query)
+        if method not in ("GET", "HEAD"):
+            writer.write(_error("405 Method Not Allowed", "only GET and HEAD"))
+            return keep_alive
+        name = path.strip("/")
+        if name == "stream":
+            await self._stream(writer, params)
+            return False
+        if name not in self.docs:
+            writer.write(_error("404 Not Found", f"try {', '.join('/' + doc for doc in DOCUMENTS)} "
+                                                 f"or /stream"))
+            return keep_alive
+        snapshot = self.docs[name]
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None and _matches(if_none_match, snapshot.etag):
+            wait = _number(params.get("wait"))
+            if wait:
+                snapshot = await self._wait_for_change(name, snapshot, min(wait, MAX_WAIT))
+            if _matches(if_none_match, snapshot.etag):
+                self.not_modified += 1
+                writer.write(snapshot.not_modified)
+                return keep_alive
+        writer.write(snapshot.head)
+        if method == "GET":
+            writer.write(snapshot.body)
+        return keep_alive
+
+    async def _wait_for_change(self, name, snapshot, timeout):
+        deadline = self.loop.time() + timeout
+        while self.docs[name] is snapshot and not self._closing:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0 or not await self._changed(self._change, remaining):
+                break
+        return self.docs[name]
+
+    async def _changed(self, change, timeout):
+        # Whether the rebuild that completes change happens within timeout.
+        # asyncio.wait() on the future itself, unlike wait_for(), starts no
+        # task per client.
+        if not change.done():
+            await asyncio.wait((change,), timeout=timeout)
+        return change.done()
+
+    async def _stream(self, writer, params):
+        names = [name for value in params.get("docs", [",".join(DOCUMENTS)])
+                 for name in value.split(",") if name in self.docs]
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n")
+        sent = {}
+        while not self._closing:
+            change = self._change
+            for name in names:
+                snapshot = self.docs[name]
+                if sent.get(name) is not snapshot:
+                    writer.write(snapshot.event)
+                    sent[name] = snapshot
+            await writer.drain()
+            if not await self._changed(change, KEEPALIVE):
+                writer.write(b": keepalive\n\n")
+
+    def stats(self):
+        return {"port": self.port, "requests": self.requests, "not_modified": self.not_modified,
+                "rebuilds": self.rebuilds, "connections": len(self._writers)}
+
+    # For a program without an event loop of its own, like the Tk GUI. Call
+    # both from the thread that changes the engine: the listeners are added
+    # and removed there, and nothing is logged, so the caller reports url.
+
+    def start_thread(self):
+        started = threading.Event()
+        failed = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start(attach=False))
+            except OSError as e:
+                failed.append(e)
+                started.set()
+                loop.close()
+                return
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.close(detach=False))
+            # Connections still being served
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="status-api", daemon=True)
+        self._thread.start()
+        started.wait()
+        if failed:
+            self._thread = None
+            raise failed[0]
+        self.attach()
+        return self.url
+
+    def stop_thread(self, timeout=STOP_TIMEOUT):
+        # Waits at most timeout for the thread to finish; 0 to not wait,
+        # the port is then freed shortly after
+        self.detach()
+        if self._thread is not None and self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+            except RuntimeError:
+                # The loop has been closed
+                pass
+            if timeout:
+                self._thread.join(timeout)
+            self._thread = None
+
+
+def _number(values):
+    try:
+        return max(0.0, float(values[0])) if values else 0.0
+    except ValueError:
+        return 0.0
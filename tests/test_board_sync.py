@@ -0,0 +1,231 @@
+# AllowlistSync against BoardSimulator, the host-side stand-in for the
+# card table and SYNC commands of RFID.ino
+import random
+import time
+
+from board_sim import BoardSimulator
+from board_sync import LOADING, SYNCED, AllowlistSync, uid_key
+from registry import DENIED, PERMITTED, CardRegistry
+
+UIDS = ["89 D3 9D 94", "13 D3 09 27", "04 A1 B2 C3 D4 E5 F6", "01 02 03 04 05 06 07 08 09 10"]
+
+
+def make_registry(count, seed=1):
+    rng = random.Random(seed)
+    registry = CardRegistry()
+    for i in range(count):
+        size = rng.choice((4, 4, 7, 10))
+        uid = " ".join(f"{rng.randrange(256):02X}" for _ in range(size))
+        registry.add(uid, f"Driver {i}", "User", DENIED if i % 5 == 0 else PERMITTED)
+    return registry
+
+
+def connect(registry, board):
+    sent = []
+
+    def send(command):
+        sent.append(command)
+        board.write((command + "\n").encode())
+
+    return AllowlistSync(registry, send), sent
+
+
+def pump(sync, board):
+    while board.in_waiting:
+        sync.handle_message(board.readline().decode().strip())
+
+
+def settle(sync, board, rounds=200):
+    # Answers and retries, with the clock moved past ACK_TIMEOUT each round
+    for _ in range(rounds):
+        pump(sync, board)
+        if sync.state == SYNCED and not sync._in_flight:
+            return
+        sync.check(now=time.monotonic() + 10)
+    raise AssertionError(f"not in sync: {sync.stats()}")
+
+
+def board_table(board):
+    return dict(zip(board.keys, board.permitted))
+
+
+def host_table(sync):
+    return {key: entry[0] for key, entry in sync._table.items()}
+
+
+def test_bulk_load():
+    registry = make_registry(40)
+    for i, uid in enumerate(UIDS):
+        registry.add(uid, f"Known {i}", "User", DENIED if i == 1 else PERMITTED)
+    board = BoardSimulator()
+    sync, sent = connect(registry, board)
+    sync.start()
+    pump(sync, board)
+    assert sync.state == SYNCED
+    assert sync.loads == 1
+    assert sent[0] == "SYNC:VER?"
+    assert sent[1].startswith("SYNC:BEGIN:") and sent[-1].startswith("SYNC:END:")
+    assert board_table(board) == host_table(sync)
+    assert len(board.keys) == len(registry)
+    assert board.version == sync.version
+    assert board.decide(UIDS[0]) is True
+    assert board.decide(UIDS[1]) is False
+    assert board.decide(UIDS[3]) is True
+    assert board.decide("DE AD BE EF") is None
+
+
+def test_in_sync_board_is_not_reloaded():
+    registry = make_registry(20)
+    board = BoardSimulator()
+    sync, _ = connect(registry, board)
+    sync.start()
+    pump(sync, board)
+    # A host restart finds the same table on the board
+    again, sent = connect(registry, board)
+    again.start()
+    pump(again, board)
+    assert again.state == SYNCED
+    assert again.loads == 0
+    assert sent == ["SYNC:VER?"]
+
+
+def test_deltas_bump_the_version():
+    registry = make_registry(10)
+    board = BoardSimulator()
+    sync, sent = connect(registry, board)
+    sync.start()
+    pump(sync, board)
+    version = board.version
+    del sent[:]
+
+    registry.add(UIDS[2], "New", "User", PERMITTED)
+    pump(sync, board)
+    assert sent == [f"SYNC:PUT:{version + 1}:04A1B2C3D4E5F6:P"]
+    assert board.decide(UIDS[2]) is True
+
+    registry.add(UIDS[2], "New", "User", DENIED)
+    pump(sync, board)
+    assert board.decide(UIDS[2]) is False
+
+    # A name change does not concern the board
+    registry.add(UIDS[2], "Renamed", "Visitor", DENIED)
+    pump(sync, board)
+
+    registry.remove(UIDS[2])
+    pump(sync, board)
+    assert board.decide(UIDS[2]) is None
+    assert board.version == version + 3
+    assert sync.deltas == 3
+    assert sync.acks == 4
+    assert sync.loads == 1
+    assert board_table(board) == host_table(sync)
+
+
+def test_board_refuses_deltas_out_of_order():
+    board = BoardSimulator()
+    board.command("SYNC:PUT:5:89D39D94:P")
+    assert board.readline() == b"SYNC:NAK:5:0:ORDER\r\n"
+    assert board.decide(UIDS[0]) is None
+    board.command("SYNC:PUT:1:89D39D94:P")
+    assert board.readline().startswith(b"SYNC:ACK:1:1:")
+
+
+def test_nak_reloads_the_table():
+    registry = make_registry(10)
+    board = BoardSimulator()
+    sync, _ = connect(registry, board)
+    sync.start()
+    pump(sync, board)
+    # The board moved on without the host, e.g. another host synced it
+    board.version += 3
+    registry.add(UIDS[0], "New", "User", PERMITTED)
+    pump(sync, board)
+    assert sync.resyncs == 1
+    assert sync.loads == 2
+    assert sync.state == SYNCED
+    assert board_table(board) == host_table(sync)
+    assert board.version == sync.version
+
+
+def test_checksum_mismatch_reloads_the_table():
+    registry = make_registry(10)
+    board = BoardSimulator()
+    sync, _ = connect(registry, board)
+    sync.start()
+    pump(sync, board)
+    # A card the host does not know about, e.g. a corrupted EEPROM slot
+    board.put(uid_key("DE AD BE EF"), True)
+    registry.add(UIDS[0], "New", "User", PERMITTED)
+    pump(sync, board)
+    assert sync.resyncs == 1
+    assert board.decide("DE AD BE EF") is None
+    assert board_table(board) == host_table(sync)
+
+
+def test_lossy_link_converges():
+    registry = make_registry(30)
+    board = BoardSimulator(drop_rate=0.05, seed=3)
+    sync, _ = connect(registry, board)
+    sync.start()
+    settle(sync, board)
+    rng = random.Random(4)
+    for i in range(300):
+        records = list(registry)
+        roll = rng.random()
+        if roll < 0.4:
+            registry.add(f"{0x10000000 + i:08X}", f"Extra {i}", "User", PERMITTED)
+        elif roll < 0.7 and records:
+            registry.remove(rng.choice(records).uid)
+        elif records:
+            record = rng.choice(records)
+            registry.add(record.uid, record.name, record.role, DENIED if record.permitted else PERMITTED)
+        pump(sync, board)
+    settle(sync, board)
+    assert board.dropped > 0
+    assert sync.resyncs > 0
+    assert board_table(board) == host_table(sync)
+    assert board.version == sync.version
+
+
+def test_capacity_limit():
+    registry = make_registry(8)
+    board = BoardSimulator(capacity=5)
+    sync, sent = connect(registry, board)
+    sync.start()
+    pump(sync, board)
+    # The board reports its capacity and the host keeps the rest
+    assert sync.capacity == 5
+    assert sync.state == SYNCED
+    assert len(board.keys) == 5
+    assert sync.skipped == 3
+    # Permitted cards are loaded first
+    assert all(board.permitted)
+    del sent[:]
+    registry.add(UIDS[0], "One more", "User", PERMITTED)
+    pump(sync, board)
+    assert sent == []
+    assert sync.skipped == 4
+    assert board.decide(UIDS[0]) is None
+
+
+def test_full_board_refuses_new_cards():
+    board = BoardSimulator(capacity=1)
+    board.command("SYNC:PUT:1:89D39D94:P")
+    board.readline()
+    board.command("SYNC:PUT:2:13D30927:P")
+    assert board.readline() == b"SYNC:NAK:2:1:FULL\r\n"
+    # Changing a card already on the board still works
+    board.command("SYNC:PUT:2:89D39D94:D")
+    assert board.readline().startswith(b"SYNC:ACK:2:1:")
+    assert board.decide(UIDS[0]) is False
+
+
+def test_loading_state_until_the_end_is_acknowledged():
+    registry = make_registry(5)
+    board = BoardSimulator()
+    sync, _ = connect(registry, board)
+    sync.start()
+    sync.load()
+    assert sync.state == LOADING
+    pump(sync, board)
+    assert sync.state == SYNCED
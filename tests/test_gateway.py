@@ -0,0 +1,243 @@
+# Gateway against pseudo-terminals standing in for the boards: one pty per
+# gate, opened through pyserial like a real port. The test writes what
+# RFID.ino prints to the pty's master side.
+import asyncio
+import os
+import time
+
+import pytest
+
+pytest.importorskip("serial")
+
+from engine import ASSIGNED, REFUSED, UNKNOWN, ParkingEngine
+from registry import DENIED
+from gateway import Gateway, open_serial
+from port_monitor import Backoff
+
+ADMIN = "89 D3 9D 94"
+TESTER = "13 D3 09 27"
+STRANGER = "DE AD BE EF"
+TIMEOUT = 5.0
+
+
+class Boards:
+    # A pty per gate; reopen() swaps in a new one, as when a board is
+    # unplugged and plugged back in
+    def __init__(self, gates):
+        self.masters = {}
+        self.devices = {}
+        for gate in gates:
+            self.reopen(gate)
+
+    def reopen(self, gate):
+        master, slave = os.openpty()
+        self.devices[gate] = os.ttyname(slave)
+        # pyserial opens the device by name; the master keeps the pty alive
+        os.close(slave)
+        self.masters[gate] = master
+
+    def opener(self, port, baud):
+        return open_serial(self.devices[port], baud)
+
+    def print(self, gate, line):
+        os.write(self.masters[gate], (line + "\r\n").encode())
+
+    def unplug(self, gate):
+        os.close(self.masters.pop(gate))
+
+    def close(self):
+        for master in self.masters.values():
+            os.close(master)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = ParkingEngine(str(tmp_path / "users.json"), auto_assign=True)
+    engine.start()
+    yield engine
+    engine.close()
+
+
+def make_gateway(engine, boards):
+    gateway = Gateway(engine, [(gate, gate) for gate in boards.devices], opener=boards.opener)
+    for reader in gateway.readers.values():
+        reader.backoff = Backoff(initial=0.05, maximum=0.2)
+    decisions = []
+    gateway.decision_listeners.append(lambda decision, event: decisions.append(decision))
+    return gateway, decisions
+
+
+async def wait_until(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        await asyncio.sleep(0.01)
+
+
+def run(scenario, gateway):
+    async def main():
+        task = asyncio.create_task(gateway.run())
+        try:
+            await scenario()
+        finally:
+            gateway.stop()
+            await task
+    asyncio.run(main())
+
+
+def connected(gateway, *gates):
+    return lambda: all(gateway.readers[gate].stats.connects for gate in gates)
+
+
+def test_decisions_are_tagged_with_their_gate(engine):
+    boards = Boards(["north", "south"])
+    gateway, decisions = make_gateway(engine, boards)
+
+    async def scenario():
+        await wait_until(connected(gateway, "north", "south"))
+        boards.print("north", f"Card UID: {ADMIN} ")
+        boards.print("north", "Access Granted!")
+        boards.print("south", f"Card UID: {TESTER} ")
+        boards.print("south", f"Card UID: {STRANGER} ")
+        await wait_until(lambda: len(decisions) == 3)
+
+    try:
+        run(scenario, gateway)
+    finally:
+        boards.close()
+    by_uid = {decision.uid: decision for decision in decisions}
+    assert (by_uid[ADMIN].gate, by_uid[ADMIN].outcome) == ("north", ASSIGNED)
+    assert (by_uid[TESTER].gate, by_uid[TESTER].outcome) == ("south", ASSIGNED)
+    assert (by_uid[STRANGER].gate, by_uid[STRANGER].outcome) == ("south", UNKNOWN)
+    stats = gateway.stats()
+    assert stats["north"]["scans"] == 1
+    assert stats["south"]["scans"] == 2
+
+
+def test_rfidinput_lines_and_denied_cards(engine):
+    engine.enroll(STRANGER, "Blue card", "Visitor", DENIED)
+    boards = Boards(["gate"])
+    gateway, decisions = make_gateway(engine, boards)
+
+    async def scenario():
+        await wait_until(connected(gateway, "gate"))
+        # RFIDinput.ino prints the UID bytes after "UID tag:"
+        boards.print("gate", "UID tag:  DE AD BE EF")
+        await wait_until(lambda: decisions)
+
+    try:
+        run(scenario, gateway)
+    finally:
+        boards.close()
+    assert [(d.uid, d.outcome, d.gate) for d in decisions] == [(STRANGER, REFUSED, "gate")]
+
+
+def test_reconnects_after_eof(engine):
+    boards = Boards(["north", "south"])
+    gateway, decisions = make_gateway(engine, boards)
+    north = gateway.readers["north"]
+
+    async def scenario():
+        await wait_until(connected(gateway, "north", "south"))
+        boards.unplug("north")
+        # The closed pty reads as an error; the reader counts the outage
+        await wait_until(lambda: north.stats.errors and north.stats.down_since is not None)
+        # The other gate keeps working meanwhile
+        boards.print("south", f"Card UID: {TESTER} ")
+        await wait_until(lambda: len(decisions) == 1)
+        boards.reopen("north")
+        await wait_until(lambda: north.stats.connects == 2)
+        boards.print("north", f"Card UID: {ADMIN} ")
+        await wait_until(lambda: len(decisions) == 2)
+
+    try:
+        run(scenario, gateway)
+    finally:
+        boards.close()
+    assert [(d.uid, d.gate) for d in decisions] == [(TESTER, "south"), (ADMIN, "north")]
+    stats = gateway.stats()["north"]
+    assert stats["reconnects"] == 1
+    assert stats["outages"] == 1
+    assert stats["errors"] >= 1
+    assert any("[north] Serial error" in line for line in engine.log.tail(50))
+    assert any("[north] Reconnected on" in line for line in engine.log.tail(50))
+
+
+def test_partial_lines_wait_for_the_newline(engine):
+    boards = Boards(["gate"])
+    gateway, decisions = make_gateway(engine, boards)
+
+    async def scenario():
+        await wait_until(connected(gateway, "gate"))
+        os.write(boards.masters["gate"], b"Card UID: 89 D3")
+        await asyncio.sleep(0.1)
+        assert not decisions
+        os.write(boards.masters["gate"], b" 9D 94 \r\n")
+        await wait_until(lambda: decisions)
+
+    try:
+        run(scenario, gateway)
+    finally:
+        boards.close()
+    assert [(d.uid, d.gate) for d in decisions] == [(ADMIN, "gate")]
+
+
+def read_master(boards, gate, until):
+    # What the host wrote to the board, up to and including until
+    data = b""
+    deadline = time.monotonic() + TIMEOUT
+    while until not in data:
+        if time.monotonic() > deadline:
+            raise AssertionError(f"board never got {until!r}, only {data!r}")
+        try:
+            data += os.read(boards.masters[gate], 4096)
+        except BlockingIOError:
+            time.sleep(0.01)
+    return data
+
+
+def test_recording_keeps_the_fd_and_baud_rate(engine, tmp_path, monkeypatch):
+    from framing import FAST_BAUD, MSG_CARD, MSG_PING, MSG_PONG, PROBE, encode_frame, encode_uid
+    from gateway import GateReader
+    from transport import RecordingTransport, load_capture
+
+    async def no_polling(self, on_event):
+        raise AssertionError("fell back to polling")
+    monkeypatch.setattr(GateReader, "_poll", no_polling)
+    capture = tmp_path / "capture.txt"
+    boards = Boards(["gate"])
+    os.set_blocking(boards.masters["gate"], False)
+    transports = []
+
+    def opener(port, baud):
+        transports.append(RecordingTransport(open_serial(boards.devices[port], baud), str(capture)))
+        return transports[-1]
+
+    gateway = Gateway(engine, [("gate", "gate")], opener=opener, protocol="binary")
+    decisions = []
+    gateway.decision_listeners.append(lambda decision, event: decisions.append(decision))
+    reader = gateway.readers["gate"]
+
+    async def scenario():
+        await wait_until(connected(gateway, "gate"))
+        boards.print("gate", "System Ready - Scan RFID Card...")
+        boards.print("gate", f"Card UID: {TESTER} ")
+        await wait_until(lambda: decisions)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, read_master, boards, "gate", PROBE.format(baud=FAST_BAUD).encode())
+        boards.print("gate", f"PROTO:BIN:{FAST_BAUD}")
+        await loop.run_in_executor(None, read_master, boards, "gate", encode_frame(MSG_PING))
+        assert transports[0].inner.baudrate == FAST_BAUD
+        os.write(boards.masters["gate"], encode_frame(MSG_PONG) + encode_frame(MSG_CARD, encode_uid(ADMIN)))
+        await wait_until(lambda: len(decisions) == 2)
+
+    try:
+        run(scenario, gateway)
+    finally:
+        boards.close()
+    assert reader.stats.link == "binary"
+    assert [(d.uid, d.gate) for d in decisions] == [(TESTER, "gate"), (ADMIN, "gate")]
+    lines = [line for _, line in load_capture(str(capture))]
+    assert lines == ["System Ready - Scan RFID Card...", f"Card UID: {TESTER} ", f"PROTO:BIN:{FAST_BAUD}"]
+    assert "# binary link, not recorded" in capture.read_text()
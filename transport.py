@@ -0,0 +1,229 @@
+import random
+import time
+from urllib.parse import parse_qs
+
+# Byte-stream transports with the subset of the pyserial API the readers
+# use (readline, read, in_waiting, write, close, is_open). Besides real
+# serial ports there is a replay port that plays back a captured session
+# and a recorder that captures a live one.
+#
+# Capture files hold one line per board line. Lines recorded by
+# RecordingTransport are "<seconds since start>\t<line>" and replay with
+# their original timing; plain lines (no tab) replay at a fixed rate.
+
+REPLAY_PREFIX = "replay:"
+DEFAULT_RATE = 10.0
+
+
+def open_transport(port, baud=9600, timeout=1, record=None):
+    # port is a serial device name, or "replay:<file>[?rate=N&jitter=S&loop=1]"
+    if port.startswith(REPLAY_PREFIX):
+        path, _, query = port[len(REPLAY_PREFIX):].partition("?")
+        options = {k: v[-1] for k, v in parse_qs(query).items()}
+        transport = ReplayTransport.from_file(
+            path,
+            rate=float(options["rate"]) if "rate" in options else None,
+            jitter=float(options.get("jitter", 0)),
+            loop=options.get("loop") in ("1", "true", "yes"),
+            timeout=timeout)
+    else:
+        import serial
+
+        transport = serial.Serial(port=port, baudrate=baud, timeout=timeout)
+    if record:
+        transport = RecordingTransport(transport, record)
+    return transport
+
+
+def load_capture(path):
+    # Returns [(offset or None, line), ...] from a capture file
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for raw in f:
+            raw = raw.rstrip("\r\n")
+            if not raw or raw.startswith("#"):
+                continue
+            stamp, sep, line = raw.partition("\t")
+            if sep:
+                try:
+                    entries.append((float(stamp), line))
+                    continue
+                except ValueError:
+                    pass
+            entries.append((None, raw))
+    return entries
+
+
+class ReplayTransport:
+    # Fake serial port that hands out captured lines on a schedule. rate
+    # (lines per second) overrides recorded timing, speed scales it, and
+    # jitter adds up to that many seconds of random delay per line.
+    def __init__(self, entries, rate=None, speed=1.0, jitter=0.0, loop=False,
+                 timeout=1, seed=None):
+        self.entries = list(entries)
+        self.rate = rate
+        self.speed = speed
+        self.jitter = jitter
+        self.loop = loop
+        self.timeout = timeout
+        self.is_open = True
+        self.written = bytearray()
+        self._random = random.Random(seed)
+        self._position = 0
+        self._buffer = bytearray()
+        self._start = time.perf_counter()
+        self._next_due = self._schedule(0)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        return cls(load_capture(path), **kwargs)
+
+    def _schedule(self, position):
+        if position >= len(self.entries):
+            return None
+        offset = self.entries[position][0]
+        if self.rate is None and offset is not None:
+            first = self.entries[0][0] or 0.0
+            due = self._start + (offset - first) / self.speed
+        else:
+            due = self._start + position / ((self.rate or DEFAULT_RATE) * self.speed)
+        if self.jitter:
+            due += self._random.uniform(0, self.jitter)
+        return due
+
+    def _pump(self, wait):
+        # Moves due lines into the read buffer, sleeping up to wait seconds
+        # for the next one when nothing is buffered yet
+        deadline = time.perf_counter() + wait
+        while self._next_due is not None:
+            now = time.perf_counter()
+            if self._next_due > now:
+                if self._buffer or self._next_due > deadline:
+                    break
+                time.sleep(self._next_due - now)
+            _, line = self.entries[self._position]
+            self._buffer += line.encode("utf-8") + b"\r\n"
+            self._position += 1
+            if self._position >= len(self.entries) and self.loop:
+                self._position = 0
+                self._start = time.perf_counter()
+            self._next_due = self._schedule(self._position)
+        if not self._buffer and wait:
+            # Nothing due before the timeout: behave like an idle port
+            time.sleep(max(0.0, deadline - time.perf_counter()))
+
+    @property
+    def finished(self):
+        return self._next_due is None and not self._buffer
+
+    @property
+    def in_waiting(self):
+        self._pump(0)
+        return len(self._buffer)
+
+    def read(self, size=1):
+        self._pump(self.timeout or 0)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self):
+        end = self._buffer.find(b"\n")
+        if end < 0:
+            self._pump(self.timeout or 0)
+            end = self._buffer.find(b"\n")
+            if end < 0:
+                return b""
+        line = bytes(self._buffer[:end + 1])
+        del self._buffer[:end + 1]
+        return line
+
+    def write(self, data):
+        self.written += data
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+
+class RecordingTransport:
+    # Wraps another transport and appends every line it reads to a capture
+    # file in replayable "<offset>\t<line>" form. A reader that reads
+    # fileno() itself hands what it read to tap(). Captures are text: set
+    # recording to False while the link carries binary frames.
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._start = time.perf_counter()
+        self._partial = bytearray()
+        self._recording = True
+
+    @property
+    def is_open(self):
+        return self.inner.is_open
+
+    @property
+    def in_waiting(self):
+        return self.inner.in_waiting
+
+    @property
+    def baudrate(self):
+        return self.inner.baudrate
+
+    @baudrate.setter
+    def baudrate(self, baud):
+        self.inner.baudrate = baud
+
+    def fileno(self):
+        return self.inner.fileno()
+
+    @property
+    def recording(self):
+        return self._recording
+
+    @recording.setter
+    def recording(self, enabled):
+        if enabled == self._recording:
+            return
+        self._recording = enabled
+        self._partial.clear()
+        # Skipped by load_capture()
+        self._file.write("# text\n" if enabled else "# binary link, not recorded\n")
+        self._file.flush()
+
+    def tap(self, data):
+        self._record(data)
+
+    def _record(self, data):
+        if not self._recording:
+            return
+        self._partial += data
+        while True:
+            end = self._partial.find(b"\n")
+            if end < 0:
+                break
+            line = self._partial[:end].decode("utf-8", errors="replace").rstrip("\r")
+            del self._partial[:end + 1]
+            if line:
+                self._file.write(f"{time.perf_counter() - self._start:.6f}\t{line}\n")
+        self._file.flush()
+
+    def readline(self):
+        data = self.inner.readline()
+        if data:
+            self._record(data)
+        return data
+
+    def read(self, size=1):
+        data = self.inner.read(size)
+        if data:
+            self._record(data)
+        return data
+
+    def write(self, data):
+        return self.inner.write(data)
+
+    def close(self):
+        self._file.close()
+        self.inner.close()
@@ -0,0 +1,36 @@
+from registry import MAX_UID_BYTES, normalize_uid
+
+# Card UIDs as fixed-width integers. Cards have 4-, 7- or 10-byte UIDs; a
+# packed UID is the byte count followed by the UID bytes, zero padded to
+# MAX_UID_BYTES, read as one big-endian number of UID_BITS. Packed UIDs
+# order by length and then by bytes. The card table (card_table.py)
+# stores them as a 64-bit high part (the count and the first 7 bytes)
+# and the remaining LOW_BITS, which are 0 for all but 10-byte UIDs.
+
+UID_BITS = 8 * (MAX_UID_BYTES + 1)
+LOW_BITS = UID_BITS - 64
+LOW_MASK = (1 << LOW_BITS) - 1
+_LENGTHS = [bytes((n,)) for n in range(MAX_UID_BYTES + 1)]
+
+
+def encode_uid(uid):
+    # Packed form of a canonical ("89 D3 9D 94") or compact UID, None for
+    # anything else
+    try:
+        raw = bytes.fromhex(uid)
+    except (TypeError, ValueError):
+        return None
+    if not raw or len(raw) > MAX_UID_BYTES:
+        return None
+    return int.from_bytes(_LENGTHS[len(raw)] + raw.ljust(MAX_UID_BYTES, b"\0"), "big")
+
+
+def pack_uid(uid):
+    # Packed form of a UID in any format normalize_uid() accepts
+    return encode_uid(normalize_uid(uid))
+
+
+def unpack_uid(packed):
+    # Canonical UID of a packed one
+    key = packed.to_bytes(MAX_UID_BYTES + 1, "big")
+    return key[1:1 + key[0]].hex(" ").upper()
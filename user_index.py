@@ -0,0 +1,227 @@
+import bisect
+import re
+from itertools import accumulate
+
+# Search over the cardholders behind the GUI user lists. Every card gets
+# one key, "name\0uid\0role" in lower case with the UID written compact
+# ("89d39d94"), and the keys are kept sorted in chunks of about CHUNK,
+# each with its keys also joined into one string:
+#
+#   - a name prefix is a contiguous run of keys, found by bisection
+#   - any other substring (UID, role, a later word of the name) is found
+#     with str.find over the joined chunks, in C
+#   - typing one more character only filters the previous results, as
+#     long as those were complete
+#
+# Keys also give the lists their order (by name) and positional access,
+# so a view can fetch just the rows it shows. A changed card moves one
+# key and rejoins one chunk; a bulk load rebuilds on next use.
+
+CHUNK = 1024
+# Searches stop after this many hits; the view shows "10000+"
+MAX_RESULTS = 10_000
+SEP = "\0"
+# Hex bytes with separators and at least one digit, so "ad de" stays a name
+_UID_QUERY = re.compile(r"(?=.*[0-9])[0-9a-f]{1,2}(?:[\s:\-]+[0-9a-f]{1,2})+")
+_UID_SEPARATORS = re.compile(r"[\s:\-]+")
+
+
+def search_key(record):
+    return SEP.join((record.name.lower(), record.uid.replace(" ", "").lower(), record.role.lower()))
+
+
+def key_uid(key):
+    # Canonical UID of the card behind a key
+    uid = key.split(SEP, 2)[1].upper()
+    return " ".join([uid[i:i + 2] for i in range(0, len(uid), 2)])
+
+
+def normalize_query(text):
+    query = " ".join(text.lower().split())
+    # "89 D3", "89:d3" and "89-d3" look for the UID "89D3..."
+    if _UID_QUERY.fullmatch(query):
+        query = "".join(_UID_SEPARATORS.split(query))
+    return query
+
+
+class UserIndex:
+    # Index of the cards in registry with the given status (all when
+    # None). Stays current through the registry's change listeners.
+    def __init__(self, registry, status=None, chunk=CHUNK):
+        self.registry = registry
+        self.status = status
+        self.chunk = chunk
+        self.builds = 0
+        self._keys = {}
+        self._chunks = []
+        self._maxes = []
+        self._blobs = []
+        self._totals = None
+        self._stale = True
+        # Last complete search, for narrowing it as the query grows
+        self._last_query = None
+        self._last_results = None
+        registry.listeners.append(self._on_change)
+
+    def close(self):
+        if self._on_change in self.registry.listeners:
+            self.registry.listeners.remove(self._on_change)
+
+    def _wants(self, record):
+        return self.status is None or record.status == self.status
+
+    def _on_change(self, uid, record):
+        self._last_query = None
+        if uid is None:
+            self._stale = True
+            return
+        if self._stale:
+            return
+        old = self._keys.pop(uid, None)
+        if old is not None:
+            self._remove(old)
+        if record is not None and self._wants(record):
+            key = search_key(record)
+            self._keys[uid] = key
+            self._insert(key)
+
+    # Sorted chunks
+
+    def _build(self):
+        self._keys = {r.uid: search_key(r) for r in self.registry if self._wants(r)}
+        ordered = sorted(self._keys.values())
+        size = self.chunk
+        self._chunks = [ordered[i:i + size] for i in range(0, len(ordered), size)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._blobs = [self._join(chunk) for chunk in self._chunks]
+        self._totals = None
+        self._stale = False
+        self.builds += 1
+
+    def _ensure(self):
+        if self._stale:
+            self._build()
+
+    @staticmethod
+    def _join(chunk):
+        # The chunk as one string, and where each key starts in it
+        starts = list(accumulate((len(key) + 1 for key in chunk[:-1]), initial=0))
+        return "\n".join(chunk), starts
+
+    def _insert(self, key):
+        self._totals = None
+        if not self._chunks:
+            self._chunks.append([key])
+            self._maxes.append(key)
+            self._blobs.append(None)
+            return
+        i = min(bisect.bisect_left(self._maxes, key), len(self._chunks) - 1)
+        chunk = self._chunks[i]
+        bisect.insort(chunk, key)
+        if len(chunk) > 2 * self.chunk:
+            half = len(chunk) // 2
+            self._chunks[i:i + 1] = [chunk[:half], chunk[half:]]
+            self._maxes[i:i + 1] = [chunk[half - 1], chunk[-1]]
+            self._blobs[i:i + 1] = [None, None]
+        else:
+            self._maxes[i] = chunk[-1]
+            self._blobs[i] = None
+
+    def _remove(self, key):
+        self._totals = None
+        i = bisect.bisect_left(self._maxes, key)
+        chunk = self._chunks[i]
+        del chunk[bisect.bisect_left(chunk, key)]
+        if chunk:
+            self._maxes[i] = chunk[-1]
+            self._blobs[i] = None
+        else:
+            del self._chunks[i]
+            del self._maxes[i]
+            del self._blobs[i]
+
+    def _blob(self, i):
+        blob = self._blobs[i]
+        if blob is None:
+            blob = self._blobs[i] = self._join(self._chunks[i])
+        return blob
+
+    # Views
+
+    def __len__(self):
+        self._ensure()
+        return len(self._keys)
+
+    def __getitem__(self, position):
+        # Key at a position in name order
+        self._ensure()
+        if self._totals is None:
+            self._totals = list(accumulate(len(chunk) for chunk in self._chunks))
+        i = bisect.bisect_right(self._totals, position)
+        if position < 0 or i >= len(self._chunks):
+            raise IndexError(position)
+        return self._chunks[i][position - (self._totals[i - 1] if i else 0)]
+
+    def record(self, key):
+        return self.registry.get(key_uid(key))
+
+    def search(self, text, limit=MAX_RESULTS):
+        # Keys matching text, names starting with it first, then every
+        # other card containing it, each in name order. None for an
+        # empty query, meaning the whole index.
+        query = normalize_query(text)
+        if not query:
+            return None
+        self._ensure()
+        last = self._last_query
+        if last is not None and query.startswith(last):
+            results = self._narrow(query)
+        else:
+            results = self._scan(query, limit)
+        if len(results) < limit:
+            self._last_query, self._last_results = query, results
+        else:
+            self._last_query = None
+        return results[:limit]
+
+    def _narrow(self, query):
+        # Every match of query also matched the shorter last query
+        first = []
+        rest = []
+        for key in self._last_results:
+            if key.startswith(query):
+                first.append(key)
+            elif query in key:
+                rest.append(key)
+        rest.sort()
+        return first + rest
+
+    def _scan(self, query, limit):
+        chunks = self._chunks
+        results = []
+        i = bisect.bisect_left(self._maxes, query)
+        while i < len(chunks) and len(results) < limit:
+            chunk = chunks[i]
+            j = bisect.bisect_left(chunk, query)
+            while j < len(chunk) and len(results) < limit and chunk[j].startswith(query):
+                results.append(chunk[j])
+                j += 1
+            if j < len(chunk):
+                break
+            i += 1
+        for i, chunk in enumerate(chunks):
+            if len(results) >= limit:
+                break
+            blob, starts = self._blob(i)
+            pos = blob.find(query)
+            while pos >= 0:
+                row = bisect.bisect_right(starts, pos) - 1
+                key = chunk[row]
+                if not key.startswith(query):
+                    results.append(key)
+                    if len(results) >= limit:
+                        break
+                if row + 1 >= len(starts):
+                    break
+                pos = blob.find(query, starts[row + 1])
+        return results
@@ -0,0 +1,147 @@
+import os
+import shutil
+from contextlib import contextmanager
+
+from card_table import CardTable, write_card_table
+from journal import Journal, read_snapshot, write_snapshot
+from registry import DENIED, PERMITTED, parse_display_entry
+
+STORE_VERSION = 2
+# Journal records kept before they are folded into a new snapshot
+COMPACT_EVERY = 1000
+# Snapshots with this extension are memory-mapped card tables, for stores
+# of millions of cards (see card_table.py); anything else is JSON
+CARD_TABLE_EXT = ".cards"
+
+
+def migrate_legacy_users(data):
+    # Converts the old {"permitted": [...], "denied": [...]} users.json,
+    # whose entries mix "UID - Name (Role)" and UID-less "Name (Role)".
+    # UID-less entries are kept only when they match a UID entry by name and
+    # role; the rest cannot be tied to a card and are reported as dropped.
+    users = {}
+    orphans = []
+    for status in (PERMITTED, DENIED):
+        for entry in data.get(status, []):
+            uid, name, role = parse_display_entry(entry)
+            if uid is None:
+                orphans.append((entry, name, role))
+            else:
+                users[uid] = [uid, name, role, status]
+    known = {(u[1].lower(), u[2].lower()) for u in users.values()}
+    dropped = [entry for entry, name, role in orphans if (name.lower(), role.lower()) not in known]
+    return list(users.values()), dropped
+
+
+class UserStore:
+    # Durable backing for a CardRegistry: a compact snapshot (users.json,
+    # or a card table) plus an append-only journal of changes since it.
+    def __init__(self, registry, path="users.json", compact_every=COMPACT_EVERY):
+        self.registry = registry
+        self.path = path
+        self.journal = Journal(f"{os.path.splitext(path)[0]}.journal")
+        self.compact_every = compact_every
+        self.migrated_dropped = []
+
+    @property
+    def tabled(self):
+        return self.path.endswith(CARD_TABLE_EXT)
+
+    def load(self):
+        if self.tabled:
+            return self._load_table()
+        data = read_snapshot(self.path)
+        seq = 0
+        if data is None:
+            users = []
+        elif data.get("version") == STORE_VERSION:
+            users = data["users"]
+            seq = data.get("seq", 0)
+        else:
+            users, self.migrated_dropped = migrate_legacy_users(data)
+            # Keep the original around before it is replaced
+            shutil.copyfile(self.path, f"{self.path}.v1.bak")
+        self.registry.load_rows(users)
+        for record in self.journal.replay(after_seq=seq):
+            self._apply(record)
+        if data is not None and data.get("version") != STORE_VERSION:
+            self.compact()
+        return self.registry
+
+    def _load_table(self):
+        seq = 0
+        if os.path.exists(self.path):
+            table = CardTable(self.path)
+            seq = table.seq
+            self.registry.attach(table)
+        for record in self.journal.replay(after_seq=seq):
+            self._apply(record)
+        return self.registry
+
+    def _apply(self, record):
+        op = record["op"]
+        if op == "put":
+            self.registry.add(record["uid"], record["name"], record["role"], record["status"])
+        elif op == "del":
+            self.registry.remove(record["uid"])
+        elif op == "clear":
+            self.registry.clear(record.get("status"))
+
+    def put(self, record):
+        self.journal.append({"op": "put", "uid": record.uid, "name": record.name,
+                             "role": record.role, "status": record.status})
+        self._maybe_compact()
+
+    def remove(self, uid):
+        self.journal.append({"op": "del", "uid": uid})
+        self._maybe_compact()
+
+    def clear(self, status=None):
+        self.journal.append({"op": "clear", "status": status})
+        self._maybe_compact()
+
+    @contextmanager
+    def batch(self):
+        # Groups several changes into one write and fsync
+        with self.journal.batch():
+            yield self
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        if not self.journal.in_batch and self.journal.count >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        self.journal.flush()
+        if self.tabled:
+            self._compact_table()
+            self.journal.truncate()
+            return
+        write_snapshot(self.path, {
+            "version": STORE_VERSION,
+            "seq": self.journal.seq,
+            "users": [[r.uid, r.name, r.role, r.status] for r in self.registry],
+        })
+        self.journal.truncate()
+
+    def _compact_table(self):
+        registry = self.registry
+        old = registry.table
+        records, removed = registry.changes()
+        tmp_path = f"{self.path}.tmp"
+        write_card_table(tmp_path, records, self.journal.seq, base=old, removed=removed)
+        if old is not None:
+            # Windows cannot rename over a file that is still mapped
+            old.close()
+        try:
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if old is not None:
+                registry.table = CardTable(self.path)
+            raise
+        registry.compacted(CardTable(self.path))
+
+    def close(self):
+        self.journal.close()
+        if self.registry.table is not None:
+            self.registry.table.close()
@@ -0,0 +1,81 @@
+import tkinter as tk
+from tkinter import ttk
+from tkinter import font as tkfont
+
+# Rows shown when the widget has not been laid out yet
+DEFAULT_ROWS = 10
+
+
+class VirtualList(ttk.Frame):
+    # A Listbox with a scrollbar that only ever holds the rows in view.
+    # rows is anything with len() and indexing (a list, a UserIndex) and
+    # format turns one row into its text, so a million rows cost as much
+    # to show as the dozen on screen.
+    def __init__(self, master, rows=(), format=str, **listbox_options):
+        super().__init__(master)
+        listbox_options.setdefault("height", DEFAULT_ROWS)
+        self.listbox = tk.Listbox(self, **listbox_options)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.listbox.pack(side="left", fill="both", expand=True)
+        self.rows = rows
+        self.format = format
+        self.first = 0
+        self.visible = listbox_options["height"]
+        self._line_height = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        self.listbox.bind("<Configure>", self._on_configure)
+        self.listbox.bind("<MouseWheel>", self._on_wheel)
+        # X11 reports the wheel as buttons 4 and 5
+        self.listbox.bind("<Button-4>", lambda e: self.scroll(-3) or "break")
+        self.listbox.bind("<Button-5>", lambda e: self.scroll(3) or "break")
+        self.listbox.bind("<Prior>", lambda e: self.scroll(-self.visible) or "break")
+        self.listbox.bind("<Next>", lambda e: self.scroll(self.visible) or "break")
+
+    def __len__(self):
+        return len(self.rows)
+
+    def set_rows(self, rows):
+        self.rows = rows
+        self.first = 0
+        self.refresh()
+
+    def refresh(self):
+        # Re-reads the rows in view, e.g. after the source changed
+        total = len(self.rows)
+        self.first = max(0, min(self.first, total - self.visible))
+        stop = min(total, self.first + self.visible)
+        self.listbox.delete(0, tk.END)
+        if stop > self.first:
+            self.listbox.insert(tk.END, *[self.format(self.rows[i]) for i in range(self.first, stop)])
+        if total:
+            self.scrollbar.set(self.first / total, stop / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll(self, rows):
+        first = self.first
+        self.first = max(0, min(first + rows, len(self.rows) - self.visible))
+        if self.first != first:
+            self.refresh()
+
+    def selected(self):
+        # Rows (not texts) selected in the view
+        return [self.rows[self.first + i] for i in self.listbox.curselection()
+                if self.first + i < len(self.rows)]
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.first = int(float(amount) * len(self.rows))
+            self.refresh()
+        elif action == "scroll":
+            self.scroll(int(amount) * (self.visible if unit == "pages" else 1))
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _on_configure(self, event):
+        visible = max(1, event.height // self._line_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()